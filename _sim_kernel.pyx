@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+
+# ----------------------
+# 경로 의존 시뮬레이션 커널 (Cython)
+# ----------------------
+# simulate.py 의 simulate_reference 와 같은 순서로 같은 연산을 하므로 결과가 같아야 한다.
+# 로직을 바꿀 때는 두 구현을 함께 고친다.
+from libc.math cimport floor
+
+import numpy as np
+
+# 체결 사유 (simulate.py 의 상수와 같은 값)
+cdef enum:
+    ENTRY = 0
+    TRAILING_STOP = 1
+    TAKE_PROFIT = 2
+    EXIT_SIGNAL = 3
+
+
+def simulate_kernel(const double[::1] open_, const double[::1] high, const double[::1] low,
+                    const double[::1] close, const unsigned char[::1] signal,
+                    double init_cash, double alloc, double trail_pct,
+                    const double[::1] tp_levels, const double[::1] tp_fractions, bint fractional):
+    cdef Py_ssize_t n = close.shape[0]
+    cdef Py_ssize_t levels = tp_levels.shape[0]
+    cdef Py_ssize_t i
+    cdef Py_ssize_t tp = 0
+    cdef double cash = init_cash
+    cdef double qty = 0.0
+    cdef double entry_qty = 0.0
+    cdef double entry_price = 0.0
+    cdef double peak = 0.0
+    cdef double price, size, level, stop
+    cdef bint armed = True
+
+    equity_arr = np.empty(n, dtype=np.float64)
+    cdef double[::1] equity = equity_arr
+    fills = []
+
+    for i in range(n):
+        if i > 0:
+            if not signal[i - 1]:
+                armed = True
+                # 전략 청산 신호 -> 시가에 전량 매도
+                if qty > 0.0:
+                    price = open_[i]
+                    cash += qty * price
+                    fills.append((i, -1, price, qty, qty * (price - entry_price), EXIT_SIGNAL))
+                    qty = 0.0
+            elif qty == 0.0 and armed:
+                # 진입 신호 -> 시가에 현재 현금의 alloc 비율만큼 매수
+                price = open_[i]
+                size = cash * alloc / price
+                if not fractional:
+                    size = floor(size)
+                if size > 0.0 and size * price <= cash:
+                    cash -= size * price
+                    qty = size
+                    entry_qty = size
+                    entry_price = price
+                    peak = price
+                    tp = 0
+                    fills.append((i, 1, price, size, 0.0, ENTRY))
+
+        if qty > 0.0:
+            # 트레일링 스톱 (같은 봉에서는 익절보다 먼저 확인)
+            if trail_pct > 0.0:
+                stop = peak * (1.0 - trail_pct)
+                if low[i] <= stop:
+                    price = open_[i] if open_[i] < stop else stop
+                    cash += qty * price
+                    fills.append((i, -1, price, qty, qty * (price - entry_price), TRAILING_STOP))
+                    qty = 0.0
+                    armed = False
+            # 익절 단계: 진입가 대비 각 단계에 닿으면 진입 수량의 일부씩 매도
+            while qty > 0.0 and tp < levels and high[i] >= entry_price * (1.0 + tp_levels[tp]):
+                level = entry_price * (1.0 + tp_levels[tp])
+                price = open_[i] if open_[i] > level else level
+                size = entry_qty * tp_fractions[tp]
+                if not fractional:
+                    size = floor(size)
+                if size > qty:
+                    size = qty
+                tp += 1
+                if size > 0.0:
+                    cash += size * price
+                    qty -= size
+                    fills.append((i, -1, price, size, size * (price - entry_price), TAKE_PROFIT))
+                    if qty <= 0.0:
+                        qty = 0.0
+                        armed = False
+            if qty > 0.0 and high[i] > peak:
+                peak = high[i]
+
+        equity[i] = cash + qty * close[i]
+
+    return equity_arr, fills
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+
+import db
+
+# ----------------------
+# 계좌 원장 (users.db)
+# ----------------------
+# 입금/매수/매도는 모두 사용자별 원장(ledger)에 이벤트로 추가만 하고,
+# 계좌 상태는 최근 스냅샷 + 그 이후 이벤트를 재생해서 만든다.
+# 원장/스냅샷 테이블은 db.MIGRATIONS 에서 만든다.
+# SNAPSHOT_EVERY 개의 이벤트마다 스냅샷을 남기므로 거래 수가 늘어도 로딩 비용은 일정하다.
+SNAPSHOT_EVERY = 100
+
+EVENT_COLUMNS = 'version, type, symbol, price, qty, amount'
+
+# 자주 쓰는 쿼리는 문자열을 고정해서 sqlite3 의 statement 캐시를 재사용한다
+SQL_USER_ID = 'SELECT id FROM users WHERE username = ?'
+SQL_LAST_SNAPSHOT = 'SELECT version, state FROM snapshots WHERE user_id = ? ORDER BY version DESC LIMIT 1'
+SQL_EVENTS_AFTER = f'SELECT {EVENT_COLUMNS} FROM ledger WHERE user_id = ? AND version > ? ORDER BY version'
+SQL_LAST_VERSION = 'SELECT MAX(version) FROM ledger WHERE user_id = ?'
+SQL_APPEND_EVENT = (
+    'INSERT INTO ledger (user_id, version, type, symbol, price, qty, amount, '
+    'cash_after, cost_after, realized_after, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+SQL_SAVE_SNAPSHOT = 'INSERT OR REPLACE INTO snapshots (user_id, version, state, created_at) VALUES (?, ?, ?, ?)'
+SQL_HISTORY = (
+    'SELECT version, created_at, type, symbol, price, qty, amount, cash_after, '
+    'cash_after + cost_after AS equity_at_cost, realized_after '
+    'FROM ledger WHERE user_id = ? ORDER BY version')
+
+
+# ----------------------
+# 계좌 상태 (이벤트 재생)
+# ----------------------
+class AccountState:
+    def __init__(self, cash=0, holdings=None, cost=None, realized_pnl=0, version=0):
+        self.cash = cash
+        self.holdings = holdings if holdings is not None else {}
+        self.cost = cost if cost is not None else {}  # 종목별 매입 원가 합계 (이동평균법)
+        self.realized_pnl = realized_pnl
+        self.version = version
+
+    def check(self, type, symbol, price, qty, amount):
+        # 이벤트를 적용할 수 있으면 True (잔고/보유 수량 확인)
+        if type == 'buy':
+            return self.cash >= amount
+        if type == 'sell':
+            return self.holdings.get(symbol, 0) >= qty
+        return True
+
+    def apply(self, version, type, symbol, price, qty, amount):
+        if type == 'deposit':
+            self.cash += amount
+        elif type == 'buy':
+            self.cash -= amount
+            self.holdings[symbol] = self.holdings.get(symbol, 0) + qty
+            self.cost[symbol] = self.cost.get(symbol, 0) + amount
+        elif type == 'sell':
+            holding = self.holdings.get(symbol, 0)
+            sold_cost = self.cost.get(symbol, 0) * qty / holding if holding else 0
+            self.cash += amount
+            self.holdings[symbol] = holding - qty
+            self.cost[symbol] = self.cost.get(symbol, 0) - sold_cost
+            self.realized_pnl += amount - sold_cost
+        self.version = version
+
+    def total_cost(self):
+        return sum(self.cost.values())
+
+    def to_json(self):
+        return json.dumps({
+            'cash': self.cash, 'holdings': self.holdings, 'cost': self.cost,
+            'realized_pnl': self.realized_pnl, 'version': self.version,
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text))
+
+
+def _load_state(conn, user_id):
+    row = conn.execute(SQL_LAST_SNAPSHOT, (user_id,)).fetchone()
+    state = AccountState.from_json(row[1]) if row else AccountState()
+    _replay_tail(conn, user_id, state)
+    return state
+
+
+def _replay_tail(conn, user_id, state):
+    for event in conn.execute(SQL_EVENTS_AFTER, (user_id, state.version)):
+        state.apply(*event)
+
+
+def _append(conn, user_id, state, type, symbol, price, qty, amount):
+    version = state.version + 1
+    state.apply(version, type, symbol, price, qty, amount)
+    conn.execute(SQL_APPEND_EVENT, (
+        user_id, version, type, symbol, price, qty, amount,
+        state.cash, state.total_cost(), state.realized_pnl, time.time()))
+    if version % SNAPSHOT_EVERY == 0:
+        conn.execute(SQL_SAVE_SNAPSHOT, (user_id, version, state.to_json(), time.time()))
+
+
+# ----------------------
+# 가상 계좌 클래스 정의
+# ----------------------
+class VirtualAccount:
+    def __init__(self, init_cash=0, user_id=None):
+        # user_id 가 없으면 기존처럼 메모리에서만 동작
+        self.user_id = user_id
+        self._lock = threading.RLock()
+        self._state = AccountState(cash=init_cash) if user_id is None else None
+
+    @property
+    def state(self):
+        # 계좌 상태는 처음 필요할 때 스냅샷 + 이후 이벤트로 불러온다
+        if self._state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = _load_state(db.connection(), self.user_id)
+        return self._state
+
+    @property
+    def cash(self):
+        return self.state.cash
+
+    @property
+    def holdings(self):
+        # 여러 탭이 같은 계좌를 공유하므로 복사본을 반환
+        with self._lock:
+            return dict(self.state.holdings)
+
+    @property
+    def realized_pnl(self):
+        return self.state.realized_pnl
+
+    def average_cost(self, name):
+        qty = self.state.holdings.get(name, 0)
+        return self.state.cost.get(name, 0) / qty if qty else 0
+
+    def _record(self, type, symbol, price, qty, amount, statements=()):
+        # statements: 이벤트와 같은 트랜잭션에서 실행할 (sql, params) 목록.
+        # 각 문장이 한 행 이상 바꾸지 못하면 이벤트까지 롤백한다 (예약 주문 체결 상태 갱신 등)
+        with self._lock:
+            state = self.state
+            if self.user_id is None:
+                if not state.check(type, symbol, price, qty, amount):
+                    return False
+                state.apply(state.version + 1, type, symbol, price, qty, amount)
+                return True
+
+            conn = db.connection()
+            try:
+                with db.transaction(conn):
+                    # 다른 프로세스가 먼저 기록한 이벤트가 있으면 따라잡은 뒤 확인
+                    last_version = conn.execute(SQL_LAST_VERSION, (self.user_id,)).fetchone()[0] or 0
+                    if last_version > state.version:
+                        _replay_tail(conn, self.user_id, state)
+                    if not state.check(type, symbol, price, qty, amount):
+                        return False
+                    _append(conn, self.user_id, state, type, symbol, price, qty, amount)
+                    for sql, params in statements:
+                        if conn.execute(sql, params).rowcount == 0:
+                            raise LookupError(f"함께 기록할 행이 없습니다: {sql}")
+            except Exception:
+                # 기록에 실패하면 메모리 상태도 DB 기준으로 다시 만든다
+                self._state = None
+                raise
+            return True
+
+    def deposit(self, amount):
+        self._record('deposit', None, None, None, amount)
+
+    def get_cash(self):
+        return self.cash
+
+    def buy(self, name, price, qty, statements=()):
+        return self._record('buy', name, price, qty, price * qty, statements)
+
+    def sell(self, name, price, qty, statements=()):
+        return self._record('sell', name, price, qty, price * qty, statements)
+
+    def history(self):
+        # 이벤트별 (버전, 시각, 유형, 종목, 가격, 수량, 금액, 현금, 원가 기준 평가액, 실현 손익)
+        if self.user_id is None:
+            return []
+        return db.connection().execute(SQL_HISTORY, (self.user_id,)).fetchall()
+
+
+# ----------------------
+# 사용자별 계좌 공유
+# ----------------------
+# 같은 사용자가 여러 탭에서 접속해도 프로세스 안에서는 같은 계좌 객체를 사용한다.
+_accounts = {}
+_accounts_lock = threading.Lock()
+
+
+def load_account(username):
+    row = db.connection().execute(SQL_USER_ID, (username,)).fetchone()
+    if row is None:
+        return None
+    user_id = row[0]
+    with _accounts_lock:
+        account = _accounts.get(user_id)
+        if account is None:
+            account = _accounts[user_id] = VirtualAccount(user_id=user_id)
+    return account
@@ -5,306 +5,286 @@ import streamlit as st
 import requests
 import re
 from bs4 import BeautifulSoup
-import pyupbit
 from pykrx import stock
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 import yfinance as yf
 import pandas as pd
 import time
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import ccxt
-import FinanceDataReader as fdr
-import sqlite3
-import hashlib
-import os
-
-# ----------------------
-# 데이터베이스 초기화
-# ----------------------
-def init_db():
-    if not os.path.exists('users.db'):
-        conn = sqlite3.connect('users.db')
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                email TEXT UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
-
-# ----------------------
-# 비밀번호 해싱
-# ----------------------
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-# ----------------------
-# 사용자 인증
-# ----------------------
-def authenticate_user(username, password):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username = ? AND password = ?',
-              (username, hash_password(password)))
-    user = c.fetchone()
-    conn.close()
-    return user is not None
-
-# ----------------------
-# 사용자 등록
-# ----------------------
-def register_user(username, password, email):
-    try:
-        conn = sqlite3.connect('users.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
-                 (username, hash_password(password), email))
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+import uuid
+import streamlit.components.v1 as components
+from market_data import (
+    coin_symbol, exchange_pool, fetch_crypto_history, fetch_crypto_quote,
+    fetch_futures_history, fetch_futures_quote, fetch_stock_history,
+    fetch_stock_quote, krx_registry, upbit_krw_tickers
+)
+from account import load_account
+from auth import authenticate_user, register_user
+from autotrader import auto_trader
+from backtest import DEFAULT_CASH as DEFAULT_BACKTEST_CASH, STRATEGIES, load_history, run_strategy
+from charts import CHART_HEIGHT, display_frame, figure_html
+from db import init_db
+from fetcher import fetch_one
+from indicators import PRESETS as INDICATOR_PRESETS, indicators_for
+from market_cache import market_cache
+from orderbook import DIRECTIONS as ORDER_DIRECTIONS, ORDER_TYPES, order_engine
+from poller import market_poller
+from simulate import run_path_strategy
+from sweep import sweep
+from streams import binance_futures_stream, streamed_history, streamed_quote, upbit_stream
+from valuation import Valuation, is_coin, portfolio_total, value_portfolio
 
 # ----------------------
 # 주식 가격 조회 함수
 # ----------------------
-def get_stock_price(name):
+def get_stock_quote(name):
     try:
-        # 종목명으로 종목코드 찾기
-        stock_list = fdr.StockListing('KRX')
-        stock_info = stock_list[stock_list['Name'] == name]
+        # 종목명으로 종목코드 찾기 (프로세스 공용 KRX 인덱스 사용)
+        code = fetch_one('krx', krx_registry().get_code, name)
         
-        if stock_info.empty:
+        if code is None:
             st.warning(f"종목 '{name}'을(를) 찾을 수 없습니다.")
             return name, -1, None, None
             
-        code = stock_info['Code'].iloc[0]
-        
-        # 현재가 조회
-        today = datetime.now().strftime("%Y-%m-%d")
-        yesterday = (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d")
+        # 현재가 조회 (가장 최근 거래일의 종가, 세션 공용 캐시 경유)
+        quote = market_cache().get('stock', 'quote', code, lambda: fetch_one('krx', fetch_stock_quote, code))
         
-        # 최근 데이터 조회
-        df = fdr.DataReader(code, yesterday, today)
-        
-        if df.empty:
+        if quote is None:
             st.warning("현재가 정보를 가져올 수 없습니다.")
             return name, -1, code, None
             
-        # 가장 최근 거래일의 종가를 현재가로 사용
-        price = df['Close'].iloc[-1]
-        
-        # 과거 데이터 조회 (최근 30일)
-        try:
-            start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-            df = fdr.DataReader(code, start_date, today)
-            
-            if df.empty:
-                st.warning("과거 데이터를 가져올 수 없습니다.")
-                df = None
-                
-        except Exception as e:
-            st.warning(f"과거 데이터 조회 중 오류 발생: {str(e)}")
-            df = None
-            
-        return name, price, code, df
+        return name, quote.price, code, quote.timestamp
         
     except Exception as e:
         st.error(f"주식 가격 조회 중 오류 발생: {str(e)}")
         return name, -1, None, None
 
+def get_stock_history(code):
+    # 과거 데이터 조회 (최근 30일)
+    try:
+        df = market_cache().get('stock', 'history', code, lambda: fetch_stock_history(code))
+        if df is None:
+            st.warning("과거 데이터를 가져올 수 없습니다.")
+        return df
+    except Exception as e:
+        st.warning(f"과거 데이터 조회 중 오류 발생: {str(e)}")
+        return None
+
+def get_stock_price(name):
+    name, price, code, _ = get_stock_quote(name)
+    if price == -1:
+        return name, price, code, None
+    return name, price, code, get_stock_history(code)
+
 # ----------------------
 # 코인 가격 조회 함수
 # ----------------------
-def get_crypto_price(name):
+def get_crypto_quote(name):
     try:
-        # 업비트에서 사용 가능한 모든 코인 목록 가져오기
-        tickers = pyupbit.get_tickers(fiat="KRW")
-        
-        # 한글 이름을 심볼로 변환
-        name_mapping = {
-            '비트코인': 'BTC',
-            '이더리움': 'ETH',
-            '리플': 'XRP',
-            '도지코인': 'DOGE',
-            '샌드박스': 'SAND',
-            '에이다': 'ADA',
-            '솔라나': 'SOL',
-            '폴리곤': 'MATIC',
-            '바이낸스코인': 'BNB',
-            '트론': 'TRX'
-        }
-        
-        # 한글 이름이 매핑에 있는 경우 심볼로 변환
-        symbol = name_mapping.get(name, name.upper())
-        ticker = f"KRW-{symbol}"
+        ticker = f"KRW-{coin_symbol(name)}"
         
-        if ticker not in tickers:
+        # 업비트에서 사용 가능한 코인 목록에 있는지 확인
+        if ticker not in fetch_one('upbit', upbit_krw_tickers):
             st.warning(f"코인 '{name}'을(를) 찾을 수 없습니다.")
             return None, -1, None
             
         # 현재가 조회
-        price = pyupbit.get_current_price(ticker)
-        if price is None:
+        # 웹소켓 스트림 최신가를 먼저 사용하고, 없으면 REST 조회 (세션 공용 캐시 경유)
+        quote = streamed_quote(upbit_stream(), ticker)
+        if quote is None:
+            quote = market_cache().get('crypto', 'quote', ticker,
+                                       lambda: fetch_one('upbit', fetch_crypto_quote, ticker))
+        if quote is None:
             st.warning("현재가 정보를 가져올 수 없습니다.")
             return ticker, -1, None
             
-        # 과거 데이터 조회 (최근 30일)
-        try:
-            df = pyupbit.get_ohlcv(ticker, interval="day", count=30)
-            if df is None or df.empty:
-                st.warning("과거 데이터를 가져올 수 없습니다.")
-                df = None
-        except Exception as e:
-            st.warning(f"과거 데이터 조회 중 오류 발생: {str(e)}")
-            df = None
-            
-        return ticker, price, df
+        return ticker, quote.price, quote.timestamp
         
     except Exception as e:
         st.error(f"코인 가격 조회 중 오류 발생: {str(e)}")
         return None, -1, None
 
+def get_crypto_history(ticker):
+    # 과거 데이터 조회 (최근 30일, 최근 봉은 streamed_history 로 스트림에서 채운다)
+    try:
+        df = market_cache().get('crypto', 'history', ticker, lambda: fetch_crypto_history(ticker))
+        if df is None:
+            st.warning("과거 데이터를 가져올 수 없습니다.")
+        return df
+    except Exception as e:
+        st.warning(f"과거 데이터 조회 중 오류 발생: {str(e)}")
+        return None
+
+def get_crypto_price(name):
+    ticker, price, _ = get_crypto_quote(name)
+    if price == -1:
+        return ticker, price, None
+    return ticker, price, streamed_history(upbit_stream(), ticker, get_crypto_history(ticker), '1d')
+
 # ----------------------
 # 코인 선물 가격 조회 함수
 # ----------------------
-def get_crypto_futures_price(name):
+def get_crypto_futures_quote(name):
     try:
-        # 한글 이름을 심볼로 변환 (바이낸스 선물 심볼 매핑)
-        name_mapping = {
-            '비트코인': 'BTC',
-            '이더리움': 'ETH',
-            '리플': 'XRP',
-            '도지코인': 'DOGE',
-            '샌드박스': 'SAND',
-            '에이다': 'ADA',
-            '솔라나': 'SOL',
-            '폴리곤': 'MATIC',
-            '바이낸스코인': 'BNB',
-            '트론': 'TRX'
-        }
-        
-        # 한글 이름이 매핑에 있는 경우 심볼로 변환
-        symbol = name_mapping.get(name, name.upper())
-        futures_symbol = f"{symbol}/USDT"  # 바이낸스 선물 심볼 형식
+        futures_symbol = f"{coin_symbol(name)}/USDT"  # 바이낸스 선물 심볼 형식
         
-        # 바이낸스 선물 거래소 초기화
-        exchange = ccxt.binance({
-            'enableRateLimit': True,
-            'options': {
-                'defaultType': 'future'
-            }
-        })
-        
-        # 선물 시장 정보 조회
-        markets = exchange.load_markets()
+        # 공용 바이낸스 선물 인스턴스 (마켓 정보는 캐시되어 있음)
+        pool = exchange_pool()
+        exchange = fetch_one('binance', pool.get, 'binance', 'future')
         
         # 사용 가능한 심볼 목록 출력 (디버깅용)
-        available_symbols = [s for s in markets.keys() if 'USDT' in s]
+        available_symbols = [s for s in pool.symbols('binance', 'future') if 'USDT' in s]
         st.write(f"사용 가능한 선물 심볼: {available_symbols[:10]}...")  # 처음 10개만 표시
         
-        if futures_symbol not in markets:
+        if not pool.has_symbol(futures_symbol, 'binance', 'future'):
             st.warning(f"선물 '{name}'을(를) 찾을 수 없습니다. (시도한 심볼: {futures_symbol})")
             return None, -1, None
             
         # 현재가 조회
-        ticker = exchange.fetch_ticker(futures_symbol)
-        if ticker is None:
+        # 웹소켓 스트림 최신가를 먼저 사용하고, 없으면 REST 조회 (세션 공용 캐시 경유)
+        quote = streamed_quote(binance_futures_stream(), futures_symbol)
+        if quote is None:
+            quote = market_cache().get('futures', 'quote', futures_symbol,
+                                       lambda: fetch_one('binance', fetch_futures_quote, exchange, futures_symbol))
+        if quote is None:
             st.warning("현재가 정보를 가져올 수 없습니다.")
             return futures_symbol, -1, None
             
-        price = ticker['last']
-        
-        # 과거 데이터 조회 (최근 30일)
-        try:
-            # 1시간 간격으로 데이터 조회
-            ohlcv = exchange.fetch_ohlcv(
-                futures_symbol,
-                timeframe='1h',
-                limit=720  # 30일 * 24시간
-            )
-            
-            if ohlcv:
-                # DataFrame으로 변환
-                df = pd.DataFrame(
-                    ohlcv,
-                    columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
-                )
-                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                df.set_index('timestamp', inplace=True)
-            else:
-                st.warning("과거 데이터를 가져올 수 없습니다.")
-                df = None
-                
-        except Exception as e:
-            st.warning(f"과거 데이터 조회 중 오류 발생: {str(e)}")
-            df = None
-            
-        return futures_symbol, price, df
+        return futures_symbol, quote.price, quote.timestamp
         
     except Exception as e:
         st.error(f"선물 가격 조회 중 오류 발생: {str(e)}")
         return None, -1, None
 
+def get_crypto_futures_history(futures_symbol):
+    # 과거 데이터 조회 (최근 30일, 1시간 간격, 최근 봉은 streamed_history 로 스트림에서 채운다)
+    try:
+        df = market_cache().get('futures', 'history', futures_symbol,
+                                lambda: fetch_futures_history(exchange_pool().get('binance', 'future'), futures_symbol))
+        if df is None:
+            st.warning("과거 데이터를 가져올 수 없습니다.")
+        return df
+    except Exception as e:
+        st.warning(f"과거 데이터 조회 중 오류 발생: {str(e)}")
+        return None
+
+def get_crypto_futures_price(name):
+    futures_symbol, price, _ = get_crypto_futures_quote(name)
+    if price == -1:
+        return futures_symbol, price, None
+    return futures_symbol, price, streamed_history(
+        binance_futures_stream(), futures_symbol, get_crypto_futures_history(futures_symbol), '1h')
+
 # ----------------------
-# 가상 계좌 클래스 정의
+# 실시간 업데이트 (공용 폴러 구독)
 # ----------------------
-class VirtualAccount:
-    def __init__(self, init_cash=0):
-        self.cash = init_cash
-        self.holdings = {}
-        
-    def deposit(self, amount):
-        self.cash += amount
+def follow_realtime(kind, symbol, info):
+    # 구독을 갱신하고 폴러가 받아둔 최신 스냅샷을 세션 정보에 반영
+    poller = market_poller()
+    poller.subscribe(st.session_state.session_id, kind, symbol)
+    snapshot = poller.latest(kind, symbol)
+    if snapshot:
+        if 'quote' in snapshot:
+            info["price"] = snapshot['quote'].price
+        if 'bars' in snapshot:
+            info["data"] = snapshot['bars']
 
-    def get_cash(self):
-        return self.cash
+def stop_realtime(kind, state_key):
+    st.session_state[state_key] = False
+    market_poller().unsubscribe(st.session_state.session_id, kind)
 
-    def buy(self, name, price, qty):
-        cost = price * qty
-        if self.cash >= cost:
-            self.cash -= cost
-            self.holdings[name] = self.holdings.get(name, 0) + qty
-            return True
-        return False
+def realtime_toggle(kind, state_key, button_key):
+    if st.session_state.get(state_key):
+        if st.button("실시간 업데이트 중지", key=f"{button_key}_stop"):
+            stop_realtime(kind, state_key)
+            st.rerun()  # 패널 갱신 주기를 바꾸기 위해 전체 리런
+    elif st.button("실시간 업데이트 시작", key=button_key):
+        st.session_state[state_key] = True
+        st.rerun()
 
-    def sell(self, name, price, qty):
-        holding = self.holdings.get(name, 0)
-        if holding >= qty:
-            self.cash += price * qty
-            self.holdings[name] = holding - qty
-            return True
-        return False
+def realtime_fragment(state_key, panel):
+    # 실시간 업데이트 중인 패널만 자체 타이머로 다시 그린다
+    run_every = REALTIME_PANEL_REFRESH if st.session_state.get(state_key) else None
+    return st.fragment(run_every=run_every)(panel)
+
+# ----------------------
+# 차트 표시
+# ----------------------
+def chart_range(df, key):
+    # 기간을 좁히면 그 구간은 원래 해상도로 다시 그린다 (MAX_BARS 이하일 때)
+    if len(df) < 2:
+        return df
+    first = df.index[0].to_pydatetime()
+    last = df.index[-1].to_pydatetime()
+    value = st.session_state.get(key)
+    # 데이터 범위를 벗어났거나 끝까지 선택한 상태였다면 새 범위 전체로 초기화
+    if value is not None and (value[0] < first or value[1] > last
+                              or value[1] == st.session_state.get(f"{key}_last")):
+        del st.session_state[key]
+    st.session_state[f"{key}_last"] = last
+    start, end = st.slider("표시 구간", min_value=first, max_value=last, value=(first, last),
+                           format="YYYY-MM-DD HH:mm", key=key)
+    return df.loc[start:end]
+
+def ohlcv_chart(df, symbol, interval, title, yaxis_title, key):
+    # 캔들 + 거래량 차트 (표준 형식 OHLCV), 선택한 보조지표를 함께 표시
+    names = st.multiselect("보조지표", list(INDICATOR_PRESETS), key=f"{key}_indicators")
+    overlays, panels = [], []
+    if df is not None and not df.empty:
+        if names:
+            # 지표는 전체 구간으로 계산한 뒤 표시 구간만 잘라서 그린다
+            indicator_set, values = indicators_for(symbol, interval, names, df)
+            overlays, panels = indicator_set.overlay_columns, indicator_set.panel_columns
+            df = df.join(values[overlays + panels])
+        df = chart_range(display_frame(df), key)
+    if df is None or df.empty:
+        st.warning("표시할 데이터가 없습니다.")
+        return
+    html = figure_html(df, symbol, interval, title, yaxis_title, overlays, panels)
+    components.html(html, height=CHART_HEIGHT + 20)
+
+# ----------------------
+# 보유 자산 평가 (세션별 캐시)
+# ----------------------
+def cached_valuation(account):
+    # 보유 종목이 바뀌었거나 가격이 오래된 경우에만 다시 조회
+    names = tuple(sorted(account.holdings))
+    cache = st.session_state.get('valuation_cache')
+    if cache is None or cache['names'] != names or time.time() - cache['at'] > VALUATION_TTL:
+        valuation = value_portfolio(account.cash, account.holdings)
+        st.session_state.valuation_cache = {'names': names, 'at': time.time(), 'prices': valuation.prices}
+        return valuation
+    prices = cache['prices']
+    return Valuation(prices, portfolio_total(account.cash, account.holdings, prices))
 
 # ----------------------
 # 화면 구성
 # ----------------------
 st.set_page_config(page_title="자동매매 시스템", layout="centered", page_icon="💰")
 
+# 패널별 자동 갱신 주기(초)
+ASSET_PANEL_REFRESH = 5
+REALTIME_PANEL_REFRESH = 10
+LOG_PANEL_REFRESH = 5
+AUTOTRADE_PANEL_REFRESH = 5
+ORDER_PANEL_REFRESH = 5
+# 사이드바 보유 종목 가격 재조회 주기(초)
+VALUATION_TTL = 30
+
 # 데이터베이스 초기화
 init_db()
 
+# 자동매매 실행기와 예약 주문 매칭 시작 (프로세스당 한 번, 스크립트 재실행과 무관하게 동작)
+auto_trader().start()
+order_engine().start()
+
 # 세션 상태 초기화
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
 if 'username' not in st.session_state:
     st.session_state.username = None
-
-# 자동 새로고침 간격 설정 (5분)
-if 'last_refresh' not in st.session_state:
-    st.session_state.last_refresh = datetime.now()
-
-# 5분마다 자동 새로고침
-if (datetime.now() - st.session_state.last_refresh).total_seconds() > 300:
-    st.session_state.last_refresh = datetime.now()
-    st.experimental_rerun()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # 로그인 상태가 아닐 경우 로그인/회원가입 화면 표시
 if not st.session_state.logged_in:
@@ -323,7 +303,7 @@ if not st.session_state.logged_in:
                 st.session_state.logged_in = True
                 st.session_state.username = login_username
                 st.success("로그인 성공!")
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.error("아이디 또는 비밀번호가 올바르지 않습니다.")
     
@@ -352,15 +332,19 @@ st.title(f"💰 자동매매 시스템 - {st.session_state.username}님 환영
 
 # 로그아웃 버튼
 if st.sidebar.button("로그아웃"):
+    market_poller().unsubscribe(st.session_state.session_id)
     st.session_state.logged_in = False
     st.session_state.username = None
-    st.experimental_rerun()
+    st.session_state.pop('account', None)
+    st.session_state.pop('valuation_cache', None)
+    st.rerun()
 
 # ----------------------
 # 세션 상태 초기화
 # ----------------------
 if 'account' not in st.session_state:
-    st.session_state.account = VirtualAccount()
+    # 로그인한 사용자의 계좌를 users.db 에서 불러온다 (보유 종목은 처음 필요할 때 조회)
+    st.session_state.account = load_account(st.session_state.username)
 if 'log' not in st.session_state:
     st.session_state.log = []
 if 'stock_info' not in st.session_state:
@@ -436,75 +420,70 @@ st.sidebar.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-st.sidebar.markdown('<div class="sidebar-header">📊 자산 현황</div>', unsafe_allow_html=True)
+# 자산 현황 패널 (자체 타이머로 갱신)
+@st.fragment(run_every=ASSET_PANEL_REFRESH)
+def asset_panel():
+    st.markdown('<div class="sidebar-header">📊 자산 현황</div>', unsafe_allow_html=True)
 
-# 보유 자산 현황 표시
-stock_holdings = st.session_state.account.holdings
+    # 보유 자산 현황 표시
+    stock_holdings = st.session_state.account.holdings
 
-# 총 자산 현황
-total_assets = st.session_state.account.cash
-if stock_holdings:
-    for name, qty in stock_holdings.items():
-        try:
-            if name.startswith('KRW-'):
-                symbol, price, _ = get_crypto_price(name.replace('KRW-', ''))
-            else:
-                _, price, _, _ = get_stock_price(name)
-            if price != -1:
-                total_assets += price * qty
-        except:
-            continue
+    # 보유 종목 평가 (거래소별로 한 번씩만 조회해서 아래 표시에 재사용)
+    valuation = cached_valuation(st.session_state.account)
 
-st.sidebar.markdown(f'''
+    # 총 자산 현황
+    total_assets = valuation.total
+
+    st.markdown(f'''
     <div class="total-assets">
         💰 총 자산: {total_assets:,.0f}원
         <div class="cash-balance">💵 보유 현금: {st.session_state.account.cash:,.0f}원</div>
+        <div class="cash-balance">📈 실현 손익: {st.session_state.account.realized_pnl:,.0f}원</div>
     </div>
 ''', unsafe_allow_html=True)
 
-# 주식 보유 현황
-st.sidebar.markdown('<div class="asset-section">', unsafe_allow_html=True)
-st.sidebar.markdown('<div class="asset-title">📈 주식 보유 현황</div>', unsafe_allow_html=True)
+    # 주식 보유 현황
+    st.markdown('<div class="asset-section">', unsafe_allow_html=True)
+    st.markdown('<div class="asset-title">📈 주식 보유 현황</div>', unsafe_allow_html=True)
 
-if stock_holdings:
-    for name, qty in stock_holdings.items():
-        if not name.startswith('KRW-'):  # 코인이 아닌 경우만 표시
-            try:
-                # 현재가 조회
-                _, price, _, _ = get_stock_price(name)
-                if price != -1:
+    if stock_holdings:
+        for name, qty in stock_holdings.items():
+            if not is_coin(name):  # 코인이 아닌 경우만 표시
+                price = valuation.prices.get(name)
+                if price is not None:
                     total_value = price * qty
-                    st.sidebar.markdown(f'<div class="asset-item">💰 {name}: {qty:,}주 ({total_value:,}원)</div>', unsafe_allow_html=True)
-            except:
-                st.sidebar.markdown(f'<div class="asset-item">💰 {name}: {qty:,}주</div>', unsafe_allow_html=True)
-else:
-    st.sidebar.markdown('<div class="asset-item">보유 주식 없음</div>', unsafe_allow_html=True)
-st.sidebar.markdown('</div>', unsafe_allow_html=True)
+                    st.markdown(f'<div class="asset-item">💰 {name}: {int(qty):,}주 ({total_value:,.0f}원)</div>', unsafe_allow_html=True)
+                else:
+                    st.markdown(f'<div class="asset-item">💰 {name}: {int(qty):,}주</div>', unsafe_allow_html=True)
+    else:
+        st.markdown('<div class="asset-item">보유 주식 없음</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
 
-# 코인 보유 현황
-st.sidebar.markdown('<div class="asset-section">', unsafe_allow_html=True)
-st.sidebar.markdown('<div class="asset-title">🪙 코인 보유 현황</div>', unsafe_allow_html=True)
-if stock_holdings:
-    for name, qty in stock_holdings.items():
-        if name.startswith('KRW-'):  # 코인인 경우만 표시
-            try:
-                # 현재가 조회
-                symbol, price, _ = get_crypto_price(name.replace('KRW-', ''))
-                if price != -1:
+    # 코인 보유 현황
+    st.markdown('<div class="asset-section">', unsafe_allow_html=True)
+    st.markdown('<div class="asset-title">🪙 코인 보유 현황</div>', unsafe_allow_html=True)
+    if stock_holdings:
+        for name, qty in stock_holdings.items():
+            if is_coin(name):  # 코인인 경우만 표시
+                price = valuation.prices.get(name)
+                if price is not None:
                     total_value = price * qty
-                    st.sidebar.markdown(f'<div class="asset-item">💎 {name}: {qty:.8f}개 ({total_value:,.0f}원)</div>', unsafe_allow_html=True)
-            except:
-                st.sidebar.markdown(f'<div class="asset-item">💎 {name}: {qty:.8f}개</div>', unsafe_allow_html=True)
-else:
-    st.sidebar.markdown('<div class="asset-item">보유 코인 없음</div>', unsafe_allow_html=True)
-st.sidebar.markdown('</div>', unsafe_allow_html=True)
+                    st.markdown(f'<div class="asset-item">💎 {name}: {qty:.8f}개 ({total_value:,.0f}원)</div>', unsafe_allow_html=True)
+                else:
+                    st.markdown(f'<div class="asset-item">💎 {name}: {qty:.8f}개</div>', unsafe_allow_html=True)
+    else:
+        st.markdown('<div class="asset-item">보유 코인 없음</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+with st.sidebar:
+    asset_panel()
 
 # 거래 유형 선택
 st.sidebar.markdown('<div class="menu-section">', unsafe_allow_html=True)
 st.sidebar.markdown('<div class="sidebar-header">💹 거래 유형</div>', unsafe_allow_html=True)
 menu = st.sidebar.radio(
     "거래 유형을 선택하세요",
-    ["주식 거래", "코인 현물 거래", "코인 선물 거래"],
+    ["주식 거래", "코인 현물 거래", "코인 선물 거래", "예약 주문", "전략 백테스트", "자동매매"],
     label_visibility="collapsed"
 )
 st.sidebar.markdown('</div>', unsafe_allow_html=True)
@@ -512,19 +491,23 @@ st.sidebar.markdown('</div>', unsafe_allow_html=True)
 # ----------------------
 # 입금 섹션
 # ----------------------
-st.subheader(f"현재 잔고: {st.session_state.account.get_cash():,} 원")
-deposit_input = st.number_input("입금 금액 입력", min_value=0, step=1000, format="%d", key="deposit_input")
-if st.button("입금", key="deposit_button"):
-    amount = deposit_input
-    st.session_state.account.deposit(amount)
-    st.session_state.log.append(f"입금 완료: {amount:,}원")
-    st.success(f"{amount:,}원 입금됨")
-    st.experimental_rerun()
+@st.fragment
+def deposit_panel():
+    st.subheader(f"현재 잔고: {st.session_state.account.get_cash():,} 원")
+    deposit_input = st.number_input("입금 금액 입력", min_value=0, step=1000, format="%d", key="deposit_input")
+    if st.button("입금", key="deposit_button"):
+        amount = deposit_input
+        st.session_state.account.deposit(amount)
+        st.session_state.log.append(f"입금 완료: {amount:,}원")
+        st.success(f"{amount:,}원 입금됨")
+        st.rerun(scope="fragment")
+
+deposit_panel()
 
 # ----------------------
 # 주식 시세 조회 UI
 # ----------------------
-if menu == "주식 거래":
+def stock_panel():
     st.header("📊 주식 시세 조회")
     if "stock_info" not in st.session_state:
         st.session_state.stock_info = {}
@@ -539,9 +522,11 @@ if menu == "주식 거래":
             if stock_name.strip() == "":
                 st.warning("종목명을 입력해주세요.")
             else:
-                name, price, code, df = get_stock_price(stock_name)
+                name, price, code, _ = get_stock_quote(stock_name)
                 if price != -1:
-                    st.session_state.stock_info = {"name": name, "price": price, "code": code, "data": df}
+                    # 과거 데이터는 차트를 열 때 조회
+                    st.session_state.stock_info = {"name": name, "price": price, "code": code, "data": None}
+                    stop_realtime('stock', "stock_realtime")
                     st.session_state.log.append(f"주식 시세 조회 성공: [{name}] 현재가 {price:,}원 (코드: {code})")
                     st.session_state.show_chart = False
                 else:
@@ -558,56 +543,28 @@ if menu == "주식 거래":
         price = st.session_state.stock_info["price"]
         code = st.session_state.stock_info["code"]
         
+        # 실시간 업데이트 중이면 공용 폴러의 최신 스냅샷 사용
+        if st.session_state.get("stock_realtime"):
+            follow_realtime('stock', code, st.session_state.stock_info)
+            price = st.session_state.stock_info["price"]
+        
         col1, col2 = st.columns([1, 2])
         with col1:
             st.metric(label=f"[{name}] 현재가", value=f"{price:,}원")
         with col2:
             st.write(f"종목코드: {code}")
         
+        # 차트를 처음 열 때만 과거 데이터 조회
+        if st.session_state.show_chart and st.session_state.stock_info["data"] is None:
+            st.session_state.stock_info["data"] = get_stock_history(code)
+        
         # 차트 표시
         if st.session_state.show_chart and st.session_state.stock_info["data"] is not None:
-            df = st.session_state.stock_info["data"]
-            # 캔들스틱 차트 생성
-            fig = make_subplots(rows=2, cols=1, shared_xaxes=True, 
-                              vertical_spacing=0.03, 
-                              row_heights=[0.7, 0.3])
-
-            # 캔들스틱 차트 추가
-            fig.add_trace(go.Candlestick(x=df.index,
-                                       open=df['Open'],
-                                       high=df['High'],
-                                       low=df['Low'],
-                                       close=df['Close'],
-                                       name='OHLC'),
-                        row=1, col=1)
-
-            # 거래량 차트 추가
-            fig.add_trace(go.Bar(x=df.index, y=df['Volume'],
-                               name='Volume'),
-                        row=2, col=1)
-
-            # 차트 레이아웃 설정
-            fig.update_layout(
-                title=f'{name} 주가 차트',
-                yaxis_title='주가',
-                yaxis2_title='거래량',
-                xaxis_rangeslider_visible=False,
-                height=800
-            )
-
-            # 차트 표시
-            st.plotly_chart(fig, use_container_width=True)
+            ohlcv_chart(st.session_state.stock_info["data"], code, '1d',
+                        f'{name} 주가 차트', '주가', "stock_chart_range")
             
             # 실시간 업데이트 버튼
-            if st.button("실시간 업데이트 시작", key="realtime_update"):
-                st.session_state.realtime_update = True
-                while st.session_state.realtime_update:
-                    # 5분마다 데이터 업데이트
-                    time.sleep(300)
-                    name, price, code, df = get_stock_price(stock_name)
-                    if price != -1:
-                        st.session_state.stock_info = {"name": name, "price": price, "code": code, "data": df}
-                        st.experimental_rerun()
+            realtime_toggle('stock', "stock_realtime", "realtime_update")
 
     # 거래 방식 선택: "수량 기준" 또는 "금액 기준"
     trade_method_stock = st.radio("거래 방식 선택", ["수량 기준", "금액 기준"], horizontal=True, key="stock_trade_method")
@@ -631,7 +588,7 @@ if menu == "주식 거래":
                 qty = trade_amount_stock // price
                 if qty < 1:
                     st.error("입력한 금액이 1주 가격보다 작습니다.")
-                    st.stop()
+                    return
                     
             if action_stock == "매수":
                 if st.session_state.account.buy(name, price, qty):
@@ -647,12 +604,11 @@ if menu == "주식 거래":
                 else:
                     st.session_state.log.append("주식 매도 실패: 보유 수량 부족")
                     st.error("[매도 실패] 보유 수량 부족")
-            st.experimental_rerun()
 
 # ----------------------
 # 코인 현물 시세 조회 UI
 # ----------------------
-elif menu == "코인 현물 거래":
+def crypto_panel():
     st.header("🪙 코인 현물 시세 조회")
     if "crypto_info" not in st.session_state:
         st.session_state.crypto_info = {}
@@ -662,9 +618,12 @@ elif menu == "코인 현물 거래":
     
     with col1:
         if st.button("코인 시세 조회", key="crypto_search"):
-            symbol, cprice, df = get_crypto_price(crypto_name)
+            symbol, cprice, _ = get_crypto_quote(crypto_name)
             if cprice != -1:
-                st.session_state.crypto_info = {"symbol": symbol, "price": cprice, "data": df, "name": crypto_name}
+                # 과거 데이터는 차트를 열 때 조회
+                st.session_state.crypto_info = {"symbol": symbol, "price": cprice, "data": None, "name": crypto_name}
+                st.session_state.crypto_chart_open = False
+                stop_realtime('crypto', "crypto_realtime")
                 st.session_state.log.append(f"코인 시세 조회 성공: [{crypto_name}] 현재가 {cprice:,}원 ({symbol})")
             else:
                 st.session_state.log.append("코인 정보 조회 실패")
@@ -676,53 +635,27 @@ elif menu == "코인 현물 거래":
         cprice = st.session_state.crypto_info["price"]
         crypto_name = st.session_state.crypto_info["name"]
         
+        # 실시간 업데이트 중이면 공용 폴러의 최신 스냅샷 사용
+        crypto_realtime = st.session_state.get("crypto_realtime")
+        if crypto_realtime:
+            follow_realtime('crypto', symbol, st.session_state.crypto_info)
+            cprice = st.session_state.crypto_info["price"]
+        
         st.success(f"[{crypto_name}] 현재가: {cprice:,}원 ({symbol})")
         
-        # 차트 표시 버튼
+        # 실시간 업데이트 버튼
+        realtime_toggle('crypto', "crypto_realtime", "crypto_realtime_update")
+        
+        # 차트 표시 버튼 (실시간 업데이트 중에는 항상 표시)
         if st.button("실시간 거래 차트 실행", key="show_crypto_chart"):
-            df = st.session_state.crypto_info["data"]
+            st.session_state.crypto_chart_open = True
+        if st.session_state.get("crypto_chart_open") or crypto_realtime:
+            if st.session_state.crypto_info["data"] is None:
+                st.session_state.crypto_info["data"] = get_crypto_history(symbol)
+            # 진행 중인 봉과 최근 봉은 웹소켓 1분봉으로 갱신
+            df = streamed_history(upbit_stream(), symbol, st.session_state.crypto_info["data"], '1d')
             if df is not None:
-                # 캔들스틱 차트 생성
-                fig = make_subplots(rows=2, cols=1, shared_xaxes=True, 
-                                  vertical_spacing=0.03, 
-                                  row_heights=[0.7, 0.3])
-
-                # 캔들스틱 차트 추가
-                fig.add_trace(go.Candlestick(x=df.index,
-                                           open=df['open'],
-                                           high=df['high'],
-                                           low=df['low'],
-                                           close=df['close'],
-                                           name='OHLC'),
-                            row=1, col=1)
-
-                # 거래량 차트 추가
-                fig.add_trace(go.Bar(x=df.index, y=df['volume'],
-                                   name='Volume'),
-                            row=2, col=1)
-
-                # 차트 레이아웃 설정
-                fig.update_layout(
-                    title=f'{crypto_name} 가격 차트',
-                    yaxis_title='가격 (KRW)',
-                    yaxis2_title='거래량',
-                    xaxis_rangeslider_visible=False,
-                    height=800
-                )
-
-                # 차트 표시
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # 실시간 업데이트 버튼
-                if st.button("실시간 업데이트 시작", key="crypto_realtime_update"):
-                    st.session_state.crypto_realtime_update = True
-                    while st.session_state.crypto_realtime_update:
-                        # 5분마다 데이터 업데이트
-                        time.sleep(300)
-                        symbol, cprice, df = get_crypto_price(crypto_name)
-                        if cprice != -1:
-                            st.session_state.crypto_info = {"symbol": symbol, "price": cprice, "data": df, "name": crypto_name}
-                            st.experimental_rerun()
+                ohlcv_chart(df, symbol, '1d', f'{crypto_name} 가격 차트', '가격 (KRW)', "crypto_chart_range")
 
     # 거래 방식 선택: "수량 기준" 또는 "금액 기준"
     trade_method = st.radio("거래 방식 선택", ["수량 기준", "금액 기준"], horizontal=True, key="crypto_trade_method")
@@ -755,7 +688,7 @@ elif menu == "코인 현물 거래":
                         st.session_state.log.append(f"코인 매수 완료: {qty}개 @ {cprice:,}원")
                         st.success(f"[코인 매수 완료] {qty}개 @ {cprice:,}원")
                         st.session_state.crypto_info = None  # 거래 후 정보 초기화
-                        st.experimental_rerun()
+                        st.rerun(scope="fragment")
                     else:
                         st.session_state.log.append("코인 매수 실패: 잔고 부족")
                         st.error("[코인 매수 실패] 잔고 부족")
@@ -764,7 +697,7 @@ elif menu == "코인 현물 거래":
                         st.session_state.log.append(f"코인 매도 완료: {qty}개 @ {cprice:,}원")
                         st.success(f"[코인 매도 완료] {qty}개 @ {cprice:,}원")
                         st.session_state.crypto_info = None  # 거래 후 정보 초기화
-                        st.experimental_rerun()
+                        st.rerun(scope="fragment")
                     else:
                         st.session_state.log.append("코인 매도 실패: 보유 수량 부족")
                         st.error("[코인 매도 실패] 보유 수량 부족")
@@ -772,7 +705,7 @@ elif menu == "코인 현물 거래":
 # ----------------------
 # 코인 선물 시세 조회 UI
 # ----------------------
-elif menu == "코인 선물 거래":
+def futures_panel():
     st.header("📈 코인 선물 시세 조회")
     if "futures_info" not in st.session_state:
         st.session_state.futures_info = {}
@@ -782,11 +715,14 @@ elif menu == "코인 선물 거래":
     
     with col1:
         if st.button("선물 시세 조회", key="futures_search"):
-            symbol, fprice, df = get_crypto_futures_price(futures_name)
+            symbol, fprice, _ = get_crypto_futures_quote(futures_name)
             if fprice != -1:
-                st.session_state.futures_info = {"symbol": symbol, "price": fprice, "data": df, "name": futures_name}
+                # 과거 데이터는 차트를 열 때 조회
+                st.session_state.futures_info = {"symbol": symbol, "price": fprice, "data": None, "name": futures_name}
+                stop_realtime('futures', "futures_realtime")
+                st.session_state.futures_chart_open = False
                 # 코인 현물 정보도 함께 업데이트
-                st.session_state.crypto_info = {"symbol": f"KRW-{symbol.split('/')[0]}", "price": fprice, "data": df, "name": futures_name}
+                st.session_state.crypto_info = {"symbol": f"KRW-{symbol.split('/')[0]}", "price": fprice, "data": None, "name": futures_name}
                 st.session_state.log.append(f"선물 시세 조회 성공: [{futures_name}] 현재가 {fprice:,}원 ({symbol})")
             else:
                 st.session_state.log.append("선물 정보 조회 실패")
@@ -798,54 +734,27 @@ elif menu == "코인 선물 거래":
         fprice = st.session_state.futures_info["price"]
         futures_name = st.session_state.futures_info["name"]
         
+        # 실시간 업데이트 중이면 공용 폴러의 최신 스냅샷 사용
+        futures_realtime = st.session_state.get("futures_realtime")
+        if futures_realtime:
+            follow_realtime('futures', symbol, st.session_state.futures_info)
+            fprice = st.session_state.futures_info["price"]
+        
         st.success(f"[{futures_name}] 현재가: {fprice:,}원 ({symbol})")
         
-        # 차트 표시 버튼
+        # 실시간 업데이트 버튼
+        realtime_toggle('futures', "futures_realtime", "futures_realtime_update")
+        
+        # 차트 표시 버튼 (실시간 업데이트 중에는 항상 표시)
         if st.button("실시간 거래 차트 실행", key="show_futures_chart"):
-            df = st.session_state.futures_info["data"]
+            st.session_state.futures_chart_open = True
+        if st.session_state.get("futures_chart_open") or futures_realtime:
+            if st.session_state.futures_info["data"] is None:
+                st.session_state.futures_info["data"] = get_crypto_futures_history(symbol)
+            # 진행 중인 봉과 최근 봉은 웹소켓 1분봉으로 갱신
+            df = streamed_history(binance_futures_stream(), symbol, st.session_state.futures_info["data"], '1h')
             if df is not None:
-                # 캔들스틱 차트 생성
-                fig = make_subplots(rows=2, cols=1, shared_xaxes=True, 
-                                  vertical_spacing=0.03, 
-                                  row_heights=[0.7, 0.3])
-
-                # 캔들스틱 차트 추가
-                fig.add_trace(go.Candlestick(x=df.index,
-                                           open=df['open'],
-                                           high=df['high'],
-                                           low=df['low'],
-                                           close=df['close'],
-                                           name='OHLC'),
-                            row=1, col=1)
-
-                # 거래량 차트 추가
-                fig.add_trace(go.Bar(x=df.index, y=df['volume'],
-                                   name='Volume'),
-                            row=2, col=1)
-
-                # 차트 레이아웃 설정
-                fig.update_layout(
-                    title=f'{futures_name} 선물 가격 차트',
-                    yaxis_title='가격 (KRW)',
-                    yaxis2_title='거래량',
-                    xaxis_rangeslider_visible=False,
-                    height=800
-                )
-
-                # 차트 표시
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # 실시간 업데이트 버튼
-                if st.button("실시간 업데이트 시작", key="futures_realtime_update"):
-                    st.session_state.futures_realtime_update = True
-                    while st.session_state.futures_realtime_update:
-                        # 5분마다 데이터 업데이트
-                        time.sleep(300)
-                        symbol, fprice, df = get_crypto_futures_price(futures_name)
-                        if fprice != -1:
-                            st.session_state.futures_info = {"symbol": symbol, "price": fprice, "data": df, "name": futures_name}
-                            st.session_state.crypto_info = {"symbol": f"KRW-{symbol.split('/')[0]}", "price": fprice, "data": df, "name": futures_name}
-                            st.experimental_rerun()
+                ohlcv_chart(df, symbol, '1h', f'{futures_name} 선물 가격 차트', '가격 (KRW)', "futures_chart_range")
 
     # 선물 거래 방식 선택: "수량 기준" 또는 "금액 기준"
     futures_trade_method = st.radio("선물 거래 방식 선택", ["수량 기준", "금액 기준"], horizontal=True, key="futures_trade_method")
@@ -880,7 +789,6 @@ elif menu == "코인 선물 거래":
                     if st.session_state.account.buy(spot_symbol, fprice, qty):
                         st.session_state.log.append(f"선물 매수 완료: {qty}개 @ {fprice:,}원")
                         st.success(f"[선물 매수 완료] {qty}개 @ {fprice:,}원")
-                        st.experimental_rerun()  # 자산 현황 업데이트를 위해 페이지 새로고침
                     else:
                         st.session_state.log.append("선물 매수 실패: 잔고 부족")
                         st.error("[선물 매수 실패] 잔고 부족")
@@ -888,23 +796,333 @@ elif menu == "코인 선물 거래":
                     if st.session_state.account.sell(spot_symbol, fprice, qty):
                         st.session_state.log.append(f"선물 매도 완료: {qty}개 @ {fprice:,}원")
                         st.success(f"[선물 매도 완료] {qty}개 @ {fprice:,}원")
-                        st.experimental_rerun()  # 자산 현황 업데이트를 위해 페이지 새로고침
                     else:
                         st.session_state.log.append("선물 매도 실패: 보유 수량 부족")
                         st.error("[선물 매도 실패] 보유 수량 부족")
 
+# ----------------------
+# 전략 백테스트 섹션
+# ----------------------
+BACKTEST_KINDS = {"주식": 'stock', "코인 현물": 'crypto', "코인 선물": 'futures'}
+
+def backtest_symbol(kind, name):
+    if kind == 'stock':
+        return krx_registry().get_code(name)
+    if kind == 'crypto':
+        return f"KRW-{coin_symbol(name)}"
+    return f"{coin_symbol(name)}/USDT"
+
+def parse_grid_values(text, default):
+    # "10, 20, 30" -> [10, 20, 30] (기본값이 정수면 정수로)
+    values = []
+    for part in text.split(","):
+        try:
+            value = float(part)
+        except ValueError:
+            continue  # 빈 값이나 숫자가 아닌 값은 무시
+        values.append(int(value) if isinstance(default, int) and value.is_integer() else value)
+    return values or [default]
+
+def parse_percents(text):
+    # "5, 10" -> [0.05, 0.1] (빈 값은 무시, 숫자가 아니면 ValueError)
+    return [float(part) / 100 for part in text.split(",") if part.strip()]
+
+@st.fragment
+def backtest_panel():
+    st.header("🧪 전략 백테스트")
+    kind = BACKTEST_KINDS[st.radio("종목 유형", list(BACKTEST_KINDS), horizontal=True, key="bt_kind")]
+    name = st.text_input("종목 이름 입력 (예: 삼성전자, 비트코인)", key="bt_name")
+    strategy = st.selectbox("전략", list(STRATEGIES), format_func=lambda s: STRATEGIES[s].label, key="bt_strategy")
+    params = {}
+    param_cols = st.columns(len(STRATEGIES[strategy].params))
+    for col, (param, default) in zip(param_cols, STRATEGIES[strategy].params.items()):
+        with col:
+            params[param] = st.number_input(param, value=default, key=f"bt_{strategy}_{param}")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        days = st.number_input("기간 (일)", min_value=30, max_value=5 * 365, value=365, step=30, key="bt_days")
+    with col2:
+        init_cash = st.number_input("초기 자금", min_value=10000, value=DEFAULT_BACKTEST_CASH, step=100000, key="bt_cash")
+    # 이전 봉의 상태에 따라 결과가 달라지는 규칙은 봉 단위 시뮬레이션(simulate)으로 실행
+    with st.expander("트레일링 스톱 / 단계별 익절 / 매수 비율"):
+        col1, col2 = st.columns(2)
+        with col1:
+            trail_pct = st.number_input("트레일링 스톱 (%)", min_value=0.0, max_value=99.0, value=0.0, step=1.0, key="bt_trail")
+        with col2:
+            alloc_pct = st.number_input("매수 비율 (현재 현금의 %)", min_value=1.0, max_value=100.0, value=100.0, step=5.0, key="bt_alloc")
+        col1, col2 = st.columns(2)
+        with col1:
+            tp_levels_text = st.text_input("익절 단계 (진입가 대비 %, 예: 5, 10)", key="bt_tp_levels")
+        with col2:
+            tp_fractions_text = st.text_input("단계별 매도 비율 (진입 수량의 %, 예: 50, 50)", key="bt_tp_fractions")
+
+    if st.button("백테스트 실행", key="bt_run"):
+        symbol = backtest_symbol(kind, name.strip())
+        if not name.strip() or symbol is None:
+            st.warning("종목을 찾을 수 없습니다.")
+            return
+        try:
+            tp_levels, tp_fractions = parse_percents(tp_levels_text), parse_percents(tp_fractions_text)
+        except ValueError:
+            st.warning("익절 단계와 매도 비율은 쉼표로 구분한 숫자로 입력하세요.")
+            return
+        if len(tp_levels) != len(tp_fractions):
+            st.warning("익절 단계와 매도 비율의 개수가 같아야 합니다.")
+            return
+        try:
+            # 처음 조회하는 기간은 업스트림에서 받아 봉 저장소에 쌓는다
+            with st.spinner("과거 데이터 불러오는 중..."):
+                df = load_history(kind, symbol, days)
+        except Exception as e:
+            st.error(f"과거 데이터 조회 중 오류 발생: {str(e)}")
+            return
+        if df is None or len(df) < 2:
+            st.warning("과거 데이터를 가져올 수 없습니다.")
+            return
+        # 주식은 정수 주, 코인/선물은 소수 수량으로 체결
+        if trail_pct > 0 or alloc_pct < 100 or tp_levels:
+            result = run_path_strategy(df, strategy, params, init_cash=init_cash, alloc=alloc_pct / 100,
+                                       trail_pct=trail_pct / 100, tp_levels=tp_levels, tp_fractions=tp_fractions,
+                                       fractional=kind != 'stock')
+            table = result.fills
+        else:
+            result = run_strategy(df, strategy, params, init_cash, fractional=kind != 'stock')
+            table = result.trades
+        st.session_state.backtest_result = {"name": name, "strategy": strategy, "result": result, "table": table}
+        st.session_state.log.append(
+            f"백테스트 완료: [{name}] {STRATEGIES[strategy].label} 수익률 {result.stats['total_return']:.2%}")
+
+    saved = st.session_state.get("backtest_result")
+    if saved:
+        result = saved["result"]
+        stats = result.stats
+        st.subheader(f"{saved['name']} - {STRATEGIES[saved['strategy']].label}")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("최종 평가액", f"{stats['final_equity']:,.0f}원", f"{stats['total_return']:.2%}")
+        col2.metric("최대 낙폭", f"{stats['max_drawdown']:.2%}")
+        col3.metric("샤프 지수", f"{stats['sharpe']:.2f}")
+        col4.metric("거래 수 / 승률", f"{stats['trades']}회", f"{stats['win_rate']:.0%}")
+        st.line_chart(display_frame(result.equity))
+        st.dataframe(saved["table"], use_container_width=True)
+
+    # 여러 종목 x 파라미터 조합을 프로세스 풀로 한 번에 실행
+    with st.expander("파라미터 스윕"):
+        names = st.text_input("종목 이름 (여러 개는 쉼표로 구분)", key="sweep_names")
+        grid = {}
+        grid_cols = st.columns(len(STRATEGIES[strategy].params))
+        for col, (param, default) in zip(grid_cols, STRATEGIES[strategy].params.items()):
+            with col:
+                text = st.text_input(f"{param} 값 목록", value=str(default), key=f"sweep_{strategy}_{param}")
+                grid[param] = parse_grid_values(text, default)
+        if st.button("스윕 실행", key="sweep_run"):
+            frames = {}
+            with st.spinner("과거 데이터 불러오는 중..."):
+                for sweep_name in [n.strip() for n in names.split(",") if n.strip()]:
+                    symbol = backtest_symbol(kind, sweep_name)
+                    try:
+                        df = load_history(kind, symbol, days) if symbol else None
+                    except Exception as e:
+                        st.warning(f"[{sweep_name}] 과거 데이터 조회 중 오류 발생: {str(e)}")
+                        continue
+                    if df is None or len(df) < 2:
+                        st.warning(f"[{sweep_name}] 과거 데이터를 가져올 수 없습니다.")
+                        continue
+                    frames[symbol] = df
+            if frames:
+                with st.spinner("스윕 실행 중..."):
+                    table = sweep(frames, strategy, grid, init_cash,
+                                  fractional={symbol: kind != 'stock' for symbol in frames})
+                st.session_state.sweep_result = table
+                st.session_state.log.append(f"파라미터 스윕 완료: {len(frames)}개 종목, {len(table)}개 조합")
+        if st.session_state.get("sweep_result") is not None:
+            st.dataframe(st.session_state.sweep_result, use_container_width=True)
+
+# ----------------------
+# 자동매매 섹션
+# ----------------------
+def autotrade_target(kind, name):
+    # (시세 조회용 심볼, 계좌 보유 종목 이름) - 수동 거래와 같은 이름으로 보유
+    if kind == 'stock':
+        code = krx_registry().get_code(name)
+        return (code, name) if code else (None, None)
+    if kind == 'crypto':
+        ticker = f"KRW-{coin_symbol(name)}"
+        return ticker, ticker
+    # 선물은 바이낸스에 상장된 심볼만 받는다 (마켓 정보를 못 받으면 찾을 수 없는 것으로 처리)
+    symbol = f"{coin_symbol(name)}/USDT"
+    try:
+        listed = fetch_one('binance', exchange_pool().has_symbol, symbol, 'binance', 'future')
+    except Exception:
+        listed = False
+    if not listed:
+        return None, None
+    return symbol, f"KRW-{coin_symbol(name)}"
+
+def autotrade_panel():
+    st.header("🤖 자동매매")
+    st.caption("등록한 규칙은 서버에서 실시간 시세로 계속 실행됩니다. (접속하지 않아도 동작)")
+    kind = BACKTEST_KINDS[st.radio("종목 유형", list(BACKTEST_KINDS), horizontal=True, key="auto_kind")]
+    name = st.text_input("종목 이름 입력 (예: 삼성전자, 비트코인)", key="auto_name")
+    strategy = st.selectbox("전략", list(STRATEGIES), format_func=lambda s: STRATEGIES[s].label, key="auto_strategy")
+    params = {}
+    param_cols = st.columns(len(STRATEGIES[strategy].params))
+    for col, (param, default) in zip(param_cols, STRATEGIES[strategy].params.items()):
+        with col:
+            params[param] = st.number_input(param, value=default, key=f"auto_{strategy}_{param}")
+    amount = st.number_input("1회 매수 금액", min_value=1000, value=100000, step=10000, key="auto_amount")
+
+    if st.button("규칙 추가", key="auto_add"):
+        symbol, holding_name = autotrade_target(kind, name.strip())
+        if not name.strip() or symbol is None:
+            st.warning("종목을 찾을 수 없습니다.")
+        else:
+            try:
+                auto_trader().add_rule(st.session_state.username, kind, symbol, holding_name, strategy, params, amount)
+            except ValueError as e:
+                st.warning(str(e))
+            else:
+                st.session_state.log.append(f"자동매매 규칙 추가: [{name}] {STRATEGIES[strategy].label}")
+
+    autotrade_status()
+
+@st.fragment(run_every=AUTOTRADE_PANEL_REFRESH)
+def autotrade_status():
+    trader = auto_trader()
+    st.subheader("내 규칙")
+    rules = trader.rules_for(st.session_state.username)
+    if not rules:
+        st.write("등록된 규칙이 없습니다.")
+    for rule in rules:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(f"#{rule.rule_id} [{rule.name}] {STRATEGIES[rule.strategy].label} {rule.params} / {rule.amount:,.0f}원")
+        with col2:
+            if st.button("삭제", key=f"auto_remove_{rule.rule_id}"):
+                trader.remove_rule(st.session_state.username, rule.rule_id)
+                st.rerun(scope="fragment")
+
+    # 틱 수신부터 체결까지 걸린 시간 (전체 사용자 기준)
+    stats = trader.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("실행 중인 규칙", stats['rules'])
+    col2.metric("주문 수", stats['orders'])
+    col3.metric("지연 p50", f"{stats['p50_ms']:.1f} ms")
+    col4.metric("지연 p95", f"{stats['p95_ms']:.1f} ms")
+
+    decisions = trader.decisions_for(st.session_state.username)
+    if decisions:
+        st.subheader("최근 주문")
+        st.dataframe(pd.DataFrame([{
+            "시각": datetime.fromtimestamp(d.at).strftime("%H:%M:%S"), "규칙": d.rule_id, "종목": d.name,
+            "구분": "매수" if d.side == 'buy' else "매도", "가격": d.price, "수량": d.qty,
+            "체결": "성공" if d.ok else "실패", "지연(ms)": round(d.latency_ms, 1),
+        } for d in decisions]), use_container_width=True)
+
+# ----------------------
+# 예약 주문 섹션
+# ----------------------
+def order_panel():
+    st.header("⏰ 예약 주문")
+    st.caption("지정가/손절/익절 주문은 서버에서 실시간 시세가 주문 가격에 닿으면 그 시세로 체결됩니다.")
+    kind = BACKTEST_KINDS[st.radio("종목 유형", list(BACKTEST_KINDS), horizontal=True, key="order_kind")]
+    name = st.text_input("종목 이름 입력 (예: 삼성전자, 비트코인)", key="order_name")
+    col1, col2 = st.columns(2)
+    with col1:
+        side = st.radio("구분", ['buy', 'sell'], format_func=lambda s: "매수" if s == 'buy' else "매도",
+                        horizontal=True, key="order_side")
+    with col2:
+        types = [t for t in ORDER_TYPES if (t, side) in ORDER_DIRECTIONS]
+        order_type = st.selectbox("주문 유형", types, format_func=ORDER_TYPES.get, key="order_type")
+    col1, col2 = st.columns(2)
+    with col1:
+        price = st.number_input("주문 가격", min_value=0.0, value=0.0, format="%f", key="order_price")
+    with col2:
+        qty = st.number_input("수량", min_value=0.0, value=1.0 if kind == 'stock' else 0.01,
+                              step=1.0 if kind == 'stock' else 0.01, format="%f", key="order_qty")
+
+    if st.button("주문 등록", key="order_place"):
+        symbol, holding_name = autotrade_target(kind, name.strip())
+        if not name.strip() or symbol is None:
+            st.warning("종목을 찾을 수 없습니다.")
+        elif price <= 0 or qty <= 0:
+            st.warning("주문 가격과 수량을 입력하세요.")
+        elif kind == 'stock' and qty != int(qty):
+            st.warning("주식은 정수 수량만 주문할 수 있습니다.")
+        else:
+            order_engine().place(st.session_state.username, kind, symbol, holding_name, side, order_type, price, qty)
+            st.session_state.log.append(f"예약 주문 등록: [{name}] {ORDER_TYPES[order_type]} {price:,} x {qty}")
+
+    order_status()
+
+@st.fragment(run_every=ORDER_PANEL_REFRESH)
+def order_status():
+    engine = order_engine()
+    st.subheader("대기 중인 주문")
+    orders = engine.open_orders(st.session_state.username)
+    if not orders:
+        st.write("대기 중인 주문이 없습니다.")
+    for order in orders:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(f"#{order.order_id} [{order.name}] {ORDER_TYPES[order.type]} "
+                     f"{'매수' if order.side == 'buy' else '매도'} {order.price:,} x {order.qty}")
+        with col2:
+            if st.button("취소", key=f"order_cancel_{order.order_id}"):
+                engine.cancel(st.session_state.username, order.order_id)
+                st.rerun(scope="fragment")
+
+    # 틱당 매칭 시간 (전체 사용자 기준)
+    stats = engine.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("대기 주문(전체)", stats['resting'])
+    col2.metric("체결 수", stats['fills'])
+    col3.metric("매칭 p50", f"{stats['p50_us']:.0f} µs")
+    col4.metric("매칭 p99", f"{stats['p99_us']:.0f} µs")
+
+    closed = engine.closed_orders(st.session_state.username)
+    if closed:
+        st.subheader("최근 처리된 주문")
+        statuses = {'filled': "체결", 'rejected': "거부(잔고 부족)", 'cancelled': "취소", 'error': "오류"}
+        st.dataframe(pd.DataFrame([{
+            "주문": order_id, "종목": name, "구분": "매수" if side == 'buy' else "매도", "유형": ORDER_TYPES[type_],
+            "주문 가격": trigger, "수량": qty, "상태": statuses.get(status, status),
+            "처리 시각": datetime.fromtimestamp(filled_at).strftime("%H:%M:%S") if filled_at else "",
+            "체결 가격": fill_price,
+        } for order_id, name, side, type_, trigger, qty, status, filled_at, fill_price in closed]),
+            use_container_width=True)
+
+# ----------------------
+# 선택한 거래 유형 패널 표시
+# ----------------------
+if menu == "주식 거래":
+    realtime_fragment("stock_realtime", stock_panel)()
+elif menu == "코인 현물 거래":
+    realtime_fragment("crypto_realtime", crypto_panel)()
+elif menu == "코인 선물 거래":
+    realtime_fragment("futures_realtime", futures_panel)()
+elif menu == "예약 주문":
+    order_panel()
+elif menu == "전략 백테스트":
+    backtest_panel()
+elif menu == "자동매매":
+    autotrade_panel()
+
 # ----------------------
 # 실행 로그 출력
 # ----------------------
-st.markdown("### 실행 로그")
-col1, col2 = st.columns([3, 1])
-with col1:
-    if st.session_state.log:
-        for log in st.session_state.log:
-            st.write(log)
-    else:
-        st.write("로그가 없습니다.")
-with col2:
-    if st.button("로그 삭제", key="clear_log"):
-        st.session_state.log = []
-        st.experimental_rerun()
\ No newline at end of file
+@st.fragment(run_every=LOG_PANEL_REFRESH)
+def log_panel():
+    st.markdown("### 실행 로그")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        if st.session_state.log:
+            for log in st.session_state.log:
+                st.write(log)
+        else:
+            st.write("로그가 없습니다.")
+    with col2:
+        if st.button("로그 삭제", key="clear_log"):
+            st.session_state.log = []
+            st.rerun(scope="fragment")
+
+log_panel()
\ No newline at end of file
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import sqlite3
+
+from db import connection
+
+SQL_AUTHENTICATE = 'SELECT 1 FROM users WHERE username = ? AND password = ?'
+SQL_REGISTER = 'INSERT INTO users (username, password, email) VALUES (?, ?, ?)'
+
+
+# ----------------------
+# 비밀번호 해싱
+# ----------------------
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+# ----------------------
+# 사용자 인증
+# ----------------------
+def authenticate_user(username, password):
+    user = connection().execute(SQL_AUTHENTICATE, (username, hash_password(password))).fetchone()
+    return user is not None
+
+
+# ----------------------
+# 사용자 등록
+# ----------------------
+def register_user(username, password, email):
+    try:
+        connection().execute(SQL_REGISTER, (username, hash_password(password), email))
+        return True
+    except sqlite3.IntegrityError:
+        return False
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+import db
+from account import load_account
+from backtest import STRATEGIES, required_bars
+from market_data import exchange_pool, fetch_crypto_history, fetch_futures_history, fetch_stock_history
+from poller import market_poller
+from scheduler import BACKGROUND, with_priority
+from ticks import TickQueue, subscribe
+
+# ----------------------
+# 자동매매 실행기
+# ----------------------
+# 사용자별 규칙(종목 + 전략 + 1회 매수 금액)을 users.db 에 저장해두고,
+# 스트림릿 스크립트와 별개인 백그라운드 스레드 하나가 모든 사용자의 규칙을 실행한다.
+# 웹소켓 스트림과 공용 폴러의 현재가 갱신을 TickQueue 로 받아서(밀린 틱은 합침)
+# 틱마다 그 종목의 규칙만 평가해서 VirtualAccount 로 주문한다.
+# - 전략 신호가 보유인데 보유하지 않았으면 매수 (주식은 정수 주)
+# - 전략 신호가 비보유인데 보유 중이면 전량 매도
+# 틱 수신부터 체결까지 걸린 시간을 기록해서 시장보다 얼마나 늦는지 확인할 수 있다.
+# 봉 데이터는 그 종목 규칙들 중 가장 긴 지표 기간(+워밍업)만큼 받고, 봉이 모자라면 주문하지 않는다.
+AUTOTRADER_SESSION = 'autotrader'  # 폴러 구독에 사용하는 세션 ID
+RESUBSCRIBE_INTERVAL = 60  # 폴러 구독 만료(10분) 전에 주기적으로 갱신
+BAR_REFRESH_INTERVAL = 60
+LATENCY_SAMPLES = 1000
+DECISION_HISTORY = 50  # 사용자별로 보관할 최근 주문 기록
+# 종목 유형별 하루 봉 수 (주식은 거래일 일봉, 코인은 일봉, 선물은 1시간 봉)
+BARS_PER_DAY = {'stock': 240 / 365, 'crypto': 1, 'futures': 24}
+MAX_LOOKBACK_DAYS = 2 * 365  # 규칙이 요구할 수 있는 최대 과거 기간
+
+AutoRule = namedtuple('AutoRule', ['rule_id', 'username', 'kind', 'symbol', 'name', 'strategy', 'params', 'amount'])
+Decision = namedtuple('Decision', ['at', 'rule_id', 'name', 'side', 'price', 'qty', 'ok', 'latency_ms'])
+
+SQL_LOAD_RULES = (
+    'SELECT r.id, u.username, r.kind, r.symbol, r.name, r.strategy, r.params, r.amount '
+    'FROM auto_rules r JOIN users u ON u.id = r.user_id')
+SQL_ADD_RULE = (
+    'INSERT INTO auto_rules (user_id, kind, symbol, name, strategy, params, amount, created_at) '
+    'SELECT id, ?, ?, ?, ?, ?, ?, ? FROM users WHERE username = ?')
+SQL_REMOVE_RULE = 'DELETE FROM auto_rules WHERE id = ? AND user_id = (SELECT id FROM users WHERE username = ?)'
+
+
+def _lookback_days(kind, bars):
+    # 봉 bars 개를 받으려면 조회해야 하는 기간(일). 진행 중인 오늘 봉 몫으로 하루 더
+    return math.ceil(bars / BARS_PER_DAY[kind]) + 1
+
+
+def _load_bars(kind, symbol, bars):
+    days = _lookback_days(kind, bars)
+    if kind == 'stock':
+        return fetch_stock_history(symbol, days=days)
+    if kind == 'crypto':
+        return fetch_crypto_history(symbol, days=days)
+    return fetch_futures_history(exchange_pool().get('binance', 'future'), symbol, days=days)
+
+
+def _signal(bars, price, strategy, params):
+    # 마지막(진행 중인) 봉의 종가를 현재가로 바꿔서 전략의 마지막 보유 신호를 계산
+    live = bars.copy()
+    close = live.columns.get_loc('close')
+    live.iloc[-1, close] = price
+    live.iloc[-1, live.columns.get_loc('high')] = max(live['high'].iat[-1], price)
+    live.iloc[-1, live.columns.get_loc('low')] = min(live['low'].iat[-1], price)
+    strategy = STRATEGIES[strategy]
+    position = strategy.fn(live, **dict(strategy.params, **params))
+    return bool(np.asarray(position)[-1])
+
+
+class AutoTrader:
+    def __init__(self):
+        self._rules = {}  # (kind, symbol) -> {rule_id: AutoRule}
+        self._lock = threading.Lock()
+        self._ticks = TickQueue(lambda key: key in self._rules)
+        self._bars = {}  # (kind, symbol) -> (loaded_at, 요청한 봉 수, DataFrame)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._decisions = {}  # username -> deque[Decision]
+        self._failed = {}  # rule_id -> 실패한 주문 방향 (신호가 바뀔 때까지 다시 시도하지 않음)
+        self._counters = {'ticks': 0, 'orders': 0, 'errors': 0}
+        self._thread = None
+        self._last_resubscribe = 0.0
+
+    # ----------------------
+    # 규칙 관리
+    # ----------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            for row in db.connection().execute(SQL_LOAD_RULES):
+                self._index(AutoRule(*row[:6], json.loads(row[6]), row[7]))
+            self._thread = threading.Thread(target=with_priority, args=(BACKGROUND, self._run),
+                                            name='autotrader', daemon=True)
+        self._ticks.attach()
+        self._thread.start()
+
+    def _index(self, rule):
+        self._rules.setdefault((rule.kind, rule.symbol), {})[rule.rule_id] = rule
+
+    def add_rule(self, username, kind, symbol, name, strategy, params, amount):
+        if kind not in BARS_PER_DAY:
+            raise ValueError(f"알 수 없는 종목 유형: {kind}")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"알 수 없는 전략: {strategy}")
+        unknown = set(params) - set(STRATEGIES[strategy].params)
+        if unknown:
+            raise ValueError(f"알 수 없는 전략 파라미터: {', '.join(sorted(unknown))}")
+        bars = required_bars(strategy, params)
+        max_bars = int(MAX_LOOKBACK_DAYS * BARS_PER_DAY[kind])
+        if bars > max_bars:
+            raise ValueError(f"전략에 필요한 과거 봉({bars}개)이 조회할 수 있는 최대 봉 수({max_bars}개)보다 많습니다.")
+        conn = db.connection()
+        with db.transaction(conn):
+            cursor = conn.execute(SQL_ADD_RULE, (
+                kind, symbol, name, strategy, json.dumps(params), amount, time.time(), username))
+        if cursor.rowcount == 0:
+            raise ValueError(f"알 수 없는 사용자: {username}")
+        rule = AutoRule(cursor.lastrowid, username, kind, symbol, name, strategy, dict(params), amount)
+        with self._lock:
+            self._index(rule)
+        subscribe(AUTOTRADER_SESSION, kind, symbol)
+        return rule
+
+    def remove_rule(self, username, rule_id):
+        conn = db.connection()
+        with db.transaction(conn):
+            conn.execute(SQL_REMOVE_RULE, (rule_id, username))
+        with self._lock:
+            for key, rules in list(self._rules.items()):
+                rule = rules.get(rule_id)
+                if rule is not None and rule.username == username:
+                    del rules[rule_id]
+                    if not rules:
+                        del self._rules[key]
+                        self._bars.pop(key, None)
+
+    def rules_for(self, username):
+        with self._lock:
+            return [rule for rules in self._rules.values() for rule in rules.values() if rule.username == username]
+
+    def decisions_for(self, username):
+        return list(self._decisions.get(username, ()))
+
+    def stats(self):
+        # 틱 수신부터 체결까지 지연(ms) 분포와 처리 건수
+        latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+        return dict(self._counters, coalesced=self._ticks.coalesced, rules=sum(len(r) for r in self._rules.values()),
+                    p50_ms=float(np.percentile(latencies, 50)), p95_ms=float(np.percentile(latencies, 95)),
+                    max_ms=float(latencies.max()))
+
+    # ----------------------
+    # 실행 루프
+    # ----------------------
+    def _run(self):
+        while True:
+            if time.time() - self._last_resubscribe > RESUBSCRIBE_INTERVAL:
+                self._last_resubscribe = time.time()
+                for kind, symbol in list(self._rules):
+                    try:
+                        subscribe(AUTOTRADER_SESSION, kind, symbol)
+                    except Exception:
+                        self._counters['errors'] += 1
+            for key, (price, received_at) in self._ticks.drain(RESUBSCRIBE_INTERVAL).items():
+                self._counters['ticks'] += 1
+                try:
+                    self._evaluate(key, price, received_at)
+                except Exception:
+                    self._counters['errors'] += 1  # 한 종목이 실패해도 실행기는 계속 동작
+
+    def _bars_for(self, key, needed):
+        loaded = self._bars.get(key)
+        if loaded is None or time.time() - loaded[0] > BAR_REFRESH_INTERVAL or loaded[1] < needed:
+            # 폴러가 받아둔 봉은 화면용 기간이라 규칙에 필요한 봉 수보다 짧을 수 있다
+            snapshot = market_poller().latest(*key) or {}
+            bars = snapshot.get('bars')
+            if bars is None or len(bars) < needed:
+                bars = _load_bars(*key, needed)
+            loaded = self._bars[key] = (time.time(), needed, bars)
+        return loaded[2]
+
+    def _evaluate(self, key, price, received_at):
+        with self._lock:
+            rules = list(self._rules.get(key, {}).values())
+        if not rules:
+            return
+        needed = {rule.rule_id: required_bars(rule.strategy, rule.params) for rule in rules}
+        bars = self._bars_for(key, max(needed.values()))
+        if bars is None or bars.empty:
+            return
+        # 같은 전략/파라미터를 쓰는 규칙끼리는 신호를 한 번만 계산
+        signals = {}
+        for rule in rules:
+            if len(bars) < needed[rule.rule_id]:
+                continue  # 상장 직후 등으로 봉이 모자라면 지표가 NaN 이라 신호를 믿을 수 없다
+            signal_key = (rule.strategy, tuple(sorted(rule.params.items())))
+            if signal_key not in signals:
+                signals[signal_key] = _signal(bars, price, rule.strategy, rule.params)
+            self._execute(rule, signals[signal_key], price, received_at)
+
+    def _execute(self, rule, hold, price, received_at):
+        account = load_account(rule.username)
+        if account is None:
+            return
+        holding = account.holdings.get(rule.name, 0)
+        if self._failed.get(rule.rule_id) == ('buy' if hold else 'sell'):
+            return
+        self._failed.pop(rule.rule_id, None)
+        if hold and holding <= 0:
+            qty = rule.amount / price
+            if rule.kind == 'stock':
+                qty = math.floor(qty)
+            if qty <= 0:
+                return
+            side, ok = 'buy', account.buy(rule.name, price, qty)
+        elif not hold and holding > 0:
+            qty = holding
+            side, ok = 'sell', account.sell(rule.name, price, qty)
+        else:
+            return
+        if not ok:
+            self._failed[rule.rule_id] = side
+        latency_ms = (time.time() - received_at) * 1000
+        self._latencies.append(latency_ms)
+        self._counters['orders'] += 1
+        history = self._decisions.setdefault(rule.username, deque(maxlen=DECISION_HISTORY))
+        history.appendleft(Decision(time.time(), rule.rule_id, rule.name, side, price, qty, ok, latency_ms))
+
+
+_auto_trader = AutoTrader()
+
+
+def auto_trader():
+    return _auto_trader
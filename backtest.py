@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import MACD, RSI, SMA, Bollinger
+from market_data import exchange_pool, fetch_crypto_history, fetch_futures_history, fetch_stock_history
+
+# ----------------------
+# 백테스트
+# ----------------------
+# 전략은 봉 데이터를 받아 "이 봉의 종가 이후 보유 여부"(bool 배열)를 반환하고,
+# 체결은 다음 봉 시가에 VirtualAccount.buy/sell 과 같은 규칙으로 한다.
+# - 매수: 보유 현금 안에서만 (주식은 정수 주, 코인/선물은 소수 수량)
+# - 매도: 보유 수량 전부
+# 봉 단위 파이썬 루프 없이 배열 연산으로 계산하고, 거래 단위로만 반복한다.
+DEFAULT_CASH = 10_000_000
+SECONDS_PER_YEAR = 365.25 * 24 * 60 * 60
+WARMUP_BARS = 5  # 지표가 유효해진 뒤에도 교차를 판단할 수 있도록 더 받는 봉 수
+
+BacktestResult = namedtuple('BacktestResult', ['equity', 'trades', 'stats'])
+# lookback(params): 지표가 유효한 값을 내기까지 필요한 봉 수
+Strategy = namedtuple('Strategy', ['label', 'fn', 'params', 'lookback'])
+
+
+# ----------------------
+# 전략
+# ----------------------
+def _hold_between(entries, exits):
+    # 진입 신호 후 청산 신호가 나올 때까지 보유
+    state = np.where(entries, 1.0, np.where(exits, 0.0, np.nan))
+    return pd.Series(state).ffill().fillna(0).to_numpy() > 0
+
+
+def sma_cross(df, fast=20, slow=60):
+    fast_sma = SMA(fast).compute(df, 0, None)[f'sma_{fast}']
+    slow_sma = SMA(slow).compute(df, 0, None)[f'sma_{slow}']
+    return fast_sma > slow_sma
+
+
+def rsi_reversion(df, period=14, lower=30, upper=70):
+    rsi = RSI(period).compute(df, 0, None)[f'rsi_{period}']
+    return _hold_between(rsi < lower, rsi > upper)
+
+
+def macd_cross(df, fast=12, slow=26, signal=9):
+    indicator = MACD(fast, slow, signal)
+    values = indicator.compute(df, 0, None)
+    return values[indicator.name] > values[f'{indicator.name}_signal']
+
+
+def bollinger_reversion(df, window=20, k=2):
+    mid, upper, lower = Bollinger(window, k).compute(df, 0, None).values()
+    close = df['close'].to_numpy(dtype='float64')
+    return _hold_between(close < lower, close > mid)
+
+
+# EMA 계열(RSI/MACD)은 기간의 3배 정도 지나야 초기값의 영향이 사라진다
+STRATEGIES = {
+    'sma_cross': Strategy('이동평균 교차', sma_cross, {'fast': 20, 'slow': 60},
+                          lambda p: max(p['fast'], p['slow'])),
+    'rsi_reversion': Strategy('RSI 역추세', rsi_reversion, {'period': 14, 'lower': 30, 'upper': 70},
+                              lambda p: 3 * p['period']),
+    'macd_cross': Strategy('MACD 교차', macd_cross, {'fast': 12, 'slow': 26, 'signal': 9},
+                           lambda p: 3 * max(p['fast'], p['slow']) + p['signal']),
+    'bollinger_reversion': Strategy('볼린저 밴드 역추세', bollinger_reversion, {'window': 20, 'k': 2},
+                                    lambda p: p['window']),
+}
+
+
+def required_bars(strategy, params=None):
+    # 전략의 마지막 신호를 계산하는 데 필요한 봉 수 (가장 긴 지표 기간 + 워밍업)
+    strategy = STRATEGIES[strategy]
+    return int(strategy.lookback(dict(strategy.params, **(params or {})))) + WARMUP_BARS
+
+
+# ----------------------
+# 체결 시뮬레이션
+# ----------------------
+def backtest(df, position, init_cash=DEFAULT_CASH, fractional=True):
+    # position[i]: i번째 봉 종가 이후 보유 여부 -> i+1번째 봉 시가에 체결
+    n = len(df)
+    open_ = df['open'].to_numpy(dtype='float64')
+    close = df['close'].to_numpy(dtype='float64')
+    held = np.r_[False, np.asarray(position, dtype=bool)[:-1]]
+
+    flips = np.flatnonzero(np.diff(np.r_[False, held].astype(np.int8)))
+    entries = flips[held[flips]]
+    exits = flips[~held[flips]]
+
+    # 현금/수량은 체결 시점에만 바뀌므로 변화량을 누적해서 만든다
+    cash_delta = np.zeros(n)
+    qty_delta = np.zeros(n)
+    trades = []
+    cash = init_cash
+    for k, entry in enumerate(entries):
+        exit_ = exits[k] if k < len(exits) else n
+        price = open_[entry]
+        qty = cash / price if fractional else np.floor(cash / price)
+        if qty <= 0:
+            continue  # 현금 부족 -> 매수 실패
+        cash -= qty * price
+        cash_delta[entry] -= qty * price
+        qty_delta[entry] += qty
+        if exit_ < n:
+            exit_price = open_[exit_]
+            cash += qty * exit_price
+            cash_delta[exit_] += qty * exit_price
+            qty_delta[exit_] -= qty
+        else:
+            exit_price = close[-1]  # 미청산 포지션은 마지막 종가로 평가
+        trades.append((df.index[entry], price, df.index[exit_] if exit_ < n else None, exit_price, qty,
+                       qty * (exit_price - price), exit_price / price - 1))
+
+    holding = np.cumsum(qty_delta)
+    equity = init_cash + np.cumsum(cash_delta) + holding * close
+    equity = pd.Series(equity, index=df.index, name='equity')
+    trades = pd.DataFrame(trades, columns=['entry_time', 'entry_price', 'exit_time', 'exit_price',
+                                           'qty', 'pnl', 'return'])
+    stats = summary(equity, trades, init_cash)
+    stats['exposure'] = float((holding > 0).mean())  # 보유 중이던 봉의 비율
+    return BacktestResult(equity, trades, stats)
+
+
+def summary(equity, trades, init_cash):
+    values = equity.to_numpy()
+    returns = np.diff(values) / values[:-1] if len(values) > 1 else np.array([])
+    peak = np.maximum.accumulate(values)
+    years = (equity.index[-1] - equity.index[0]).total_seconds() / SECONDS_PER_YEAR if len(values) > 1 else 0
+    # 실제 봉 간격으로 연환산 (주식은 거래일만 있음)
+    periods_per_year = (len(values) - 1) / years if years > 0 else 0
+    std = returns.std() if len(returns) else 0
+    return {
+        'final_equity': float(values[-1]),
+        'total_return': float(values[-1] / init_cash - 1),
+        'cagr': float((values[-1] / init_cash) ** (1 / years) - 1) if years > 0 and values[-1] > 0 else 0.0,
+        'max_drawdown': float(((values - peak) / peak).min()),
+        'sharpe': float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+        'trades': len(trades),
+        'win_rate': float((trades['pnl'] > 0).mean()) if len(trades) else 0.0,
+    }
+
+
+# ----------------------
+# 저장된 과거 데이터로 실행
+# ----------------------
+def load_history(kind, symbol, days, interval='1h'):
+    # 로컬 봉 저장소를 거쳐 조회 (처음 한 번만 업스트림에서 받는다)
+    if kind == 'stock':
+        return fetch_stock_history(symbol, days=days)
+    if kind == 'crypto':
+        return fetch_crypto_history(symbol, days=days)
+    return fetch_futures_history(exchange_pool().get('binance', 'future'), symbol, interval, days=days)
+
+
+def run_strategy(df, strategy, params=None, init_cash=DEFAULT_CASH, fractional=True):
+    strategy = STRATEGIES[strategy]
+    position = strategy.fn(df, **dict(strategy.params, **(params or {})))
+    return backtest(df, position, init_cash, fractional)
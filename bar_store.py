@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+# ----------------------
+# 로컬 OHLCV 저장소
+# ----------------------
+# (source, symbol, interval) 별로 봉 데이터를 SQLite에 저장해두고,
+# 마지막으로 저장된 시각 이후의 봉만 업스트림에서 받아 덧붙인다.
+BAR_STORE_PATH = os.environ.get('BAR_STORE_PATH', 'bars.db')
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+# 코인 거래량은 소수점이 있으므로 거래량은 float64 로 둔다
+BAR_DTYPES = {'open': 'float32', 'high': 'float32', 'low': 'float32', 'close': 'float32', 'volume': 'float64'}
+
+# 1: 봉 시각을 UTC 기준으로 저장 (이전에는 소스별 현지 시각)
+STORE_VERSION = 1
+
+# 마지막 동기화 후 이 시간(초) 안에는 업스트림을 호출하지 않고 디스크에서만 응답
+DEFAULT_SYNC_AGE = 60
+
+
+def normalize_ohlcv(df, tz='UTC'):
+    # 소스별 DataFrame 을 표준 형식으로 변환:
+    # UTC DatetimeIndex('timestamp'), 소문자 OHLCV 컬럼, float32 가격 / float64 거래량
+    # tz 는 시간대 정보가 없는 인덱스가 어느 시간대 기준인지를 나타낸다
+    df = df.rename(columns=str.lower)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(tz)
+    index = index.tz_convert('UTC').rename('timestamp')
+    out = pd.DataFrame({col: df[col].to_numpy(dtype=BAR_DTYPES[col]) for col in BAR_COLUMNS}, index=index)
+    if not out.index.is_monotonic_increasing:
+        out = out.sort_index()
+    return out[~out.index.duplicated(keep='last')]
+
+
+class BarStore:
+    def __init__(self, path=BAR_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._sync_locks = {}
+        self._sync_locks_guard = threading.Lock()
+
+    def _conn(self):
+        # sqlite3 연결은 스레드 간 공유하지 않는다
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('PRAGMA user_version').fetchone()[0] < STORE_VERSION:
+                # 시각 기준이 바뀐 이전 저장분은 버리고 업스트림에서 다시 받는다
+                conn.execute('DROP TABLE IF EXISTS bars')
+                conn.execute('DROP TABLE IF EXISTS bar_sync')
+                conn.execute(f'PRAGMA user_version = {STORE_VERSION}')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS bars (
+                    source TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    open REAL,
+                    high REAL,
+                    low REAL,
+                    close REAL,
+                    volume REAL,
+                    PRIMARY KEY (source, symbol, interval, ts)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS bar_sync (
+                    source TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    synced_at REAL NOT NULL,
+                    covered_from INTEGER NOT NULL,
+                    PRIMARY KEY (source, symbol, interval)
+                )
+            ''')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _sync_lock(self, key):
+        # 같은 시리즈를 여러 세션이 동시에 동기화하지 않도록 키별 락 사용
+        with self._sync_locks_guard:
+            lock = self._sync_locks.get(key)
+            if lock is None:
+                lock = self._sync_locks[key] = threading.Lock()
+            return lock
+
+    def last_timestamp(self, source, symbol, interval):
+        row = self._conn().execute(
+            'SELECT MAX(ts) FROM bars WHERE source = ? AND symbol = ? AND interval = ?',
+            (source, symbol, interval)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return pd.to_datetime(row[0], unit='ms', utc=True)
+
+    def sync_state(self, source, symbol, interval):
+        # (마지막 동기화 시각, 업스트림에서 받아온 구간의 시작 시각)
+        row = self._conn().execute(
+            'SELECT synced_at, covered_from FROM bar_sync WHERE source = ? AND symbol = ? AND interval = ?',
+            (source, symbol, interval)).fetchone()
+        if row is None:
+            return 0.0, None
+        return row[0], pd.to_datetime(row[1], unit='ms', utc=True)
+
+    def append(self, source, symbol, interval, df):
+        ts = df.index.values.astype('datetime64[ms]').astype('int64')
+        rows = zip(
+            [source] * len(df), [symbol] * len(df), [interval] * len(df), ts.tolist(),
+            *(df[col].astype(float).tolist() for col in BAR_COLUMNS)
+        )
+        conn = self._conn()
+        with conn:
+            # 마지막 봉은 아직 진행 중일 수 있으므로 덮어쓴다
+            conn.executemany(
+                'INSERT OR REPLACE INTO bars (source, symbol, interval, ts, open, high, low, close, volume) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def mark_synced(self, source, symbol, interval, covered_from):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO bar_sync (source, symbol, interval, synced_at, covered_from) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (source, symbol, interval, time.time(), int(covered_from.value // 1_000_000)))
+
+    def load(self, source, symbol, interval, start=None):
+        start_ms = 0 if start is None else int(pd.Timestamp(start).value // 1_000_000)
+        df = pd.read_sql_query(
+            'SELECT ts, open, high, low, close, volume FROM bars '
+            'WHERE source = ? AND symbol = ? AND interval = ? AND ts >= ? ORDER BY ts',
+            self._conn(), params=(source, symbol, interval, start_ms))
+        df.index = pd.to_datetime(df.pop('ts'), unit='ms', utc=True)
+        return normalize_ohlcv(df)
+
+    def get_bars(self, source, symbol, interval, start, fetch_since, max_age=DEFAULT_SYNC_AGE):
+        # fetch_since(since) 는 since 시각(UTC) 이후(포함)의 봉을 표준 형식 DataFrame으로 반환
+        key = (source, symbol, interval)
+        start = pd.Timestamp(start)
+        with self._sync_lock(key):
+            synced_at, covered_from = self.sync_state(*key)
+            # 저장된 구간보다 앞선 기간을 요청하면 그 구간부터 다시 받는다
+            backfill = covered_from is None or start < covered_from
+            if backfill or time.time() - synced_at > max_age:
+                last = self.last_timestamp(*key)
+                since = start if backfill or last is None else last
+                new = fetch_since(since)
+                if new is not None and not new.empty:
+                    self.append(source, symbol, interval, new)
+                self.mark_synced(*key, start if backfill else covered_from)
+        return self.load(source, symbol, interval, start)
+
+
+_bar_store = None
+_bar_store_lock = threading.Lock()
+
+
+def bar_store():
+    global _bar_store
+    if _bar_store is None:
+        with _bar_store_lock:
+            if _bar_store is None:
+                _bar_store = BarStore()
+    return _bar_store
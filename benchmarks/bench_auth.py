@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# ----------------------
+# 로그인/회원가입 동시 부하 벤치마크
+# ----------------------
+# 임시 users.db 에 대해 여러 스레드가 동시에 회원가입/로그인/로그인 흐름
+# (인증 + 계좌 로딩)을 실행하고 처리량, p50/p95/p99 지연 시간, 잠금 오류 수를 JSON 으로 출력한다.
+# 실패한 작업(failed)이 있으면 그 시나리오 결과는 valid=false 로 표시하고 종료 코드 1 로 끝난다.
+# 네트워크 없이 실행된다.
+#
+#   python benchmarks/bench_auth.py --threads 32 --ops 200 --output bench_auth.json
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from account import load_account  # noqa: E402
+from auth import authenticate_user, register_user  # noqa: E402
+
+SCENARIOS = ('register', 'login', 'login_flow', 'mixed')
+PASSWORD = 'benchmark-password'
+
+# 시나리오와 실행 전체에서 겹치지 않는 회원가입 이름 (중복 가입 실패로 결과가 왜곡되지 않도록)
+_usernames = itertools.count()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def seed_users(count):
+    for i in range(count):
+        register_user(f'seed{i}', PASSWORD, f'seed{i}@example.com')
+
+
+def make_operation(scenario, worker, seeded):
+    counter = [0]
+
+    def register():
+        counter[0] += 1
+        name = f'{scenario}_w{worker}_{next(_usernames)}'
+        return register_user(name, PASSWORD, f'{name}@example.com')
+
+    def login():
+        counter[0] += 1
+        return authenticate_user(f'seed{(worker + counter[0]) % seeded}', PASSWORD)
+
+    def login_flow():
+        # 로그인 버튼과 같은 순서: 인증 후 계좌 상태 로딩
+        counter[0] += 1
+        username = f'seed{(worker + counter[0]) % seeded}'
+        if not authenticate_user(username, PASSWORD):
+            return False
+        account = load_account(username)
+        return account is not None and account.cash is not None
+
+    def mixed():
+        # 10건 중 1건은 회원가입, 나머지는 로그인 흐름
+        return register() if counter[0] % 10 == 0 else login_flow()
+
+    return {'register': register, 'login': login, 'login_flow': login_flow, 'mixed': mixed}[scenario]
+
+
+def run_scenario(scenario, threads, ops, seeded):
+    latencies = []
+    errors = {'locked': 0, 'other': 0, 'failed': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        op = make_operation(scenario, index, seeded)
+        local_latencies = []
+        local_errors = {'locked': 0, 'other': 0, 'failed': 0}
+        barrier.wait()
+        for _ in range(ops):
+            started = time.perf_counter()
+            try:
+                if not op():
+                    local_errors['failed'] += 1
+            except sqlite3.OperationalError as e:
+                key = 'locked' if 'locked' in str(e) or 'busy' in str(e) else 'other'
+                local_errors[key] += 1
+            except Exception:
+                local_errors['other'] += 1
+            local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            for key, value in local_errors.items():
+                errors[key] += value
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda value: None if value is None else round(value * 1000, 3)  # noqa: E731
+    return {
+        'scenario': scenario,
+        'threads': threads,
+        'operations': len(latencies),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_ops_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+        'errors': errors,
+        'valid': errors['failed'] == 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='authenticate_user / register_user 동시 부하 벤치마크')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=200, help='스레드당 실행 횟수')
+    parser.add_argument('--seed-users', type=int, default=200)
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--output', help='결과 JSON 파일 경로 (없으면 표준 출력)')
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.configure(os.path.join(tmp, 'users.db'))
+        seed_users(args.seed_users)
+        results = [run_scenario(s, args.threads, args.ops, args.seed_users) for s in scenarios]
+
+    report = {
+        'benchmark': 'auth',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    invalid = [r['scenario'] for r in results if not r['valid']]
+    if invalid:
+        print(f"실패한 작업이 있어 결과를 신뢰할 수 없습니다: {', '.join(invalid)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
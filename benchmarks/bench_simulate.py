@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# ----------------------
+# 경로 의존 시뮬레이션 커널 벤치마크
+# ----------------------
+# 임의 경로(기하 브라운 운동) 위에서 Cython 커널(_sim_kernel)과 파이썬 기준 구현(simulate_reference)을
+# 같은 입력으로 실행해서 봉 수별 실행 시간(최솟값)과 속도 배율을 JSON 으로 출력한다.
+# 두 구현의 결과가 다르거나 배율이 --min-speedup 보다 낮으면 valid=false 로 표시하고 종료 코드 1 로 끝난다.
+# 커널은 먼저 빌드해 두어야 한다 (python setup.py build_ext --inplace). 네트워크 없이 실행된다.
+#
+#   python benchmarks/bench_simulate.py --bars 10000 100000 1000000 --output bench_simulate.json
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulate import simulate_reference  # noqa: E402
+
+# (이름, 보유 신호 구간 길이(봉), 트레일링 스톱, 익절 단계, 단계별 매도 비율)
+SCENARIOS = [
+    ('signal_only', 200, 0.0, (), ()),
+    ('trailing_take_profit', 50, 0.05, (0.03, 0.08), (0.5, 0.5)),
+    ('many_fills', 3, 0.01, (0.005,), (0.5,)),
+]
+
+
+def random_path(n, hold, seed):
+    rng = np.random.default_rng(seed)
+    close = 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.005, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.005, n)))
+    signal = np.repeat(rng.random(n // hold + 1) < 0.5, hold)[:n].astype(np.uint8)
+    return [np.ascontiguousarray(a) for a in (open_, high, low, close)], signal
+
+
+def best_time(fn, args, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(kernel, bars, scenario, repeat, min_speedup):
+    name, hold, trail_pct, tp_levels, tp_fractions = scenario
+    prices, signal = random_path(bars, hold, seed=bars)
+    args = (*prices, signal, 1e7, 1.0, trail_pct,
+            np.asarray(tp_levels, dtype='float64'), np.asarray(tp_fractions, dtype='float64'), True)
+    kernel_s, (kernel_equity, kernel_fills) = best_time(kernel, args, repeat)
+    reference_s, (reference_equity, reference_fills) = best_time(simulate_reference, args, repeat)
+    identical = np.array_equal(kernel_equity, reference_equity) and kernel_fills == reference_fills
+    speedup = reference_s / kernel_s if kernel_s else None
+    return {
+        'scenario': name,
+        'bars': bars,
+        'fills': len(kernel_fills),
+        'cython_ms': round(kernel_s * 1000, 3),
+        'python_ms': round(reference_s * 1000, 3),
+        'speedup': round(speedup, 1) if speedup else None,
+        'identical': identical,
+        'valid': identical and speedup is not None and speedup >= min_speedup,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='simulate_kernel / simulate_reference 속도 비교')
+    parser.add_argument('--bars', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3, help='봉 수별 반복 횟수 (가장 빠른 값 사용)')
+    parser.add_argument('--min-speedup', type=float, default=10.0)
+    parser.add_argument('--output', help='결과 JSON 파일 경로 (없으면 표준 출력)')
+    args = parser.parse_args(argv)
+
+    try:
+        from _sim_kernel import simulate_kernel
+    except ImportError as e:
+        print(f"Cython 커널이 빌드되어 있지 않습니다 (python setup.py build_ext --inplace): {e}", file=sys.stderr)
+        return 1
+
+    results = [run(simulate_kernel, bars, scenario, args.repeat, args.min_speedup)
+               for bars in args.bars for scenario in SCENARIOS]
+    report = {
+        'benchmark': 'simulate',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    invalid = [f"{r['scenario']}/{r['bars']}" for r in results if not r['valid']]
+    if invalid:
+        print(f"결과가 다르거나 속도 배율이 {args.min_speedup}배보다 낮습니다: {', '.join(invalid)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
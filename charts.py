@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+from plotly.subplots import make_subplots
+
+# ----------------------
+# 캔들 차트 렌더링
+# ----------------------
+# 화면 폭보다 많은 봉은 어차피 구분되지 않으므로 OHLC 를 보존하는 구간 집계로
+# 봉 개수를 MAX_BARS 이하로 줄여서 보낸다. 거래량은 WebGL(Scattergl)로 그린다.
+MAX_BARS = 500
+CHART_HEIGHT = 800
+FIGURE_CACHE_SIZE = 64
+DISPLAY_TZ = 'Asia/Seoul'  # 봉 데이터는 UTC, 화면에는 한국 시간으로 표시
+
+
+def downsample_ohlcv(df, max_bars=MAX_BARS):
+    # 연속된 봉을 같은 개수씩 묶어 시가=첫 봉, 고가=최대, 저가=최소, 종가=마지막 봉, 거래량=합계
+    n = len(df)
+    if n <= max_bars:
+        return df
+
+    bucket = np.arange(n) * max_bars // n
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    columns = {
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(), starts),
+        'close': df['close'].to_numpy()[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(), starts),
+    }
+    # 보조지표 등 나머지 컬럼은 구간 마지막 봉의 값
+    for col in df.columns:
+        if col not in columns:
+            columns[col] = df[col].to_numpy()[ends]
+    return pd.DataFrame(columns, index=df.index[starts])
+
+
+def display_frame(df):
+    # 표준 형식(UTC) 봉 데이터를 시간대 정보 없는 한국 시간 인덱스로 변환
+    return df.tz_convert(DISPLAY_TZ).tz_localize(None)
+
+
+def ohlcv_figure(df, title, yaxis_title, overlays=(), panels=(), max_bars=MAX_BARS):
+    # overlays 컬럼은 가격 위에, panels 컬럼은 아래 별도 패널에 선으로 그린다
+    df = downsample_ohlcv(df, max_bars)
+
+    # 캔들스틱 차트 생성
+    rows = 3 if panels else 2
+    fig = make_subplots(rows=rows, cols=1, shared_xaxes=True,
+                        vertical_spacing=0.03,
+                        row_heights=[0.6, 0.2, 0.2] if panels else [0.7, 0.3])
+
+    # 캔들스틱 차트 추가
+    fig.add_trace(go.Candlestick(x=df.index,
+                                 open=df['open'],
+                                 high=df['high'],
+                                 low=df['low'],
+                                 close=df['close'],
+                                 name='OHLC'),
+                  row=1, col=1)
+
+    # 거래량 차트 추가 (WebGL)
+    fig.add_trace(go.Scattergl(x=df.index, y=df['volume'],
+                               mode='lines', fill='tozeroy',
+                               name='Volume'),
+                  row=2, col=1)
+
+    # 보조지표 추가 (WebGL)
+    for col in overlays:
+        fig.add_trace(go.Scattergl(x=df.index, y=df[col], mode='lines', name=col), row=1, col=1)
+    for col in panels:
+        fig.add_trace(go.Scattergl(x=df.index, y=df[col], mode='lines', name=col), row=3, col=1)
+
+    # 차트 레이아웃 설정
+    fig.update_layout(
+        title=title,
+        yaxis_title=yaxis_title,
+        yaxis2_title='거래량',
+        xaxis_rangeslider_visible=False,
+        height=CHART_HEIGHT
+    )
+    return fig
+
+
+# ----------------------
+# 차트 HTML 캐시
+# ----------------------
+# 데이터가 그대로인 재실행에서는 Figure 생성과 JSON 직렬화를 모두 건너뛰도록
+# 완성된 차트 HTML 을 (종목, 간격, 표시 구간, 마지막 봉) 기준으로 프로세스 안에 보관한다.
+# 같은 종목을 보는 여러 세션도 같은 결과를 재사용한다.
+# plotly.js 는 CDN 을 쓰지 않고 plotly 패키지에 들어있는 번들을 HTML 에 넣어서 오프라인/방화벽 안에서도 그린다.
+# 번들은 프로세스에서 한 번만 읽고, 캐시에는 차트 부분만 보관한 뒤 반환할 때 번들을 붙인다.
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+_plotlyjs = None
+
+
+def plotlyjs_script():
+    global _plotlyjs
+    if _plotlyjs is None:
+        _plotlyjs = f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    return _plotlyjs
+
+
+def _figure_key(df, symbol, interval, title, overlays, panels):
+    # 진행 중인 마지막 봉은 시각이 같아도 값이 바뀌므로 종가/거래량까지 포함
+    last = df.iloc[-1]
+    return (symbol, interval, title, tuple(overlays), tuple(panels), df.index[0], df.index[-1], len(df),
+            float(last['close']), float(last['volume']))
+
+
+def figure_html(df, symbol, interval, title, yaxis_title, overlays=(), panels=()):
+    key = _figure_key(df, symbol, interval, title, overlays, panels)
+    with _figure_cache_lock:
+        html = _figure_cache.get(key)
+        if html is not None:
+            _figure_cache.move_to_end(key)
+            return plotlyjs_script() + html
+
+    fig = ohlcv_figure(df, title, yaxis_title, overlays, panels)
+    html = fig.to_html(full_html=False, include_plotlyjs=False, config={'responsive': True})
+
+    with _figure_cache_lock:
+        _figure_cache[key] = html
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return plotlyjs_script() + html
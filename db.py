@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+
+# ----------------------
+# users.db 접근 계층
+# ----------------------
+# 스레드마다 연결을 하나씩 만들어 재사용하고(스레드별 풀), WAL 모드로
+# 읽기와 쓰기가 서로 막지 않게 한다. 쿼리 문자열을 상수로 두면 sqlite3 의
+# statement 캐시에서 준비된 문장이 재사용된다.
+# 스키마는 PRAGMA user_version 기준으로 아래 MIGRATIONS 를 순서대로 적용한다.
+DB_PATH = os.environ.get('USERS_DB_PATH', 'users.db')
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+MIGRATIONS = [
+    # 1: 사용자
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ],
+    # 2: 계좌 원장과 스냅샷
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            version INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            symbol TEXT,
+            price REAL,
+            qty REAL,
+            amount REAL NOT NULL,
+            cash_after REAL NOT NULL,
+            cost_after REAL NOT NULL,
+            realized_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            UNIQUE (user_id, version)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            version INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (user_id, version)
+        )
+        ''',
+    ],
+    # 3: 자동매매 규칙
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS auto_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            kind TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            name TEXT NOT NULL,
+            strategy TEXT NOT NULL,
+            params TEXT NOT NULL,
+            amount REAL NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''',
+    ],
+    # 4: 예약 주문 (지정가/손절/익절)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            kind TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            name TEXT NOT NULL,
+            side TEXT NOT NULL,
+            type TEXT NOT NULL,
+            trigger_price REAL NOT NULL,
+            qty REAL NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            filled_at REAL,
+            fill_price REAL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS orders_status ON orders (status)',
+        'CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, status)',
+    ],
+]
+
+_local = threading.local()
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def configure(path):
+    # 다른 DB 파일을 사용 (벤치마크/테스트용). 기존 스레드 연결은 다음 호출 때 새로 만든다
+    global DB_PATH
+    DB_PATH = path
+
+
+def connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(
+            DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+            cached_statements=CACHED_STATEMENTS)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        migrate(conn)
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+
+class transaction:
+    # BEGIN IMMEDIATE 로 쓰기 잠금을 먼저 잡고, 예외가 나면 롤백
+    def __init__(self, conn=None):
+        self.conn = conn if conn is not None else connection()
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def migrate(conn):
+    # 프로세스당 DB 파일별로 한 번만 확인
+    with _migrate_lock:
+        if DB_PATH in _migrated:
+            return
+        with transaction(conn):
+            # 다른 프로세스가 먼저 올렸을 수 있으므로 잠금을 잡은 뒤 버전을 읽는다
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {target}')
+        _migrated.add(DB_PATH)
+
+
+def init_db():
+    connection()
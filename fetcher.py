@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from scheduler import current_priority, with_priority
+
+# ----------------------
+# 동시 시세 조회
+# ----------------------
+# 서로 다른 거래소 요청을 거래소별 스레드 풀에서 병렬로 보내고,
+# 요청마다 정해진 시간 안에 끝난 결과만 모아서 돌려준다.
+# 시간이 지난 요청은 워커에서 계속 실행되므로, 응답이 없는 거래소는 자기 풀만 차지하고
+# 다른 거래소 조회를 막지 않는다. 실제 HTTP 요청에도 같은 타임아웃을 건다 (market_data).
+# 워커 스레드에서는 st.* 를 호출하면 안 되므로 market_data 의 함수만 넘긴다.
+# 워커는 요청한 스레드의 업스트림 요청 우선순위(scheduler.priority)를 이어받는다.
+VENUE_WORKERS = {
+    'krx': 2,
+    'upbit': 4,
+    'binance': 4,
+}
+DEFAULT_WORKERS = 2
+
+# 거래소별 기본 타임아웃(초)
+VENUE_TIMEOUTS = {
+    'krx': 15,
+    'upbit': 3,
+    'binance': 10,
+}
+DEFAULT_TIMEOUT = 5
+
+FetchTask = namedtuple('FetchTask', ['venue', 'fn', 'args', 'timeout'])
+FetchResult = namedtuple('FetchResult', ['values', 'errors'])
+
+_pools = {}  # venue -> ThreadPoolExecutor
+_pools_lock = threading.Lock()
+
+
+def venue_timeout(venue):
+    return VENUE_TIMEOUTS.get(venue, DEFAULT_TIMEOUT)
+
+
+def _pool(venue):
+    pool = _pools.get(venue)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(venue)
+            if pool is None:
+                pool = _pools[venue] = ThreadPoolExecutor(max_workers=VENUE_WORKERS.get(venue, DEFAULT_WORKERS),
+                                                          thread_name_prefix=f'market-fetch-{venue}')
+    return pool
+
+
+def task(venue, fn, *args):
+    return FetchTask(venue, fn, args, venue_timeout(venue))
+
+
+def fetch_all(tasks):
+    # tasks: {키: FetchTask}
+    # 늦거나 실패한 요청은 errors 에 담고, 나머지 결과는 그대로 반환 (부분 결과)
+    started = time.monotonic()
+    level = current_priority()
+    futures = {key: (_pool(t.venue).submit(with_priority, level, t.fn, *t.args), t.timeout)
+               for key, t in tasks.items()}
+
+    values, errors = {}, {}
+    for key, (future, timeout) in futures.items():
+        remaining = max(0.0, started + timeout - time.monotonic())
+        try:
+            values[key] = future.result(timeout=remaining)
+        except TimeoutError:
+            errors[key] = TimeoutError(f"{timeout}초 안에 응답이 없습니다.")
+        except Exception as e:
+            errors[key] = e
+    return FetchResult(values, errors)
+
+
+def fetch_one(venue, fn, *args):
+    # 단일 요청을 타임아웃과 함께 실행 (실패 시 예외를 그대로 전달)
+    result = fetch_all({'value': task(venue, fn, *args)})
+    if 'value' in result.errors:
+        raise result.errors['value']
+    return result.values['value']
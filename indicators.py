@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# 기술적 지표
+# ----------------------
+# 표준 형식 OHLCV(bar_store.normalize_ohlcv) 위에서 NumPy/pandas 배열 연산으로 계산한다.
+# 각 지표는 compute(df, start, prev) 로 start 행부터의 값만 계산하며,
+# 재귀형 지표(EMA/RSI/MACD/ATR/VWAP)는 prev(이전 결과)의 start-1 행 값을 초기값으로 이어서 계산한다.
+# 따라서 새 봉이 들어오면 전체가 아니라 마지막 몇 개 봉만 다시 계산하면 된다.
+# 조회 구간은 '현재 - N일' 이라서 시간이 지나면 앞쪽 봉이 빠지는데, 이때도 빠진 행만 버리고 이어서 계산한다.
+# 그래서 재귀형 지표는 IndicatorSet 이 처음 본 봉부터 이어진 값이다 (같은 봉을 모두 모아 처음부터 계산한 값과 같다).
+# 이름이 '_' 로 시작하는 컬럼은 이어서 계산하기 위한 내부 상태다.
+
+
+def _values(df, column):
+    # 지표 계산은 float64 로 (가격은 float32 로 저장됨)
+    return df[column].to_numpy(dtype='float64')
+
+
+def _seed(prev, column, row):
+    if prev is None or row < 0:
+        return None
+    value = prev[column].iat[row]
+    return None if np.isnan(value) else value
+
+
+def _ewm(values, alpha, seed=None):
+    # y[i] = alpha * x[i] + (1 - alpha) * y[i-1], seed 가 있으면 y[-1] = seed
+    if seed is not None:
+        values = np.r_[seed, values]
+    out = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return out[1:] if seed is not None else out
+
+
+def _rolling(values, window, start):
+    # start 행부터의 이동 평균/표준편차 (앞쪽 window-1 개 봉만 더 읽는다)
+    lo = max(start - window + 1, 0)
+    rolling = pd.Series(values[lo:]).rolling(window)
+    return rolling.mean().to_numpy()[start - lo:], rolling.std(ddof=0).to_numpy()[start - lo:]
+
+
+class Indicator:
+    name = 'indicator'
+    overlay = True  # True 면 가격 차트 위에, False 면 별도 패널에 그린다
+
+    @property
+    def columns(self):
+        # 차트/매매 규칙에서 사용하는 결과 컬럼
+        raise NotImplementedError
+
+    def compute(self, df, start, prev):
+        # {컬럼: start 행부터의 값 배열}
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    def __init__(self, window=20):
+        self.window = window
+        self.name = f'sma_{window}'
+
+    @property
+    def columns(self):
+        return [self.name]
+
+    def compute(self, df, start, prev):
+        mean, _ = _rolling(_values(df, 'close'), self.window, start)
+        return {self.name: mean}
+
+
+class EMA(Indicator):
+    def __init__(self, span=20):
+        self.span = span
+        self.name = f'ema_{span}'
+
+    @property
+    def columns(self):
+        return [self.name]
+
+    def compute(self, df, start, prev):
+        close = _values(df, 'close')[start:]
+        return {self.name: _ewm(close, 2 / (self.span + 1), _seed(prev, self.name, start - 1))}
+
+
+class Bollinger(Indicator):
+    def __init__(self, window=20, k=2):
+        self.window = window
+        self.k = k
+        self.name = f'bb_{window}'
+
+    @property
+    def columns(self):
+        return [f'{self.name}_mid', f'{self.name}_upper', f'{self.name}_lower']
+
+    def compute(self, df, start, prev):
+        mean, std = _rolling(_values(df, 'close'), self.window, start)
+        mid, upper, lower = self.columns
+        return {mid: mean, upper: mean + self.k * std, lower: mean - self.k * std}
+
+
+class VWAP(Indicator):
+    # 조회한 구간의 첫 봉부터 누적
+    name = 'vwap'
+
+    @property
+    def columns(self):
+        return [self.name]
+
+    def compute(self, df, start, prev):
+        typical = (_values(df, 'high')[start:] + _values(df, 'low')[start:] + _values(df, 'close')[start:]) / 3
+        volume = _values(df, 'volume')[start:]
+        cum_pv = np.cumsum(typical * volume) + (_seed(prev, '_vwap_pv', start - 1) or 0.0)
+        cum_v = np.cumsum(volume) + (_seed(prev, '_vwap_v', start - 1) or 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = np.where(cum_v > 0, cum_pv / cum_v, np.nan)
+        return {self.name: vwap, '_vwap_pv': cum_pv, '_vwap_v': cum_v}
+
+
+class RSI(Indicator):
+    # 와일더 평활(alpha = 1/period)
+    overlay = False
+
+    def __init__(self, period=14):
+        self.period = period
+        self.name = f'rsi_{period}'
+
+    @property
+    def columns(self):
+        return [self.name]
+
+    def compute(self, df, start, prev):
+        close = _values(df, 'close')
+        delta = np.diff(close[max(start - 1, 0):])
+        alpha = 1 / self.period
+        gain = _ewm(np.clip(delta, 0, None), alpha, _seed(prev, f'_{self.name}_gain', start - 1))
+        loss = _ewm(np.clip(-delta, 0, None), alpha, _seed(prev, f'_{self.name}_loss', start - 1))
+        if start == 0:
+            # 첫 봉은 변화량이 없다
+            gain = np.r_[np.nan, gain]
+            loss = np.r_[np.nan, loss]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        rsi[np.isnan(gain)] = np.nan
+        return {self.name: rsi, f'_{self.name}_gain': gain, f'_{self.name}_loss': loss}
+
+
+class MACD(Indicator):
+    overlay = False
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self.name = f'macd_{fast}_{slow}_{signal}'
+
+    @property
+    def columns(self):
+        return [self.name, f'{self.name}_signal', f'{self.name}_hist']
+
+    def compute(self, df, start, prev):
+        close = _values(df, 'close')[start:]
+        fast = _ewm(close, 2 / (self.fast + 1), _seed(prev, f'_{self.name}_fast', start - 1))
+        slow = _ewm(close, 2 / (self.slow + 1), _seed(prev, f'_{self.name}_slow', start - 1))
+        macd = fast - slow
+        signal = _ewm(macd, 2 / (self.signal + 1), _seed(prev, f'{self.name}_signal', start - 1))
+        return {
+            self.name: macd, f'{self.name}_signal': signal, f'{self.name}_hist': macd - signal,
+            f'_{self.name}_fast': fast, f'_{self.name}_slow': slow,
+        }
+
+
+class ATR(Indicator):
+    overlay = False
+
+    def __init__(self, period=14):
+        self.period = period
+        self.name = f'atr_{period}'
+
+    @property
+    def columns(self):
+        return [self.name]
+
+    def compute(self, df, start, prev):
+        high = _values(df, 'high')[start:]
+        low = _values(df, 'low')[start:]
+        close = _values(df, 'close')
+        prev_close = close[start - 1:-1] if start > 0 else np.r_[np.nan, close[:-1]]
+        # True Range (첫 봉은 고가 - 저가)
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        return {self.name: _ewm(true_range, 1 / self.period, _seed(prev, self.name, start - 1))}
+
+
+# ----------------------
+# 증분 계산
+# ----------------------
+class IndicatorSet:
+    def __init__(self, indicators):
+        self.indicators = list(indicators)
+        self.result = None
+        self._lock = threading.Lock()
+
+    def _start(self, df):
+        # (이전 결과에서 버릴 앞쪽 행 수, df 에서 다시 계산할 시작 행)
+        # df 의 첫 봉부터 이전 결과의 마지막 봉까지가 겹치면 그 구간은 그대로 두고,
+        # 이전 결과의 마지막 봉(진행 중이었을 수 있음)부터 다시 계산한다. 겹치지 않으면 처음부터 계산
+        result = self.result
+        if result is None or result.empty or df.empty:
+            return 0, 0
+        dropped = int(result.index.searchsorted(df.index[0]))
+        if dropped >= len(result) or result.index[dropped] != df.index[0]:
+            return 0, 0
+        start = len(result) - dropped - 1
+        if start >= len(df) or df.index[start] != result.index[-1]:
+            return 0, 0
+        return dropped, start
+
+    def update(self, df):
+        with self._lock:
+            dropped, start = self._start(df)
+            prev = self.result.iloc[dropped:] if start > 0 else None
+            columns = {}
+            for indicator in self.indicators:
+                columns.update(indicator.compute(df, start, prev))
+            tail = pd.DataFrame(columns, index=df.index[start:])
+            self.result = tail if prev is None else pd.concat([prev.iloc[:start], tail])
+            return self.result
+
+    @property
+    def overlay_columns(self):
+        return [c for i in self.indicators if i.overlay for c in i.columns]
+
+    @property
+    def panel_columns(self):
+        return [c for i in self.indicators if not i.overlay for c in i.columns]
+
+
+# 화면에서 고를 수 있는 지표
+PRESETS = {
+    'SMA 20': lambda: SMA(20),
+    'SMA 60': lambda: SMA(60),
+    'EMA 20': lambda: EMA(20),
+    '볼린저 밴드 20': lambda: Bollinger(20, 2),
+    'VWAP': lambda: VWAP(),
+    'RSI 14': lambda: RSI(14),
+    'MACD 12/26/9': lambda: MACD(12, 26, 9),
+    'ATR 14': lambda: ATR(14),
+}
+
+# ----------------------
+# 종목별 지표 공유
+# ----------------------
+# (종목, 간격, 지표 목록)마다 IndicatorSet 하나를 프로세스 안에서 공유해서
+# 같은 종목을 보는 세션/매매 규칙이 새 봉만 이어서 계산하도록 한다.
+INDICATOR_CACHE_SIZE = 128
+
+_sets = {}
+_sets_lock = threading.Lock()
+
+
+def indicators_for(symbol, interval, names, df):
+    key = (symbol, interval, tuple(names))
+    with _sets_lock:
+        indicator_set = _sets.pop(key, None)
+        if indicator_set is None:
+            indicator_set = IndicatorSet(PRESETS[name]() for name in names)
+        _sets[key] = indicator_set  # 최근 사용 순서 유지
+        while len(_sets) > INDICATOR_CACHE_SIZE:
+            del _sets[next(iter(_sets))]
+    return indicator_set, indicator_set.update(df)
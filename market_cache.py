@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import OrderedDict
+
+# ----------------------
+# 세션 공용 시세 캐시
+# ----------------------
+# 서버 프로세스 하나에 하나만 존재하며 모든 세션이 공유한다.
+# (종목 유형, 데이터 종류, 심볼) 키마다 조회 결과를 TTL 동안 보관하므로
+# 여러 사용자가 같은 종목을 보고 있어도 업스트림 요청은 TTL 당 한 번만 나간다.
+# 캐시에 없는 키를 여러 세션이 동시에 요청하면 한 세션만 조회하고 나머지는 그 결과를 기다린다.
+# 크기를 넘으면 가장 오래 사용하지 않은 항목부터 버린다(LRU).
+# 반환한 값(DataFrame 등)은 세션끼리 공유되므로 수정하지 말고 복사해서 사용해야 한다.
+CACHE_MAX_ENTRIES = 2048
+
+# (종목 유형, 데이터 종류) -> TTL(초)
+CACHE_TTLS = {
+    ('stock', 'quote'): 10,
+    ('crypto', 'quote'): 2,
+    ('futures', 'quote'): 2,
+    ('stock', 'history'): 10 * 60,  # 일봉
+    ('crypto', 'history'): 5 * 60,  # 일봉
+    ('futures', 'history'): 60,  # 1시간 봉
+}
+DEFAULT_TTL = 10
+
+
+class MarketCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self._entries = OrderedDict()  # (kind, what, symbol) -> (만료 시각, 값)
+        self._loading = {}  # 조회 중인 키 -> Lock
+        self._lock = threading.Lock()
+        self._counters = {}  # (kind, what) -> {'hits': n, 'misses': n}
+        self.evictions = 0
+
+    def _count(self, key, field):
+        counters = self._counters.get(key[:2])
+        if counters is None:
+            counters = self._counters[key[:2]] = {'hits': 0, 'misses': 0}
+        counters[field] += 1
+
+    def _lookup(self, key):
+        # 락을 잡은 상태에서 호출. 만료된 항목은 지우고 None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self._count(key, 'hits')
+        return entry
+
+    def get(self, kind, what, symbol, loader):
+        # 캐시에 있으면 그 값을, 없으면 loader() 결과를 저장하고 반환
+        # None 이나 예외는 저장하지 않는다 (다음 요청이 다시 조회)
+        key = (kind, what, symbol)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[1]
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = threading.Lock()
+        with loading:
+            with self._lock:
+                # 기다리는 동안 다른 세션이 받아왔으면 그 결과를 사용
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry[1]
+                self._count(key, 'misses')
+            try:
+                value = loader()
+                if value is not None:
+                    self._store(key, value)
+                return value
+            finally:
+                with self._lock:
+                    if self._loading.get(key) is loading:
+                        del self._loading[key]
+
+    def _store(self, key, value):
+        expires_at = time.monotonic() + self.ttls.get(key[:2], DEFAULT_TTL)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, kind=None, what=None, symbol=None):
+        with self._lock:
+            for key in list(self._entries):
+                if (kind is None or key[0] == kind) and (what is None or key[1] == what) \
+                        and (symbol is None or key[2] == symbol):
+                    del self._entries[key]
+
+    def stats(self):
+        # {(kind, what): {'hits', 'misses', 'hit_rate'}} 와 전체 크기
+        with self._lock:
+            counters = {key: dict(c, hit_rate=c['hits'] / max(c['hits'] + c['misses'], 1))
+                        for key, c in self._counters.items()}
+            return {'entries': len(self._entries), 'evictions': self.evictions, 'counters': counters}
+
+
+_market_cache = MarketCache()
+
+
+def market_cache():
+    return _market_cache
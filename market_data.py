@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import ccxt
+import FinanceDataReader as fdr
+import pandas as pd
+import pyupbit
+import requests
+
+from bar_store import bar_store, normalize_ohlcv
+from fetcher import venue_timeout
+from scheduler import BACKGROUND, priority, request_scheduler, with_priority
+
+# ----------------------
+# HTTP 요청 타임아웃
+# ----------------------
+# pyupbit/fdr 는 requests 를 timeout 없이 호출하므로 응답 없는 거래소에 걸리면 워커가 풀리지 않는다.
+# 이 모듈에서 보내는 requests 요청 중 timeout 이 없는 것에는 그 거래소의 fetcher 타임아웃을 넣는다.
+# ccxt 는 인스턴스를 만들 때 timeout 옵션으로 지정한다 (ExchangePool).
+_http = threading.local()
+_session_request = requests.Session.request
+
+
+def _request_with_timeout(self, method, url, **kwargs):
+    timeout = getattr(_http, 'timeout', None)
+    if kwargs.get('timeout') is None and timeout is not None:
+        kwargs['timeout'] = timeout
+    return _session_request(self, method, url, **kwargs)
+
+
+requests.Session.request = _request_with_timeout
+
+
+def _http_call(venue, endpoint, fn, *args, **kwargs):
+    # request_scheduler().call 과 같지만 이 스레드의 requests 요청에 거래소 타임아웃을 건다
+    previous = getattr(_http, 'timeout', None)
+    _http.timeout = venue_timeout(venue)
+    try:
+        return request_scheduler().call(venue, endpoint, fn, *args, **kwargs)
+    finally:
+        _http.timeout = previous
+
+# ----------------------
+# KRX 종목 레지스트리
+# ----------------------
+# 서버 프로세스 하나에 하나만 존재하며 모든 세션이 공유한다.
+# 전체 종목 목록은 최초 1회 다운로드한 뒤 주기적으로만 갱신하고,
+# 조회는 dict 인덱스로 처리한다.
+# 목록에 포함된 종가는 전 종목 시세 스냅샷으로도 사용한다.
+# 장 밖에서는 종가가 바뀌지 않으므로, 마지막 장 마감 뒤에 한 번 받은 스냅샷은 다음 장까지 그대로 쓴다.
+# (공휴일은 따로 구분하지 않아서 평일 장 시간처럼 갱신한다)
+KRX_REFRESH_INTERVAL = 6 * 60 * 60  # 6시간
+KRX_SNAPSHOT_MAX_AGE = 60  # 장중 시세 스냅샷 최대 허용 경과 시간(초)
+KST = 'Asia/Seoul'
+KRX_SESSION_START = pd.Timedelta(hours=9)
+KRX_SESSION_END = pd.Timedelta(hours=15, minutes=50)  # 장 마감(15:30) + 종가 확정 여유
+
+
+def krx_session_end(now):
+    # 장중이면 None, 장 밖이면 가장 최근 평일 장 마감 시각(epoch 초)
+    t = pd.Timestamp(now, unit='s', tz='UTC').tz_convert(KST)
+    day = t.normalize()
+    if t.weekday() < 5 and day + KRX_SESSION_START <= t < day + KRX_SESSION_END:
+        return None
+    end = day + KRX_SESSION_END
+    while end > t or end.weekday() >= 5:
+        end -= pd.Timedelta(days=1)
+    return end.timestamp()
+
+
+class KrxSymbolRegistry:
+    def __init__(self, refresh_interval=KRX_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.name_to_code = {}
+        self.code_to_name = {}
+        self.close_by_code = {}
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _load(self):
+        listing = _http_call('krx', 'listing', fdr.StockListing, 'KRX')
+        names = listing['Name'].astype(str).tolist()
+        codes = listing['Code'].astype(str).tolist()
+        closes = pd.to_numeric(listing['Close'], errors='coerce').tolist()
+
+        name_to_code = {}
+        for name, code in zip(names, codes):
+            # 동일 종목명이 여러 개면 첫 번째 항목을 사용 (기존 동작과 동일)
+            name_to_code.setdefault(name, code)
+
+        # 인덱스는 통째로 교체해서 읽는 쪽이 락 없이 접근할 수 있게 한다
+        self.name_to_code = name_to_code
+        self.code_to_name = dict(zip(codes, names))
+        self.close_by_code = {code: close for code, close in zip(codes, closes) if close == close}
+        self.loaded_at = time.time()
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                with priority(BACKGROUND):
+                    self._load()
+            except Exception:
+                pass  # 갱신 실패 시 기존 인덱스를 계속 사용
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='krx-registry-refresh', daemon=True).start()
+
+    def ensure_loaded(self, max_age=None):
+        if max_age is None:
+            max_age = self.refresh_interval
+
+        if not self.loaded_at:
+            # 최초 로드는 동기로 수행 (동시에 들어온 요청은 한 번만 다운로드)
+            with self._lock:
+                if not self.loaded_at:
+                    self._load()
+            return
+
+        # 만료된 경우 기존 인덱스로 응답하면서 백그라운드에서 갱신
+        if time.time() - self.loaded_at > max_age:
+            with self._lock:
+                if self._refreshing:
+                    return
+                self._refreshing = True
+            self._refresh_in_background()
+
+    def get_code(self, name):
+        self.ensure_loaded()
+        return self.name_to_code.get(name)
+
+    def get_name(self, code):
+        self.ensure_loaded()
+        return self.code_to_name.get(code)
+
+    def snapshot_prices(self, names, max_age=KRX_SNAPSHOT_MAX_AGE):
+        # 종목명 목록의 스냅샷 종가를 한 번에 반환 (찾지 못한 종목은 제외)
+        session_end = krx_session_end(time.time())
+        if session_end is not None and self.loaded_at >= session_end:
+            max_age = self.refresh_interval  # 장 마감 뒤 받은 종가는 다음 장까지 유효
+        self.ensure_loaded(max_age)
+        prices = {}
+        for name in names:
+            close = self.close_by_code.get(self.name_to_code.get(name))
+            if close is not None:
+                prices[name] = close
+        return prices
+
+
+_krx_registry = KrxSymbolRegistry()
+
+
+def krx_registry():
+    return _krx_registry
+
+
+# ----------------------
+# ccxt 거래소 풀
+# ----------------------
+# 거래소/시장 유형별로 인스턴스를 하나만 만들어 공유한다.
+# 마켓 정보(load_markets)는 최초 1회만 받고 이후에는 백그라운드에서 갱신하며,
+# 최초 로드는 거래소/시장 유형별 락으로 막으므로 느린 거래소가 다른 거래소 조회를 막지 않는다.
+# 요청 제한은 ccxt 내장 rate limiter 대신 scheduler 에서 거래소별로 맞춘다.
+MARKETS_REFRESH_INTERVAL = 60 * 60  # 1시간
+
+
+class ExchangePool:
+    def __init__(self, refresh_interval=MARKETS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}  # (exchange_id, market_type) -> 최초 로드용 Lock
+        self._refresher = None
+
+    def _create(self, exchange_id, market_type):
+        exchange = getattr(ccxt, exchange_id)({
+            'enableRateLimit': False,
+            'timeout': int(venue_timeout(exchange_id) * 1000),  # ms
+            'options': {
+                'defaultType': market_type
+            }
+        })
+        # 재생 모드에서는 load_markets 가 호출되지 않으므로 받은 마켓 정보를 직접 넣는다
+        exchange.set_markets(request_scheduler().call(exchange_id, 'markets', exchange.load_markets))
+        return {'exchange': exchange, 'loaded_at': time.time(), 'symbols': sorted(exchange.markets)}
+
+    def _entry(self, exchange_id, market_type):
+        key = (exchange_id, market_type)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._create(exchange_id, market_type)
+                    with self._lock:
+                        self._entries[key] = entry
+                        self._start_refresher()
+        return entry
+
+    def _start_refresher(self):
+        if self._refresher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.refresh_interval)
+                for (exchange_id, _), entry in list(self._entries.items()):
+                    exchange = entry['exchange']
+                    try:
+                        exchange.set_markets(request_scheduler().call(
+                            exchange_id, 'markets', exchange.load_markets, reload=True))
+                    except Exception:
+                        continue  # 갱신 실패 시 기존 마켓 정보를 계속 사용
+                    entry['symbols'] = sorted(exchange.markets)
+                    entry['loaded_at'] = time.time()
+
+        self._refresher = threading.Thread(target=with_priority, args=(BACKGROUND, run),
+                                           name='ccxt-markets-refresh', daemon=True)
+        self._refresher.start()
+
+    def get(self, exchange_id='binance', market_type='future'):
+        return self._entry(exchange_id, market_type)['exchange']
+
+    def symbols(self, exchange_id='binance', market_type='future'):
+        return self._entry(exchange_id, market_type)['symbols']
+
+    def has_symbol(self, symbol, exchange_id='binance', market_type='future'):
+        return symbol in self.get(exchange_id, market_type).markets
+
+
+_exchange_pool = ExchangePool()
+
+
+def exchange_pool():
+    return _exchange_pool
+
+
+# ----------------------
+# 코인 이름 매핑
+# ----------------------
+COIN_NAME_MAPPING = {
+    '비트코인': 'BTC',
+    '이더리움': 'ETH',
+    '리플': 'XRP',
+    '도지코인': 'DOGE',
+    '샌드박스': 'SAND',
+    '에이다': 'ADA',
+    '솔라나': 'SOL',
+    '폴리곤': 'MATIC',
+    '바이낸스코인': 'BNB',
+    '트론': 'TRX'
+}
+
+
+def coin_symbol(name):
+    # 한글 이름이 매핑에 있는 경우 심볼로 변환
+    return COIN_NAME_MAPPING.get(name, name.upper())
+
+
+# ----------------------
+# 현재가(시세) 조회
+# ----------------------
+# 현재가만 필요한 곳(사이드바, 보유 현황 등)에서는 과거 데이터를 받지 않는다.
+Quote = namedtuple('Quote', ['symbol', 'price', 'timestamp'])
+
+UPBIT_TICKERS_TTL = 60 * 60  # 1시간
+_upbit_tickers = {'tickers': frozenset(), 'loaded_at': 0.0}
+
+
+def upbit_krw_tickers():
+    if time.time() - _upbit_tickers['loaded_at'] > UPBIT_TICKERS_TTL:
+        tickers = _http_call('upbit', 'tickers', pyupbit.get_tickers, fiat="KRW")
+        if tickers:
+            _upbit_tickers['tickers'] = frozenset(tickers)
+            _upbit_tickers['loaded_at'] = time.time()
+    return _upbit_tickers['tickers']
+
+
+def fetch_stock_quote(code):
+    # 최근 5일 중 가장 최근 거래일의 종가를 현재가로 사용 (로컬 봉 저장소 경유)
+    df = fetch_stock_history(code, days=5)
+    if df is None:
+        return None
+    # KRX 가격은 원 단위 정수
+    return Quote(code, int(df['close'].iloc[-1]), datetime.fromtimestamp(df.index[-1].timestamp()))
+
+
+def fetch_crypto_quote(ticker):
+    price = _http_call('upbit', 'ticker', pyupbit.get_current_price, ticker)
+    if price is None:
+        return None
+    return Quote(ticker, price, datetime.now())
+
+
+def fetch_crypto_prices(tickers):
+    # 여러 코인의 현재가를 업비트 호출 한 번으로 조회
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    prices = _http_call('upbit', 'ticker', pyupbit.get_current_price, tickers)
+    if prices is None:
+        return {}
+    if not isinstance(prices, dict):
+        # 종목이 하나면 pyupbit가 숫자 하나만 반환
+        return {tickers[0]: prices}
+    return {ticker: price for ticker, price in prices.items() if price is not None}
+
+
+def fetch_futures_quote(exchange, symbol):
+    ticker = request_scheduler().call(exchange.id, 'ticker', exchange.fetch_ticker, symbol)
+    if ticker is None or ticker.get('last') is None:
+        return None
+    if ticker.get('timestamp'):
+        timestamp = datetime.fromtimestamp(ticker['timestamp'] / 1000)
+    else:
+        timestamp = datetime.now()
+    return Quote(symbol, ticker['last'], timestamp)
+
+
+# ----------------------
+# 과거 데이터(차트/분석용) 조회
+# ----------------------
+# 로컬 봉 저장소에 없는 구간만 업스트림에서 받아온다.
+# 소스와 관계없이 bar_store.normalize_ohlcv 의 표준 형식(UTC 인덱스, float32 가격)으로 반환한다.
+# 각 _fetch_*_since 함수는 since 시각 이후(포함)의 봉을 소문자 컬럼으로 반환한다.
+def _fetch_stock_bars_since(code, since):
+    # fdr 는 한국 시간 기준 날짜 인덱스
+    df = _http_call('krx', 'daily', fdr.DataReader, code,
+                                  start=since.tz_convert(KST).strftime("%Y-%m-%d"))
+    if df is None or df.empty:
+        return None
+    return normalize_ohlcv(df, tz=KST)
+
+
+def _fetch_crypto_bars_since(ticker, since):
+    # pyupbit 일봉 인덱스는 한국 시간 09:00
+    count = max((pd.Timestamp.now(tz='UTC') - since).days + 2, 1)
+    df = _http_call('upbit', 'ohlcv', pyupbit.get_ohlcv, ticker, interval="day", count=count)
+    if df is None or df.empty:
+        return None
+    df = normalize_ohlcv(df, tz=KST)
+    return df[df.index >= since]
+
+
+def _fetch_futures_bars_since(exchange, symbol, timeframe, since, page_limit=1000):
+    since_ms = int(since.value // 1_000_000)
+    rows = []
+    while True:
+        batch = request_scheduler().call(exchange.id, 'ohlcv', exchange.fetch_ohlcv, symbol,
+                                         timeframe=timeframe, since=since_ms, limit=page_limit)
+        if not batch:
+            break
+        rows.extend(batch)
+        if len(batch) < page_limit:
+            break
+        since_ms = batch[-1][0] + 1
+    if not rows:
+        return None
+    # [ms, open, high, low, close, volume] 목록 (UTC)
+    df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df.index = pd.to_datetime(df.pop('timestamp'), unit='ms', utc=True)
+    return normalize_ohlcv(df)
+
+
+def _non_empty(df):
+    if df is None or df.empty:
+        return None
+    return df
+
+
+def _history_start(days):
+    return pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days)
+
+
+def fetch_stock_history(code, days=30):
+    return _non_empty(bar_store().get_bars(
+        'krx', code, '1d', _history_start(days), lambda since: _fetch_stock_bars_since(code, since)))
+
+
+def fetch_crypto_history(ticker, days=30):
+    return _non_empty(bar_store().get_bars(
+        'upbit', ticker, '1d', _history_start(days), lambda since: _fetch_crypto_bars_since(ticker, since)))
+
+
+def fetch_futures_history(exchange, symbol, timeframe='1h', days=30):
+    return _non_empty(bar_store().get_bars(
+        'binance-future', symbol, timeframe, _history_start(days),
+        lambda since: _fetch_futures_bars_since(exchange, symbol, timeframe, since)))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import gzip
+import os
+import pickle
+import threading
+import time
+from collections import deque
+
+# ----------------------
+# 시세 요청 기록 / 재생
+# ----------------------
+# 업스트림 REST 요청은 모두 scheduler 를 거치므로 그 지점에서 요청과 응답을 기록하거나
+# 기록해둔 응답을 돌려준다. 웹소켓 스트림은 전송 계층(transport_factory)을 감싸서
+# 받은 메시지를 기록하고, 재생할 때는 가짜 전송 계층이 기록된 메시지를 보내준다.
+# - live: 기록 없이 업스트림 호출 (기본값)
+# - record: 업스트림 호출 결과를 MARKET_DATA_LOG 에 기록
+# - replay: 네트워크 없이 MARKET_DATA_LOG 의 응답만 사용 (기록에 없는 요청은 ReplayMiss)
+# 재생 속도 MARKET_DATA_REPLAY_SPEED: 0 이면 기다리지 않고, 1 이면 기록된 응답 시간/메시지 간격 그대로,
+# 2 면 두 배 빠르게 재생한다. 같은 요청이 여러 번 기록됐으면 기록된 순서대로 돌려주고,
+# 다 쓰면 마지막 응답을 계속 돌려준다.
+# 조회 시작 시각처럼 실행할 때마다 달라지는 인자(VOLATILE_KWARGS)가 있으므로, 인자까지 같은 기록이 없으면
+# 그 인자만 빼고 같은(종목, 봉 간격 등) 기록을 대신 사용한다. 두 경우 모두 한 번 돌려준 기록은 다시 쓰지 않는다.
+# 로그는 gzip 으로 압축한 pickle 레코드의 연속이다.
+MARKET_DATA_MODE = os.environ.get('MARKET_DATA_MODE', 'live')
+MARKET_DATA_LOG = os.environ.get('MARKET_DATA_LOG', 'market_data.log.gz')
+MARKET_DATA_REPLAY_SPEED = float(os.environ.get('MARKET_DATA_REPLAY_SPEED', '0'))
+
+MODES = ('live', 'record', 'replay')
+LOG_VERSION = 1
+FLUSH_INTERVAL = 1.0  # 기록 파일을 디스크에 내보내는 최소 간격(초)
+VOLATILE_KWARGS = frozenset(['since', 'start', 'end', 'count'])  # 실행 시각에 따라 달라지는 키워드 인자
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+def _freeze(value):
+    # 요청 인자를 기록 키로 변환 (리스트는 튜플로)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def request_key(venue, endpoint, fn, args, kwargs):
+    # 인스턴스(ccxt 거래소 객체 등)는 실행마다 달라지므로 함수 이름만 키에 넣는다
+    return venue, endpoint, getattr(fn, '__qualname__', repr(fn)), _freeze(args), _freeze(kwargs)
+
+
+def _loose_key(key):
+    # 실행 시각에 따라 달라지는 키워드 인자를 뺀 키
+    return key[:4] + (tuple(item for item in key[4] if item[0] not in VOLATILE_KWARGS),)
+
+
+def _dump_error(e):
+    try:
+        return pickle.dumps(e)
+    except Exception:  # 피클링할 수 없는 예외는 메시지만 남긴다
+        return pickle.dumps(RuntimeError(f"{type(e).__name__}: {e}"))
+
+
+class MarketDataLog:
+    def __init__(self, mode=MARKET_DATA_MODE, path=MARKET_DATA_LOG, speed=MARKET_DATA_REPLAY_SPEED):
+        if mode not in MODES:
+            raise ValueError(f"알 수 없는 MARKET_DATA_MODE: {mode}")
+        self.mode = mode
+        self.path = path
+        self.speed = speed
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        self._flushed_at = 0.0
+        self._responses = []  # [(소요 시간, 성공 여부, 피클)]
+        self._used = []  # 응답별로 이미 돌려줬는지
+        self._by_key = {}  # 요청 키 -> deque[응답 번호]
+        self._by_loose_key = {}  # 느슨한 키 -> deque[응답 번호]
+        self._messages = {}  # 스트림 이름 -> [(경과 시간, 메시지)]
+        self._counters = {'requests': 0, 'messages': 0, 'misses': 0}
+        if mode == 'replay':
+            self._load()
+
+    # ----------------------
+    # 기록 파일
+    # ----------------------
+    def _write(self, record):
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, 'ab')
+                pickle.dump(('header', LOG_VERSION, time.time()), self._file)
+                atexit.register(self.close)
+            pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            now = time.monotonic()
+            if now - self._flushed_at > FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed_at = now
+
+    def _count(self, field):
+        # 시세 조회 스레드 풀과 스트림 수신 스레드에서 동시에 호출된다
+        with self._lock:
+            self._counters[field] += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _load(self):
+        with gzip.open(self.path, 'rb') as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    break  # 기록 중에 종료돼서 잘린 마지막 레코드는 버린다
+                if record[0] == 'request':
+                    _, key, _, duration, ok, payload = record
+                    index = len(self._responses)
+                    self._responses.append((duration, ok, payload))
+                    self._used.append(False)
+                    self._by_key.setdefault(key, deque()).append(index)
+                    self._by_loose_key.setdefault(_loose_key(key), deque()).append(index)
+                elif record[0] == 'message':
+                    _, stream, offset, message = record
+                    self._messages.setdefault(stream, []).append((offset, message))
+
+    # ----------------------
+    # REST 요청
+    # ----------------------
+    def call(self, venue, endpoint, fn, args, kwargs):
+        if self.mode == 'live':
+            return fn(*args, **kwargs)
+        key = request_key(venue, endpoint, fn, args, kwargs)
+        if self.mode == 'replay':
+            return self._replay(key)
+
+        self._count('requests')
+        started = time.monotonic()
+        try:
+            value = fn(*args, **kwargs)
+        except Exception as e:
+            self._write(('request', key, started - self.started, time.monotonic() - started, False, _dump_error(e)))
+            raise
+        self._write(('request', key, started - self.started, time.monotonic() - started, True,
+                     pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return value
+
+    def _next(self, indices):
+        # 아직 돌려주지 않은 가장 앞의 응답 (다 썼으면 마지막 응답을 계속 사용)
+        while len(indices) > 1 and self._used[indices[0]]:
+            indices.popleft()
+        index = indices.popleft() if len(indices) > 1 else indices[0]
+        self._used[index] = True
+        return self._responses[index]
+
+    def _replay(self, key):
+        with self._lock:
+            indices = self._by_key.get(key) or self._by_loose_key.get(_loose_key(key))
+            if not indices:
+                self._counters['misses'] += 1
+                raise ReplayMiss(f"기록에 없는 요청입니다: {key}")
+            response = self._next(indices)
+            self._counters['requests'] += 1
+        duration, ok, payload = response
+        if self.speed > 0:
+            time.sleep(duration / self.speed)
+        # 호출할 때마다 새로 풀어서 호출한 쪽이 수정해도 다음 재생에 영향이 없게 한다
+        value = pickle.loads(payload)
+        if not ok:
+            raise value
+        return value
+
+    # ----------------------
+    # 웹소켓 스트림
+    # ----------------------
+    def transport_factory(self, stream, factory):
+        # stream 이름별로 기록/재생하는 전송 계층 생성 함수를 반환
+        if self.mode == 'replay':
+            return lambda url, on_open, on_message: ReplayTransport(self, stream, on_open, on_message)
+        if self.mode == 'record':
+            def recording(url, on_open, on_message):
+                def on_recorded_message(message):
+                    self._count('messages')
+                    self._write(('message', stream, time.monotonic() - self.started, message))
+                    on_message(message)
+                return factory(url, on_open, on_recorded_message)
+            return recording
+        return factory
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, mode=self.mode)
+
+
+class ReplayTransport:
+    # 기록된 스트림 메시지를 기록된 간격(재생 속도 반영)으로 보내주는 가짜 전송 계층
+    def __init__(self, log, stream, on_open, on_message):
+        self.log = log
+        self.stream = stream
+        self.on_open = on_open
+        self.on_message = on_message
+        self._closed = threading.Event()
+
+    def run(self):
+        self.on_open()
+        messages = self.log._messages.get(self.stream, [])
+        first = messages[0][0] if messages else 0.0
+        started = time.monotonic()
+        for offset, message in messages:
+            if self.log.speed > 0:
+                delay = started + (offset - first) / self.log.speed - time.monotonic()
+                if delay > 0 and self._closed.wait(delay):
+                    return
+            if self._closed.is_set():
+                return
+            self.log._count('messages')
+            self.on_message(message)
+        # 다 보내면 재연결하지 않도록 닫힐 때까지 연결된 상태로 둔다
+        self._closed.wait()
+
+    def send(self, text):
+        pass  # 구독 요청은 무시 (기록된 메시지를 모두 보낸다)
+
+    def close(self):
+        self._closed.set()
+
+
+_market_log = None
+_market_log_lock = threading.Lock()
+
+
+def market_log():
+    global _market_log
+    if _market_log is None:
+        with _market_log_lock:
+            if _market_log is None:
+                _market_log = MarketDataLog()
+    return _market_log
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+import db
+from account import load_account
+from scheduler import BACKGROUND, with_priority
+from ticks import TickQueue, subscribe
+
+# ----------------------
+# 예약 주문 (지정가 / 손절 / 익절)
+# ----------------------
+# 주문은 종목별 가격 정렬 힙 두 개에 넣어둔다.
+# - below: 현재가가 주문 가격 이하로 내려오면 체결 (가격 높은 순, 최대 힙)
+# - above: 현재가가 주문 가격 이상으로 올라가면 체결 (가격 낮은 순, 최소 힙)
+# 틱이 오면 그 종목 힙의 맨 위만 확인해서 가격을 넘어선 주문만 꺼내므로
+# 다른 주문이나 다른 사용자의 주문은 보지 않는다 (틱당 O(체결 수 x log n)).
+# 취소는 힙에서 바로 지우지 않고 주문 목록에서만 빼두었다가 꺼낼 때 건너뛰며,
+# 취소된 항목이 쌓이면 힙을 다시 만든다.
+# 체결은 틱 가격으로 VirtualAccount 에 기록하고, 잔고가 모자라면 거부 처리한다.
+# 원장 이벤트와 주문 상태(filled)는 같은 트랜잭션으로 기록하므로 중간에 프로세스가 죽어도
+# 다시 시작할 때 같은 주문이 두 번 체결되지 않는다. 체결 중 오류가 나면 주문은 error 로 닫는다.
+ORDERBOOK_SESSION = 'orderbook'  # 폴러 구독에 사용하는 세션 ID
+RESUBSCRIBE_INTERVAL = 60
+COMPACT_MIN_STALE = 1000
+MATCH_SAMPLES = 1000
+
+# (유형, 방향) -> 체결 조건
+DIRECTIONS = {
+    ('limit', 'buy'): 'below',
+    ('limit', 'sell'): 'above',
+    ('stop', 'buy'): 'above',
+    ('stop', 'sell'): 'below',
+    ('take_profit', 'sell'): 'above',
+}
+ORDER_TYPES = {'limit': '지정가', 'stop': '손절(스톱)', 'take_profit': '익절'}
+
+Order = namedtuple('Order', ['order_id', 'username', 'kind', 'symbol', 'name', 'side', 'type', 'price', 'qty',
+                             'created_at'])
+
+SQL_LOAD_ORDERS = (
+    'SELECT o.id, u.username, o.kind, o.symbol, o.name, o.side, o.type, o.trigger_price, o.qty, o.created_at '
+    "FROM orders o JOIN users u ON u.id = o.user_id WHERE o.status = 'open' ORDER BY o.id")
+SQL_ADD_ORDER = (
+    'INSERT INTO orders (user_id, kind, symbol, name, side, type, trigger_price, qty, status, created_at) '
+    "SELECT id, ?, ?, ?, ?, ?, ?, ?, 'open', ? FROM users WHERE username = ?")
+SQL_CANCEL_ORDER = (
+    "UPDATE orders SET status = 'cancelled' WHERE id = ? AND status = 'open' "
+    'AND user_id = (SELECT id FROM users WHERE username = ?)')
+SQL_CLOSE_ORDER = "UPDATE orders SET status = ?, filled_at = ?, fill_price = ? WHERE id = ? AND status = 'open'"
+SQL_CLOSED_ORDERS = (
+    'SELECT o.id, o.name, o.side, o.type, o.trigger_price, o.qty, o.status, o.filled_at, o.fill_price '
+    "FROM orders o JOIN users u ON u.id = o.user_id WHERE u.username = ? AND o.status != 'open' "
+    'ORDER BY o.id DESC LIMIT ?')
+
+
+class SymbolBook:
+    # 한 종목의 대기 주문. 힙 항목은 (정렬 키, 주문 ID) 라서 같은 가격이면 먼저 넣은 주문이 먼저 나온다
+    def __init__(self):
+        self.below = []  # (-가격, 주문 ID)
+        self.above = []  # (가격, 주문 ID)
+        self.live = 0
+        self.stale = 0
+
+    def add(self, order, direction):
+        if direction == 'below':
+            heapq.heappush(self.below, (-order.price, order.order_id))
+        else:
+            heapq.heappush(self.above, (order.price, order.order_id))
+        self.live += 1
+
+    def discard(self):
+        # 취소된 주문은 힙에 남겨두고 개수만 센다
+        self.live -= 1
+        self.stale += 1
+
+    def match(self, price, orders):
+        # price 를 넘어선 주문 ID 를 꺼낸다 (orders 에 없는 ID 는 취소된 항목)
+        crossed = []
+        below, above = self.below, self.above
+        while below and -below[0][0] >= price:
+            order_id = heapq.heappop(below)[1]
+            if order_id in orders:
+                crossed.append(order_id)
+            else:
+                self.stale -= 1
+        while above and above[0][0] <= price:
+            order_id = heapq.heappop(above)[1]
+            if order_id in orders:
+                crossed.append(order_id)
+            else:
+                self.stale -= 1
+        self.live -= len(crossed)
+        return crossed
+
+    def compact(self, orders):
+        if self.stale <= max(self.live, COMPACT_MIN_STALE):
+            return
+        self.below = [entry for entry in self.below if entry[1] in orders]
+        self.above = [entry for entry in self.above if entry[1] in orders]
+        heapq.heapify(self.below)
+        heapq.heapify(self.above)
+        self.stale = 0
+
+
+class OrderEngine:
+    def __init__(self):
+        self._orders = {}  # order_id -> Order (대기 중인 주문만)
+        self._books = {}  # (kind, symbol) -> SymbolBook
+        self._by_user = {}  # username -> set(order_id)
+        self._lock = threading.Lock()
+        self._ticks = TickQueue(lambda key: key in self._books)
+        self._match_times = deque(maxlen=MATCH_SAMPLES)
+        self._counters = {'ticks': 0, 'fills': 0, 'rejected': 0, 'errors': 0}
+        self._thread = None
+        self._last_resubscribe = 0.0
+
+    # ----------------------
+    # 주문 관리
+    # ----------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            for row in db.connection().execute(SQL_LOAD_ORDERS):
+                self._rest(Order(*row))
+            self._thread = threading.Thread(target=with_priority, args=(BACKGROUND, self._run),
+                                            name='orderbook', daemon=True)
+        self._ticks.attach()
+        self._thread.start()
+
+    def _rest(self, order):
+        book = self._books.get((order.kind, order.symbol))
+        if book is None:
+            book = self._books[(order.kind, order.symbol)] = SymbolBook()
+        book.add(order, DIRECTIONS[(order.type, order.side)])
+        self._orders[order.order_id] = order
+        self._by_user.setdefault(order.username, set()).add(order.order_id)
+
+    def _unrest(self, order):
+        del self._orders[order.order_id]
+        user_orders = self._by_user.get(order.username)
+        if user_orders is not None:
+            user_orders.discard(order.order_id)
+            if not user_orders:
+                del self._by_user[order.username]
+
+    def place(self, username, kind, symbol, name, side, type, price, qty):
+        if (type, side) not in DIRECTIONS:
+            raise ValueError(f"지원하지 않는 주문입니다: {type}/{side}")
+        if price <= 0 or qty <= 0:
+            raise ValueError("가격과 수량은 0보다 커야 합니다.")
+        created_at = time.time()
+        conn = db.connection()
+        with db.transaction(conn):
+            cursor = conn.execute(SQL_ADD_ORDER, (
+                kind, symbol, name, side, type, float(price), float(qty), created_at, username))
+        if cursor.rowcount == 0:
+            raise ValueError(f"알 수 없는 사용자: {username}")
+        order = Order(cursor.lastrowid, username, kind, symbol, name, side, type, float(price), float(qty),
+                      created_at)
+        with self._lock:
+            self._rest(order)
+        subscribe(ORDERBOOK_SESSION, kind, symbol)
+        return order
+
+    def cancel(self, username, order_id):
+        # 대기 목록에서 먼저 빼야 매칭 스레드가 이미 꺼낸 주문을 취소로 덮어쓰지 않는다
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None or order.username != username:
+                return False  # 이미 체결/취소되었거나 다른 사용자의 주문
+            self._unrest(order)
+            key = (order.kind, order.symbol)
+            book = self._books[key]
+            book.discard()
+            if book.live == 0:
+                del self._books[key]
+            else:
+                book.compact(self._orders)
+        conn = db.connection()
+        with db.transaction(conn):
+            conn.execute(SQL_CANCEL_ORDER, (order_id, username))
+        return True
+
+    def open_orders(self, username):
+        with self._lock:
+            ids = sorted(self._by_user.get(username, ()))
+            return [self._orders[order_id] for order_id in ids]
+
+    def closed_orders(self, username, limit=20):
+        return db.connection().execute(SQL_CLOSED_ORDERS, (username, limit)).fetchall()
+
+    def stats(self):
+        # 틱당 매칭 시간(µs) 분포와 처리 건수
+        match_times = np.array(self._match_times) if self._match_times else np.zeros(1)
+        return dict(self._counters, resting=len(self._orders), symbols=len(self._books),
+                    coalesced=self._ticks.coalesced,
+                    p50_us=float(np.percentile(match_times, 50)), p99_us=float(np.percentile(match_times, 99)),
+                    max_us=float(match_times.max()))
+
+    # ----------------------
+    # 매칭 루프
+    # ----------------------
+    def match(self, key, price):
+        # 가격을 넘어선 주문을 대기 목록에서 빼서 돌려준다 (체결 기록은 호출한 쪽에서)
+        started = time.perf_counter()
+        with self._lock:
+            book = self._books.get(key)
+            if book is None:
+                return []
+            crossed = [self._orders[order_id] for order_id in book.match(price, self._orders)]
+            for order in crossed:
+                self._unrest(order)
+            if book.live == 0:
+                del self._books[key]
+        self._match_times.append((time.perf_counter() - started) * 1e6)
+        return crossed
+
+    def _run(self):
+        while True:
+            if time.time() - self._last_resubscribe > RESUBSCRIBE_INTERVAL:
+                self._last_resubscribe = time.time()
+                for kind, symbol in list(self._books):
+                    try:
+                        subscribe(ORDERBOOK_SESSION, kind, symbol)
+                    except Exception:
+                        self._counters['errors'] += 1
+            for key, (price, received_at) in self._ticks.drain(RESUBSCRIBE_INTERVAL).items():
+                self._counters['ticks'] += 1
+                for order in self.match(key, price):
+                    try:
+                        self._fill(order, price)
+                    except Exception:
+                        self._counters['errors'] += 1  # 한 주문이 실패해도 매칭은 계속 동작
+
+    def _close(self, order, status):
+        conn = db.connection()
+        with db.transaction(conn):
+            conn.execute(SQL_CLOSE_ORDER, (status, time.time(), None, order.order_id))
+
+    def _fill(self, order, price):
+        account = load_account(order.username)
+        if account is None:
+            self._counters['rejected'] += 1
+            self._close(order, 'rejected')
+            return
+        trade = account.buy if order.side == 'buy' else account.sell
+        filled = (SQL_CLOSE_ORDER, ('filled', time.time(), price, order.order_id))
+        try:
+            ok = trade(order.name, price, order.qty, statements=[filled])
+        except Exception:
+            # 원장과 주문 상태가 함께 롤백됐으므로 주문만 오류로 닫는다 (다시 체결하지 않음)
+            self._close(order, 'error')
+            raise
+        if ok:
+            self._counters['fills'] += 1
+        else:
+            self._counters['rejected'] += 1
+            self._close(order, 'rejected')
+
+
+_order_engine = OrderEngine()
+
+
+def order_engine():
+    return _order_engine
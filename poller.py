@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+from fetcher import fetch_all, task
+from market_data import (
+    exchange_pool, fetch_crypto_history, fetch_crypto_prices, fetch_futures_history,
+    fetch_futures_quote, fetch_stock_history, fetch_stock_quote, Quote
+)
+from scheduler import BACKGROUND, with_priority
+from streams import binance_futures_stream, streamed_quote, upbit_stream
+
+# ----------------------
+# 공용 시세 폴러
+# ----------------------
+# 서버 프로세스당 하나의 백그라운드 스레드가 누군가 구독 중인 종목의
+# 현재가와 봉 데이터를 주기적으로 갱신한다. 같은 종목을 여러 세션이 구독해도
+# 업스트림 요청은 한 번만 나가며, 세션은 최신 스냅샷을 읽기만 한다.
+# 처음 구독된 종목도 폴러 스레드가 바로 조회하고, 구독한 쪽은 FIRST_POLL_WAIT 초까지만 기다린다
+# (스트림릿 스크립트나 주문 스레드에서 네트워크 요청을 하지 않는다).
+QUOTE_INTERVAL = 10  # 현재가 갱신 주기(초)
+BAR_INTERVAL = 60  # 봉 데이터 갱신 주기(초)
+SUBSCRIPTION_TTL = 10 * 60  # 갱신하지 않은 구독은 10분 후 만료
+# 웹소켓으로 받고 있는 종목은 최근 봉을 스트림 1분봉으로 만들므로 REST 봉은 지난 봉을 채울 때만 받는다
+STREAMED_BAR_INTERVAL = 60 * 60
+FIRST_POLL_WAIT = 2.0  # 처음 구독한 종목의 첫 조회를 기다리는 최대 시간(초)
+
+KINDS = ('stock', 'crypto', 'futures')
+_VENUES = {'stock': 'krx', 'crypto': 'upbit', 'futures': 'binance'}
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch_futures_quote(symbol):
+    return fetch_futures_quote(exchange_pool().get('binance', 'future'), symbol)
+
+
+def _fetch_futures_history(symbol):
+    return fetch_futures_history(exchange_pool().get('binance', 'future'), symbol)
+
+
+def _fetch_crypto_quotes(tickers):
+    # 업비트는 다중 티커를 한 번에 조회
+    timestamp = datetime.now()
+    return {ticker: Quote(ticker, price, timestamp) for ticker, price in fetch_crypto_prices(tickers).items()}
+
+
+class MarketPoller:
+    def __init__(self, quote_interval=QUOTE_INTERVAL, bar_interval=BAR_INTERVAL):
+        self.quote_interval = quote_interval
+        self.bar_interval = bar_interval
+        # (kind, symbol) -> {session_id: 마지막 구독 갱신 시각}
+        self._subscriptions = {}
+        # (kind, symbol) -> {'quote': Quote, 'bars': DataFrame, 'bars_at': float, 'updated_at': float}
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_bar_poll = 0.0
+        self._listeners = []
+        self._first_polls = {}  # 처음 구독되어 아직 조회하지 않은 (kind, symbol) -> Event
+        self._wake = threading.Event()
+
+    # ----------------------
+    # 구독 관리
+    # ----------------------
+    def subscribe(self, session_id, kind, symbol, wait=FIRST_POLL_WAIT):
+        # 처음 구독된 종목은 다음 주기를 기다리지 않고 폴러 스레드가 바로 조회한다.
+        # wait 초까지 첫 조회를 기다리고, 그 뒤에는 latest() 로 받아둔 값만 읽는다
+        if kind not in KINDS:
+            raise ValueError(f"알 수 없는 종목 유형: {kind}")
+        key = (kind, symbol)
+        with self._lock:
+            self._subscriptions.setdefault(key, {})[session_id] = time.time()
+            first_poll = self._first_polls.get(key)
+            if first_poll is None and key not in self._snapshots:
+                first_poll = self._first_polls[key] = threading.Event()
+        self._ensure_started()
+        if first_poll is not None:
+            self._wake.set()
+            if wait:
+                first_poll.wait(wait)
+
+    def unsubscribe(self, session_id, kind=None, symbol=None):
+        with self._lock:
+            for key, sessions in list(self._subscriptions.items()):
+                if (kind is not None and key[0] != kind) or (symbol is not None and key[1] != symbol):
+                    continue
+                sessions.pop(session_id, None)
+                if not sessions:
+                    del self._subscriptions[key]
+                    self._snapshots.pop(key, None)
+
+    def add_listener(self, fn):
+        # 현재가가 갱신될 때마다 fn(kind, symbol, quote, updated_at) 호출 (폴러 스레드에서 실행)
+        self._listeners.append(fn)
+
+    def latest(self, kind, symbol):
+        return self._snapshots.get((kind, symbol))
+
+    def watched(self):
+        # 만료된 구독을 정리하고 현재 구독 중인 (kind, symbol) 목록을 반환
+        expire_before = time.time() - SUBSCRIPTION_TTL
+        with self._lock:
+            for key, sessions in list(self._subscriptions.items()):
+                for session_id, seen in list(sessions.items()):
+                    if seen < expire_before:
+                        del sessions[session_id]
+                if not sessions:
+                    del self._subscriptions[key]
+                    self._snapshots.pop(key, None)
+            return list(self._subscriptions)
+
+    # ----------------------
+    # 폴링
+    # ----------------------
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                # 주기적인 갱신은 화면 조회보다 업스트림 요청 우선순위를 낮춘다
+                self._thread = threading.Thread(target=with_priority, args=(BACKGROUND, self._run),
+                                                name='market-poller', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        next_poll = 0.0
+        while True:
+            self._poll_first()
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + self.quote_interval
+                keys = self.watched()
+                if keys:
+                    with_bars = time.time() - self._last_bar_poll >= self.bar_interval
+                    try:
+                        self._poll_keys(keys, with_bars)
+                    except Exception:
+                        logger.exception("시세 폴링 실패")  # 한 주기가 실패해도 폴러는 계속 동작
+                    if with_bars:
+                        self._last_bar_poll = time.time()
+            # 다음 주기까지 기다리되, 새 종목이 구독되면 바로 깬다
+            self._wake.wait(max(0.0, next_poll - time.monotonic()))
+            self._wake.clear()
+
+    def _poll_first(self):
+        with self._lock:
+            first_polls, self._first_polls = self._first_polls, {}
+        if not first_polls:
+            return
+        try:
+            self._poll_keys(list(first_polls), with_bars=True)
+        except Exception:
+            logger.exception("처음 구독한 종목 조회 실패")
+        finally:
+            for event in first_polls.values():
+                event.set()
+
+    def _poll_keys(self, keys, with_bars):
+        by_kind = {kind: [symbol for k, symbol in keys if k == kind] for kind in KINDS}
+
+        # 웹소켓으로 최신가를 받고 있는 종목은 REST 조회를 생략
+        streamed = {}
+        for kind, stream in (('crypto', upbit_stream()), ('futures', binance_futures_stream())):
+            for symbol in list(by_kind[kind]):
+                quote = streamed_quote(stream, symbol)
+                if quote is not None:
+                    streamed[(kind, symbol)] = quote
+                    by_kind[kind].remove(symbol)
+
+        tasks = {}
+        if by_kind['crypto']:
+            tasks['crypto'] = task('upbit', _fetch_crypto_quotes, by_kind['crypto'])
+        for code in by_kind['stock']:
+            tasks[('stock', code)] = task('krx', fetch_stock_quote, code)
+        for symbol in by_kind['futures']:
+            tasks[('futures', symbol)] = task('binance', _fetch_futures_quote, symbol)
+        if with_bars:
+            for kind, symbol in keys:
+                snapshot = self._snapshots.get((kind, symbol)) or {}
+                if (kind, symbol) in streamed and time.time() - snapshot.get('bars_at', 0) < STREAMED_BAR_INTERVAL:
+                    continue
+                history = {
+                    'stock': fetch_stock_history,
+                    'crypto': fetch_crypto_history,
+                    'futures': _fetch_futures_history,
+                }[kind]
+                tasks[('bars', kind, symbol)] = task(_VENUES[kind], history, symbol)
+
+        values = fetch_all(tasks).values
+        quotes = dict(values.pop('crypto', {}))
+        values.update(streamed)
+        updated_at = time.time()
+        updated = []
+        with self._lock:
+            for key, value in values.items():
+                if key[0] == 'bars':
+                    snap_key = key[1:]
+                    field = 'bars'
+                else:
+                    snap_key = key
+                    field = 'quote'
+                if value is not None and snap_key in self._subscriptions:
+                    snapshot = self._snapshots.setdefault(snap_key, {})
+                    snapshot[field] = value
+                    snapshot['updated_at'] = updated_at
+                    if field == 'bars':
+                        snapshot['bars_at'] = updated_at
+                    if field == 'quote':
+                        updated.append((snap_key, value))
+            for ticker, quote in quotes.items():
+                snap_key = ('crypto', ticker)
+                if snap_key in self._subscriptions:
+                    snapshot = self._snapshots.setdefault(snap_key, {})
+                    snapshot['quote'] = quote
+                    snapshot['updated_at'] = updated_at
+                    updated.append((snap_key, quote))
+        for (kind, symbol), quote in updated:
+            for listener in self._listeners:
+                try:
+                    listener(kind, symbol, quote, updated_at)
+                except Exception:
+                    logger.exception("시세 리스너 오류: %s %s", kind, symbol)
+
+
+_market_poller = MarketPoller()
+
+
+def market_poller():
+    return _market_poller
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from market_log import market_log, request_key
+
+# ----------------------
+# 업스트림 요청 스케줄러
+# ----------------------
+# 업비트/바이낸스/KRX(fdr) 로 나가는 모든 REST 요청은 market_data 에서 이 스케줄러를 거친다.
+# - 거래소별 토큰 버킷: 요청마다 엔드포인트 가중치만큼 토큰을 쓰고, 토큰이 모자라면 채워질 때까지 기다린다
+# - 같은 요청 합치기: 같은 (거래소, 엔드포인트, 인자) 요청이 이미 진행 중이면 새로 보내지 않고 그 응답을 함께 받는다
+# - 우선순위: 토큰을 기다리는 요청 중 화면 조회(INTERACTIVE)를 백그라운드 갱신(BACKGROUND)보다 먼저 보낸다
+# 우선순위는 스레드별로 정하며, 폴러/자동매매/예약 주문 스레드는 BACKGROUND 로 실행한다.
+# 그래도 429(요청 과다) 응답을 받으면 그 거래소 버킷을 비우고 잠시 기다렸다가 다시 보낸다.
+# 실제 호출은 market_log 를 거치므로 기록/재생 모드에서도 같은 제한과 우선순위가 적용된다.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# 거래소별 (초당 토큰, 최대 버스트). 공식 제한보다 조금 낮게 잡는다
+VENUE_LIMITS = {
+    'upbit': (9.0, 9),  # 시세 조회 API 초당 10회
+    'binance': (35.0, 100),  # 선물 API 분당 가중치 2400
+    'krx': (5.0, 5),
+}
+DEFAULT_LIMIT = (5.0, 5)
+
+# (거래소, 엔드포인트) -> 가중치 (없으면 1)
+ENDPOINT_WEIGHTS = {
+    ('binance', 'ohlcv'): 5,  # limit 1000 기준
+    ('binance', 'markets'): 1,
+    ('krx', 'listing'): 5,
+}
+
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF = 1.0  # 초 (재시도마다 두 배)
+WAIT_SAMPLES = 1000
+
+_local = threading.local()
+
+
+def current_priority():
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+class priority:
+    # with priority(BACKGROUND): 블록 안에서 이 스레드가 보내는 요청의 우선순위
+    def __init__(self, level):
+        self.level = level
+
+    def __enter__(self):
+        self.previous = current_priority()
+        _local.priority = self.level
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.priority = self.previous
+        return False
+
+
+def with_priority(level, fn, *args):
+    # 다른 스레드(스레드 풀 등)에서 호출한 쪽의 우선순위를 이어서 실행
+    with priority(level):
+        return fn(*args)
+
+
+def _is_rate_limited(e):
+    # ccxt(RateLimitExceeded/DDoSProtection) 와 requests(HTTP 429) 를 가져오지 않고 판별
+    names = {cls.__name__ for cls in type(e).__mro__}
+    if names & {'RateLimitExceeded', 'DDoSProtection'}:
+        return True
+    response = getattr(e, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+class _InFlight:
+    # 진행 중인 요청 하나. 같은 요청을 보낸 호출자들이 결과를 함께 기다린다
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.ticket = None  # 토큰 대기 중인 [우선순위, 순번]
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, weight, now):
+        # weight 만큼 토큰이 쌓일 때까지 남은 시간(초)
+        self.refill(now)
+        weight = min(weight, self.capacity)
+        return 0.0 if self.tokens >= weight else (weight - self.tokens) / self.rate
+
+    def take(self, weight):
+        self.tokens -= min(weight, self.capacity)
+
+    def drain(self, seconds):
+        # 429 를 받으면 남은 토큰을 버리고 seconds 동안 채우지 않는다
+        self.tokens = 0.0
+        self.updated = time.monotonic() + seconds
+
+
+class VenueQueue:
+    # 한 거래소의 토큰 버킷과 대기열. 대기열 맨 앞(우선순위, 도착 순) 요청만 토큰을 가져간다
+    def __init__(self, rate, capacity):
+        self.bucket = TokenBucket(rate, capacity)
+        self.waiting = []  # [우선순위, 순번] 힙
+        self.cond = threading.Condition()
+
+    def acquire(self, weight, ticket):
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if self.waiting[0] is ticket:
+                        wait = self.bucket.wait_time(weight, time.monotonic())
+                        if wait <= 0:
+                            self.bucket.take(weight)
+                            return
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+
+    def promote(self, ticket, level):
+        # 대기 중인 요청의 우선순위를 올린다 (화면 조회가 같은 백그라운드 요청에 합쳐진 경우)
+        with self.cond:
+            if ticket[0] > level:
+                ticket[0] = level
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+
+    def drain(self, seconds):
+        with self.cond:
+            self.bucket.drain(seconds)
+            self.cond.notify_all()
+
+
+class RequestScheduler:
+    def __init__(self, limits=None, weights=None):
+        self.limits = dict(VENUE_LIMITS if limits is None else limits)
+        self.weights = dict(ENDPOINT_WEIGHTS if weights is None else weights)
+        self._venues = {}
+        self._in_flight = {}  # (venue, endpoint, fn, 인자) -> _InFlight
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waits = {}  # venue -> deque[토큰 대기 시간(ms)]
+        self._counters = {}  # venue -> {'requests', 'coalesced', 'rate_limited', 'errors'}
+
+    def _venue(self, venue):
+        queue = self._venues.get(venue)
+        if queue is None:
+            with self._lock:
+                queue = self._venues.get(venue)
+                if queue is None:
+                    queue = self._venues[venue] = VenueQueue(*self.limits.get(venue, DEFAULT_LIMIT))
+                    self._waits[venue] = deque(maxlen=WAIT_SAMPLES)
+                    self._counters[venue] = {'requests': 0, 'coalesced': 0, 'rate_limited': 0, 'errors': 0}
+        return queue
+
+    def call(self, venue, endpoint, fn, *args, weight=None, **kwargs):
+        # fn(*args, **kwargs) 를 거래소 제한에 맞춰 실행하고 결과를 반환 (예외는 그대로 전달)
+        queue = self._venue(venue)
+        # 바운드 메서드는 인스턴스까지 비교하므로 현물/선물 인스턴스의 같은 요청은 합쳐지지 않는다
+        key = (fn,) + request_key(venue, endpoint, fn, args, kwargs)
+        try:
+            hash(key)
+        except TypeError:  # 해시할 수 없는 인자는 합치지 않는다
+            key = (venue, endpoint, object())
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+            else:
+                self._counters[venue]['coalesced'] += 1
+                ticket = flight.ticket
+        if not leader:
+            if ticket is not None:
+                queue.promote(ticket, current_priority())
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._send(queue, flight, venue, endpoint, fn, args, kwargs, weight)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def _send(self, queue, flight, venue, endpoint, fn, args, kwargs, weight):
+        if weight is None:
+            weight = self.weights.get((venue, endpoint), 1)
+        level = current_priority()
+        counters = self._counters[venue]
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            started = time.monotonic()
+            with self._lock:
+                ticket = flight.ticket = [level, next(self._seq)]
+            queue.acquire(weight, ticket)
+            with self._lock:
+                level, flight.ticket = ticket[0], None
+            self._waits[venue].append((time.monotonic() - started) * 1000)
+            counters['requests'] += 1
+            try:
+                return market_log().call(venue, endpoint, fn, args, kwargs)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == RATE_LIMIT_RETRIES:
+                    counters['errors'] += 1
+                    raise
+                counters['rate_limited'] += 1
+                queue.drain(RATE_LIMIT_BACKOFF * 2 ** attempt)
+
+    def stats(self):
+        # 거래소별 처리 건수와 토큰 대기 시간(ms) 분포
+        result = {}
+        for venue, counters in list(self._counters.items()):
+            waits = np.array(self._waits[venue]) if self._waits[venue] else np.zeros(1)
+            result[venue] = dict(counters, waiting=len(self._venues[venue].waiting),
+                                 wait_p50_ms=float(np.percentile(waits, 50)),
+                                 wait_p95_ms=float(np.percentile(waits, 95)))
+        return result
+
+
+_request_scheduler = RequestScheduler()
+
+
+def request_scheduler():
+    return _request_scheduler
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+# ----------------------
+# 시뮬레이션 커널 빌드
+# ----------------------
+# 설치할 때 _sim_kernel.pyx 를 저장소 루트(simulate.py 옆)에 확장 모듈로 빌드한다.
+# requirements.txt 의 "-e ." 로 배포 환경에서 의존성과 함께 빌드되며, 로컬에서는
+#   python setup.py build_ext --inplace
+# 로 다시 빌드한다. 앱 모듈 자체는 패키지로 설치하지 않는다.
+# 컴파일러가 없어서 빌드에 실패해도 설치는 계속되고 simulate.py 가 파이썬 구현을 사용한다.
+extensions = cythonize([Extension('_sim_kernel', ['_sim_kernel.pyx'])], compiler_directives={'language_level': 3})
+for extension in extensions:
+    extension.optional = True  # cythonize 는 optional 을 옮겨주지 않는다
+
+setup(
+    name='auto-trading-sim-kernel',
+    version='1.0',
+    py_modules=[],
+    packages=[],
+    ext_modules=extensions,
+)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import DEFAULT_CASH, STRATEGIES, summary
+
+# ----------------------
+# 경로 의존 시뮬레이션
+# ----------------------
+# 트레일링 스톱, 단계별 익절, 현재 현금에 따른 매수 수량처럼 이전 봉의 상태에 따라
+# 결과가 달라지는 규칙은 배열 연산으로 풀 수 없으므로 봉 단위로 시뮬레이션한다.
+# 반복문은 Cython 커널(_sim_kernel.pyx)에서 돌린다. 커널은 설치할 때 setup.py 가 이 파일 옆에
+# 확장 모듈로 빌드하며, import 할 때는 빌드하지 않는다.
+# 빌드되어 있지 않으면 같은 로직의 파이썬 구현(simulate_reference)을 쓰고 경고를 남긴다.
+# 두 구현의 결과가 같은지는 tests/test_simulate.py, 속도 차이는 benchmarks/bench_simulate.py 로 확인한다.
+# SIM_KERNEL=python 으로 파이썬 구현을 강제할 수 있다.
+ENTRY = 0
+TRAILING_STOP = 1
+TAKE_PROFIT = 2
+EXIT_SIGNAL = 3
+FILL_REASONS = {ENTRY: '진입', TRAILING_STOP: '트레일링 스톱', TAKE_PROFIT: '익절', EXIT_SIGNAL: '청산 신호'}
+
+logger = logging.getLogger(__name__)
+
+SimResult = namedtuple('SimResult', ['equity', 'fills', 'stats'])
+
+
+def simulate_reference(open_, high, low, close, signal, init_cash, alloc, trail_pct,
+                       tp_levels, tp_fractions, fractional):
+    # _sim_kernel.simulate_kernel 과 같은 로직 (기준 구현)
+    # 파이썬 float 리스트로 바꿔서 읽는다 (같은 double 연산이라 결과는 같다)
+    open_, high, low, close = (np.asarray(a).tolist() for a in (open_, high, low, close))
+    tp_levels, tp_fractions = np.asarray(tp_levels).tolist(), np.asarray(tp_fractions).tolist()
+    n = len(close)
+    levels = len(tp_levels)
+    tp = 0
+    cash = init_cash
+    qty = 0.0
+    entry_qty = 0.0
+    entry_price = 0.0
+    peak = 0.0
+    armed = True
+
+    equity = np.empty(n, dtype=np.float64)
+    fills = []
+
+    for i in range(n):
+        if i > 0:
+            if not signal[i - 1]:
+                armed = True
+                # 전략 청산 신호 -> 시가에 전량 매도
+                if qty > 0.0:
+                    price = open_[i]
+                    cash += qty * price
+                    fills.append((i, -1, price, qty, qty * (price - entry_price), EXIT_SIGNAL))
+                    qty = 0.0
+            elif qty == 0.0 and armed:
+                # 진입 신호 -> 시가에 현재 현금의 alloc 비율만큼 매수
+                price = open_[i]
+                size = cash * alloc / price
+                if not fractional:
+                    size = float(math.floor(size))
+                if size > 0.0 and size * price <= cash:
+                    cash -= size * price
+                    qty = size
+                    entry_qty = size
+                    entry_price = price
+                    peak = price
+                    tp = 0
+                    fills.append((i, 1, price, size, 0.0, ENTRY))
+
+        if qty > 0.0:
+            # 트레일링 스톱 (같은 봉에서는 익절보다 먼저 확인)
+            if trail_pct > 0.0:
+                stop = peak * (1.0 - trail_pct)
+                if low[i] <= stop:
+                    price = open_[i] if open_[i] < stop else stop
+                    cash += qty * price
+                    fills.append((i, -1, price, qty, qty * (price - entry_price), TRAILING_STOP))
+                    qty = 0.0
+                    armed = False
+            # 익절 단계: 진입가 대비 각 단계에 닿으면 진입 수량의 일부씩 매도
+            while qty > 0.0 and tp < levels and high[i] >= entry_price * (1.0 + tp_levels[tp]):
+                level = entry_price * (1.0 + tp_levels[tp])
+                price = open_[i] if open_[i] > level else level
+                size = entry_qty * tp_fractions[tp]
+                if not fractional:
+                    size = float(math.floor(size))
+                if size > qty:
+                    size = qty
+                tp += 1
+                if size > 0.0:
+                    cash += size * price
+                    qty -= size
+                    fills.append((i, -1, price, size, size * (price - entry_price), TAKE_PROFIT))
+                    if qty <= 0.0:
+                        qty = 0.0
+                        armed = False
+            if qty > 0.0 and high[i] > peak:
+                peak = high[i]
+
+        equity[i] = cash + qty * close[i]
+
+    return equity, fills
+
+
+def _load_kernel():
+    # (커널 함수, 'cython' 또는 'python', 파이썬 구현을 쓰게 된 이유)
+    if os.environ.get('SIM_KERNEL', 'cython') != 'cython':
+        return simulate_reference, 'python', 'SIM_KERNEL 설정'
+    try:
+        from _sim_kernel import simulate_kernel as kernel
+    except ImportError as e:  # 설치할 때 빌드하지 않았거나 컴파일러가 없어서 빌드에 실패한 경우
+        reason = f"{type(e).__name__}: {e}"
+        logger.warning("Cython 시뮬레이션 커널이 빌드되어 있지 않아 파이썬 구현을 사용합니다. "
+                       "python setup.py build_ext --inplace 로 빌드할 수 있습니다 (%s)", reason)
+        return simulate_reference, 'python', reason
+    return kernel, 'cython', None
+
+
+# 현재 사용 중인 커널은 KERNEL ('cython'/'python'), 파이썬 구현으로 바뀐 이유는 KERNEL_FALLBACK_REASON
+simulate_kernel, KERNEL, KERNEL_FALLBACK_REASON = _load_kernel()
+
+
+def simulate(df, signal, init_cash=DEFAULT_CASH, alloc=1.0, trail_pct=0.0, tp_levels=(), tp_fractions=(),
+             fractional=True, kernel=None):
+    # signal[i]: i번째 봉 종가 이후 보유 여부 (backtest.backtest 와 같은 의미)
+    # tp_levels: 진입가 대비 익절 단계 (예: (0.05, 0.1)), tp_fractions: 단계별 매도 비율 (진입 수량 기준)
+    if len(tp_levels) != len(tp_fractions):
+        raise ValueError("익절 단계와 매도 비율의 개수가 다릅니다.")
+    arrays = [np.ascontiguousarray(df[col].to_numpy(dtype='float64')) for col in ('open', 'high', 'low', 'close')]
+    equity, fills = (kernel or simulate_kernel)(
+        *arrays, np.ascontiguousarray(signal, dtype=np.uint8),
+        float(init_cash), float(alloc), float(trail_pct),
+        np.asarray(tp_levels, dtype='float64'), np.asarray(tp_fractions, dtype='float64'), bool(fractional))
+
+    equity = pd.Series(equity, index=df.index, name='equity')
+    fills = pd.DataFrame(fills, columns=['bar', 'side', 'price', 'qty', 'pnl', 'reason'])
+    fills.insert(0, 'time', df.index[fills['bar'].to_numpy(dtype='int64')])
+    fills['reason'] = fills['reason'].map(FILL_REASONS)
+    stats = summary(equity, fills[fills['side'] < 0], init_cash)
+    return SimResult(equity, fills, stats)
+
+
+def run_path_strategy(df, strategy, params=None, **options):
+    # 등록된 전략의 보유 신호에 트레일링 스톱/익절/현금 비율 매수를 더해서 시뮬레이션
+    strategy = STRATEGIES[strategy]
+    signal = strategy.fn(df, **dict(strategy.params, **(params or {})))
+    return simulate(df, signal, **options)
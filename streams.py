@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from bar_store import normalize_ohlcv
+from market_data import Quote
+from market_log import market_log
+
+try:
+    import websocket
+except ImportError:  # websocket-client 가 없으면 REST 조회만 사용
+    websocket = None
+
+# ----------------------
+# 실시간 체결 스트림 (웹소켓)
+# ----------------------
+# 업비트/바이낸스 웹소켓의 체결(trade)·티커(ticker) 채널을 구독해서
+# 메모리에 최신가 테이블과 1분봉을 유지한다. 시세 조회는 이 테이블을 먼저 읽고,
+# 값이 없거나 오래된 경우에만 REST 로 조회한다.
+# 차트용 과거 봉도 최근 구간은 1분봉을 차트 간격으로 합쳐서 만들고(streamed_history),
+# REST/봉 저장소는 스트림이 받기 전의 지난 봉을 채우는 데만 쓴다.
+# 웹소켓 주소와 전송 계층은 바꿔 끼울 수 있어서 테스트에서는 로컬 가짜 서버를 쓸 수 있다.
+# 시세 기록/재생 모드(market_log)에서는 전송 계층을 감싸서 메시지를 기록하거나 기록된 메시지를 보낸다.
+STREAMING_ENABLED = os.environ.get('MARKET_STREAMING', '1') == '1' and (
+    websocket is not None or market_log().mode == 'replay')
+UPBIT_WS_URL = os.environ.get('UPBIT_WS_URL', 'wss://api.upbit.com/websocket/v1')
+BINANCE_FUTURES_WS_URL = os.environ.get('BINANCE_FUTURES_WS_URL', 'wss://fstream.binance.com/ws')
+
+QUOTE_MAX_AGE = 5  # 이보다 오래된 스트림 가격은 사용하지 않음(초)
+CANDLE_SECONDS = 60
+CANDLE_HISTORY = 24 * 60  # 심볼별로 보관할 1분봉 개수
+RECONNECT_MAX_DELAY = 60
+# 봉 간격 -> pandas resample 규칙 (업비트 일봉은 KST 09:00 = UTC 00:00 시작이라 UTC 기준과 맞는다)
+RESAMPLE_RULES = {'1m': '1min', '5m': '5min', '15m': '15min', '1h': '1h', '4h': '4h', '1d': '1D'}
+
+
+class WebSocketTransport:
+    # websocket-client 기반 기본 전송 계층
+    def __init__(self, url, on_open, on_message):
+        self._app = websocket.WebSocketApp(
+            url,
+            on_open=lambda ws: on_open(),
+            on_message=lambda ws, message: on_message(message))
+
+    def run(self):
+        # 연결이 끊길 때까지 블록
+        self._app.run_forever(ping_interval=30, ping_timeout=10)
+
+    def send(self, text):
+        self._app.send(text)
+
+    def close(self):
+        self._app.close()
+
+
+# ----------------------
+# 롤링 캔들
+# ----------------------
+class RollingCandles:
+    def __init__(self, seconds=CANDLE_SECONDS, maxlen=CANDLE_HISTORY):
+        self.step_ms = seconds * 1000
+        # [시작시각(ms), open, high, low, close, volume]
+        self.bars = deque(maxlen=maxlen)
+
+    def update(self, price, qty, ts_ms):
+        start = ts_ms - ts_ms % self.step_ms
+        if self.bars and self.bars[-1][0] == start:
+            bar = self.bars[-1]
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += qty
+        elif not self.bars or start > self.bars[-1][0]:
+            self.bars.append([start, price, price, price, price, qty])
+
+    def to_frame(self):
+        df = pd.DataFrame(list(self.bars), columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df.index = pd.to_datetime(df.pop('timestamp'), unit='ms', utc=True)
+        return normalize_ohlcv(df)
+
+
+# ----------------------
+# 스트림 공통 동작
+# ----------------------
+class TickerStream:
+    name = 'stream'
+
+    def __init__(self, url, transport_factory=WebSocketTransport):
+        self.url = url
+        self.transport_factory = transport_factory
+        self.symbols = set()
+        self.latest = {}  # symbol -> Quote
+        self._received_at = {}  # symbol -> 마지막 수신 시각(time.time())
+        self._candles = {}
+        self._lock = threading.Lock()
+        self._transport = None
+        self._connected = False
+        self._thread = None
+        self._stopped = False
+        self._listeners = []
+
+    # 거래소별로 구현
+    def subscription_messages(self, symbols, added):
+        raise NotImplementedError
+
+    def parse(self, message):
+        # (symbol, price, qty, ts_ms) 목록 반환, qty 가 0 이면 가격만 갱신
+        raise NotImplementedError
+
+    def subscribe(self, symbol):
+        with self._lock:
+            if symbol in self.symbols:
+                return
+            self.symbols.add(symbol)
+            symbols = sorted(self.symbols)
+        self.start()
+        if self._connected:
+            self._send(self.subscription_messages(symbols, [symbol]))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-stream', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        if self._transport is not None:
+            self._transport.close()
+
+    def add_listener(self, fn):
+        # fn(symbol, quote, received_at) 은 수신 스레드에서 호출되므로 오래 걸리는 일은 하지 않는다
+        self._listeners.append(fn)
+
+    def latest_quote(self, symbol, max_age=QUOTE_MAX_AGE):
+        received_at = self._received_at.get(symbol)
+        if received_at is None or time.time() - received_at > max_age:
+            return None
+        return self.latest.get(symbol)
+
+    def candles(self, symbol):
+        with self._lock:
+            candles = self._candles.get(symbol)
+            return None if candles is None else candles.to_frame()
+
+    def _send(self, messages):
+        for message in messages:
+            try:
+                self._transport.send(message)
+            except Exception:
+                pass  # 끊긴 경우 재연결 시 전체 구독을 다시 보낸다
+
+    def _on_open(self):
+        self._connected = True
+        self._backoff = 1
+        with self._lock:
+            symbols = sorted(self.symbols)
+        if symbols:
+            self._send(self.subscription_messages(symbols, symbols))
+
+    def _on_message(self, message):
+        try:
+            events = self.parse(message)
+        except Exception:
+            return  # 알 수 없는 메시지는 무시
+        received_at = time.time()
+        for symbol, price, qty, ts_ms in events:
+            quote = self.latest[symbol] = Quote(symbol, price, datetime.fromtimestamp(ts_ms / 1000))
+            self._received_at[symbol] = received_at
+            for listener in self._listeners:
+                listener(symbol, quote, received_at)
+            if qty:
+                with self._lock:
+                    candles = self._candles.get(symbol)
+                    if candles is None:
+                        candles = self._candles[symbol] = RollingCandles()
+                    candles.update(price, qty, ts_ms)
+
+    def _run(self):
+        self._backoff = 1
+        while not self._stopped:
+            try:
+                self._transport = self.transport_factory(self.url, self._on_open, self._on_message)
+                self._transport.run()
+            except Exception:
+                pass
+            self._connected = False
+            if self._stopped:
+                break
+            # 연결이 끊기면 지수 백오프로 재연결
+            time.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, RECONNECT_MAX_DELAY)
+
+
+# ----------------------
+# 업비트 (KRW 현물)
+# ----------------------
+class UpbitTickerStream(TickerStream):
+    name = 'upbit'
+
+    def subscription_messages(self, symbols, added):
+        # 업비트는 구독 요청마다 전체 목록을 다시 보내야 한다
+        return [json.dumps([
+            {'ticket': uuid.uuid4().hex},
+            {'type': 'ticker', 'codes': symbols, 'isOnlyRealtime': True},
+            {'type': 'trade', 'codes': symbols, 'isOnlyRealtime': True},
+        ])]
+
+    def parse(self, message):
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        data = json.loads(message)
+        if data.get('type') == 'trade':
+            return [(data['code'], data['trade_price'], data['trade_volume'], data['trade_timestamp'])]
+        if data.get('type') == 'ticker':
+            return [(data['code'], data['trade_price'], 0, data['timestamp'])]
+        return []
+
+
+# ----------------------
+# 바이낸스 선물 (USDT 무기한)
+# ----------------------
+class BinanceFuturesTickerStream(TickerStream):
+    name = 'binance-future'
+
+    def __init__(self, url, transport_factory=WebSocketTransport):
+        super().__init__(url, transport_factory)
+        self._message_id = 0
+        self._by_stream_name = {}  # 'BTCUSDT' -> 'BTC/USDT'
+
+    def _stream_name(self, symbol):
+        name = symbol.replace('/', '').split(':')[0]
+        self._by_stream_name[name] = symbol
+        return name.lower()
+
+    def subscription_messages(self, symbols, added):
+        self._message_id += 1
+        params = []
+        for symbol in added:
+            name = self._stream_name(symbol)
+            params += [f'{name}@aggTrade', f'{name}@ticker']
+        return [json.dumps({'method': 'SUBSCRIBE', 'params': params, 'id': self._message_id})]
+
+    def parse(self, message):
+        data = json.loads(message)
+        symbol = self._by_stream_name.get(data.get('s'))
+        if symbol is None:
+            return []
+        if data.get('e') == 'aggTrade':
+            return [(symbol, float(data['p']), float(data['q']), data['T'])]
+        if data.get('e') == '24hrTicker':
+            return [(symbol, float(data['c']), 0, data['E'])]
+        return []
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def _stream(name, factory):
+    stream = _streams.get(name)
+    if stream is None:
+        with _streams_lock:
+            stream = _streams.get(name)
+            if stream is None:
+                stream = _streams[name] = factory()
+    return stream
+
+
+def upbit_stream():
+    return _stream('upbit', lambda: UpbitTickerStream(
+        UPBIT_WS_URL, market_log().transport_factory('upbit', WebSocketTransport)))
+
+
+def binance_futures_stream():
+    return _stream('binance-future', lambda: BinanceFuturesTickerStream(
+        BINANCE_FUTURES_WS_URL, market_log().transport_factory('binance-future', WebSocketTransport)))
+
+
+def streamed_quote(stream, symbol):
+    # 스트리밍 모드면 구독을 걸고 최신가를 반환 (아직 수신 전이거나 오래됐으면 None)
+    if not STREAMING_ENABLED:
+        return None
+    stream.subscribe(symbol)
+    return stream.latest_quote(symbol)
+
+
+def resample_candles(candles, interval):
+    # 1분봉을 interval 봉으로 합친다 (거래가 없던 구간은 봉을 만들지 않음)
+    bars = candles.resample(RESAMPLE_RULES[interval], origin='epoch', label='left', closed='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    return bars.dropna(subset=['open'])
+
+
+def streamed_history(stream, symbol, history, interval):
+    # 최근 구간은 스트림 1분봉을 interval 로 합친 봉으로, 그 이전은 history(REST/봉 저장소)로 채운다.
+    # 스트림은 구독한 뒤부터만 받으므로 history 와 겹치는 봉은 history 의 시가를 쓰고,
+    # 고가/거래량은 큰 쪽, 저가는 작은 쪽, 종가는 스트림 값을 쓴다.
+    if not STREAMING_ENABLED:
+        return history
+    stream.subscribe(symbol)
+    candles = stream.candles(symbol)
+    if candles is None or candles.empty or stream.latest_quote(symbol) is None:
+        return history  # 아직 수신 전이거나 연결이 끊겨 오래된 경우
+    recent = resample_candles(candles, interval)
+    if history is None or history.empty:
+        return normalize_ohlcv(recent)
+    overlap = history.reindex(recent.index)
+    recent = recent.assign(
+        open=overlap['open'].fillna(recent['open']),
+        high=np.fmax(overlap['high'], recent['high']),
+        low=np.fmin(overlap['low'], recent['low']),
+        volume=np.fmax(overlap['volume'], recent['volume']))
+    return normalize_ohlcv(pd.concat([history.drop(recent.index, errors='ignore'), recent]))
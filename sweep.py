@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import DEFAULT_CASH, STRATEGIES, run_strategy
+
+# ----------------------
+# 파라미터 스윕
+# ----------------------
+# 여러 종목 x 파라미터 조합의 백테스트를 프로세스 풀에 나눠서 실행한다.
+# 봉 데이터는 작업마다 피클링하지 않고 종목별 공유 메모리 블록에 한 번만 써두며,
+# 워커는 처음 한 번 붙어서(attach) 복사 없이 DataFrame 으로 감싸 재사용한다.
+# 스트림릿 서버의 스레드를 fork 로 복제하지 않도록 spawn 방식 풀을 사용한다.
+SWEEP_START_METHOD = 'spawn'
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class SharedFrame:
+    # 블록 구조: float64 [5, n] (OHLCV) 다음에 int64 [n] (UTC 나노초 타임스탬프)
+    def __init__(self, df):
+        self.rows = len(df)
+        values_size = len(COLUMNS) * self.rows * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(values_size + self.rows * 8, 1))
+        values, ts = _views(self.shm.buf, self.rows)
+        for i, col in enumerate(COLUMNS):
+            values[i] = df[col].to_numpy(dtype='float64')
+        ts[:] = df.index.as_unit('ns').asi8
+
+    @property
+    def descriptor(self):
+        # 워커에 넘기는 정보는 이름과 행 수뿐
+        return self.shm.name, self.rows
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _views(buf, rows):
+    values = np.ndarray((len(COLUMNS), rows), dtype='float64', buffer=buf)
+    ts = np.ndarray((rows,), dtype='int64', buffer=buf, offset=len(COLUMNS) * rows * 8)
+    return values, ts
+
+
+# ----------------------
+# 워커 프로세스
+# ----------------------
+_worker = {}
+
+
+def _init_worker(descriptors, strategy, init_cash, fractional):
+    _worker.update(descriptors=descriptors, strategy=strategy, init_cash=init_cash,
+                   fractional=fractional, frames={}, blocks=[])
+
+
+def _frame(symbol):
+    frame = _worker['frames'].get(symbol)
+    if frame is None:
+        name, rows = _worker['descriptors'][symbol]
+        # 블록 정리(unlink)는 생성한 부모 프로세스가 한다
+        shm = shared_memory.SharedMemory(name=name)
+        values, ts = _views(shm.buf, rows)
+        index = pd.DatetimeIndex(ts.view('datetime64[ns]'), name='timestamp').tz_localize('UTC')
+        # (5, n) 배열을 그대로 하나의 블록으로 사용 (복사 없음)
+        frame = pd.DataFrame(values.T, index=index, columns=COLUMNS, copy=False)
+        _worker['blocks'].append(shm)
+        _worker['frames'][symbol] = frame
+    return frame
+
+
+def _run_task(job):
+    symbol, params = job
+    try:
+        result = run_strategy(_frame(symbol), _worker['strategy'], params,
+                              _worker['init_cash'], _worker['fractional'][symbol])
+        return dict(symbol=symbol, **params, **result.stats)
+    except Exception as e:
+        return dict(symbol=symbol, **params, error=str(e))
+
+
+# ----------------------
+# 실행
+# ----------------------
+def param_grid(grid):
+    # {'fast': [10, 20], 'slow': [50, 100]} -> [{'fast': 10, 'slow': 50}, ...]
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def sweep(frames, strategy, grid, init_cash=DEFAULT_CASH, fractional=None, processes=None, rank_by='sharpe'):
+    # frames: {종목: 표준 형식 OHLCV}, fractional: {종목: 소수 수량 체결 여부} (기본 True)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"알 수 없는 전략: {strategy}")
+    fractional = {symbol: (fractional or {}).get(symbol, True) for symbol in frames}
+    jobs = [(symbol, params) for symbol in frames for params in param_grid(grid)]
+    if not jobs:
+        return pd.DataFrame()
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+
+    shared = {}
+    try:
+        for symbol, df in frames.items():
+            shared[symbol] = SharedFrame(df)
+        descriptors = {symbol: block.descriptor for symbol, block in shared.items()}
+        context = multiprocessing.get_context(SWEEP_START_METHOD)
+        with context.Pool(processes, initializer=_init_worker,
+                          initargs=(descriptors, strategy, init_cash, fractional)) as pool:
+            # 작업을 코어 수의 몇 배로 나눠서 보내 프로세스 간 부하를 맞춘다
+            chunksize = max(1, len(jobs) // (processes * 4))
+            rows = list(pool.imap_unordered(_run_task, jobs, chunksize=chunksize))
+    finally:
+        for block in shared.values():
+            block.close()
+
+    table = pd.DataFrame(rows)
+    if rank_by in table:
+        table = table.sort_values(rank_by, ascending=False, ignore_index=True)
+        table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import account
+import db
+
+
+@pytest.fixture
+def users_db(tmp_path, monkeypatch):
+    # 테스트마다 빈 users.db 를 쓰고, 프로세스 공용 계좌 캐시도 비운다
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'users.db'))
+    monkeypatch.setattr(account, '_accounts', {})
+
+    def add_user(username):
+        conn = db.connection()
+        return conn.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, 'x')).lastrowid
+
+    return add_user
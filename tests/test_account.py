@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+import account
+import db
+from account import SQL_LAST_VERSION, AccountState, VirtualAccount, load_account
+
+
+def state_tuple(state):
+    return (state.version, round(state.cash, 6), {k: round(v, 9) for k, v in state.holdings.items()},
+            {k: round(v, 6) for k, v in state.cost.items()}, round(state.realized_pnl, 6))
+
+
+def random_trades(acct, count, seed):
+    # 입금/매수/매도를 섞어서 기록하고 성공한 이벤트 수를 반환 (잔고 부족은 거부)
+    rng = random.Random(seed)
+    recorded = 0
+    acct.deposit(1_000_000)
+    for _ in range(count):
+        symbol = rng.choice(['KRW-BTC', '삼성전자'])
+        price = rng.randint(1, 100) * 100
+        if rng.random() < 0.1:
+            acct.deposit(rng.randint(1, 10) * 10_000)
+            recorded += 1
+        elif rng.random() < 0.5:
+            recorded += acct.buy(symbol, price, rng.randint(1, 20))
+        else:
+            held = acct.holdings.get(symbol, 0)
+            recorded += acct.sell(symbol, price, rng.randint(1, max(1, int(held))))
+    return recorded + 1
+
+
+def test_snapshot_plus_tail_matches_full_replay(users_db, monkeypatch):
+    monkeypatch.setattr(account, 'SNAPSHOT_EVERY', 7)
+    user_id = users_db('alice')
+    acct = VirtualAccount(user_id=user_id)
+    recorded = random_trades(acct, 200, seed=1)
+    assert acct.state.version == recorded
+
+    conn = db.connection()
+    assert conn.execute('SELECT COUNT(*) FROM snapshots WHERE user_id = ?', (user_id,)).fetchone()[0] \
+        == recorded // 7
+
+    # 최근 스냅샷 + 이후 이벤트로 만든 상태 == 메모리 상태
+    loaded = account._load_state(conn, user_id)
+    assert state_tuple(loaded) == state_tuple(acct.state)
+
+    # 스냅샷 없이 처음부터 재생해도 같다
+    replayed = AccountState()
+    account._replay_tail(conn, user_id, replayed)
+    assert state_tuple(replayed) == state_tuple(acct.state)
+
+    # 원장에 남긴 이벤트별 현금/실현 손익도 재생 결과와 같다
+    last = conn.execute('SELECT cash_after, realized_after FROM ledger WHERE user_id = ? ORDER BY version DESC '
+                        'LIMIT 1', (user_id,)).fetchone()
+    assert last == pytest.approx((acct.cash, acct.realized_pnl))
+
+
+def test_rejected_trade_is_not_recorded(users_db):
+    acct = VirtualAccount(user_id=users_db('bob'))
+    acct.deposit(10_000)
+    assert not acct.buy('KRW-BTC', 5_000, 3)
+    assert not acct.sell('KRW-BTC', 5_000, 1)
+    assert acct.buy('KRW-BTC', 5_000, 2)
+    assert acct.cash == 0 and acct.holdings == {'KRW-BTC': 2}
+    assert [row[2] for row in acct.history()] == ['deposit', 'buy']
+
+
+def test_failed_statement_rolls_back_event(users_db):
+    user_id = users_db('carol')
+    acct = VirtualAccount(user_id=user_id)
+    acct.deposit(10_000)
+    missing = ("UPDATE orders SET status = 'filled' WHERE id = ?", (999,))
+    with pytest.raises(LookupError):
+        acct.buy('KRW-BTC', 1_000, 1, statements=[missing])
+    assert db.connection().execute(SQL_LAST_VERSION, (user_id,)).fetchone()[0] == 1
+    assert acct.cash == 10_000 and acct.holdings == {}
+
+
+def test_account_catches_up_with_other_writers(users_db):
+    # 다른 프로세스의 계좌 객체가 먼저 쓴 이벤트를 확인 전에 따라잡는다
+    user_id = users_db('dave')
+    first, second = VirtualAccount(user_id=user_id), VirtualAccount(user_id=user_id)
+    first.deposit(10_000)
+    assert second.cash == 10_000
+    assert first.buy('KRW-BTC', 10_000, 1)
+    assert not second.buy('KRW-ETH', 1, 1)
+    assert second.sell('KRW-BTC', 12_000, 1)
+    assert second.state.version == 3 and second.realized_pnl == 2_000
+    assert load_account('dave') is load_account('dave')
+    assert load_account('nobody') is None
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from bar_store import BarStore, normalize_ohlcv
+
+KEY = ('upbit', 'KRW-BTC', '1d')
+
+
+def upstream(periods=30):
+    # 업스트림이 가진 전체 봉 (마지막 봉은 진행 중)
+    index = pd.date_range('2024-01-01', periods=periods, freq='D', tz='UTC')
+    close = 100 + np.arange(periods, dtype='float64')
+    bars = normalize_ohlcv(pd.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+                                         'volume': np.full(periods, 0.5)}, index=index))
+    bars.index.freq = None  # 저장소에서 읽은 인덱스에는 freq 가 없다
+    return bars
+
+
+class Upstream:
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = []
+
+    def fetch_since(self, since):
+        self.calls.append(since)
+        return self.bars[self.bars.index >= since]
+
+
+def test_get_bars_fetches_only_missing_tail(tmp_path):
+    store = BarStore(str(tmp_path / 'bars.db'))
+    source = Upstream(upstream())
+    start = source.bars.index[10]
+
+    first = store.get_bars(*KEY, start, source.fetch_since)
+    pd.testing.assert_frame_equal(first, source.bars[10:])
+    assert source.calls == [start]
+
+    # 동기화 직후에는 디스크에서만 응답
+    store.get_bars(*KEY, start, source.fetch_since)
+    assert len(source.calls) == 1
+
+    # 마지막 봉이 바뀌고 새 봉이 생기면 마지막 저장 봉부터만 받는다
+    bars = upstream(32)
+    bars.iloc[29, bars.columns.get_loc('close')] = 999.0
+    source.bars = bars
+    synced = store.get_bars(*KEY, start, source.fetch_since, max_age=0)
+    assert source.calls[-1] == bars.index[29]
+    pd.testing.assert_frame_equal(synced, bars[10:])
+
+
+def test_get_bars_backfills_earlier_start(tmp_path):
+    store = BarStore(str(tmp_path / 'bars.db'))
+    source = Upstream(upstream())
+    store.get_bars(*KEY, source.bars.index[20], source.fetch_since)
+
+    earlier = source.bars.index[5]
+    bars = store.get_bars(*KEY, earlier, source.fetch_since)
+    assert source.calls[-1] == earlier
+    pd.testing.assert_frame_equal(bars, source.bars[5:])
+    assert store.sync_state(*KEY)[1] == earlier
+
+    # 다른 시리즈와 섞이지 않는다
+    assert store.load('upbit', 'KRW-ETH', '1d').empty
+
+
+def test_store_survives_reopen(tmp_path):
+    path = str(tmp_path / 'bars.db')
+    source = Upstream(upstream())
+    BarStore(path).get_bars(*KEY, source.bars.index[0], source.fetch_since)
+
+    reopened = BarStore(path)
+    pd.testing.assert_frame_equal(reopened.get_bars(*KEY, source.bars.index[0], source.fetch_since),
+                                  source.bars)
+    assert len(source.calls) == 1
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import normalize_ohlcv
+from indicators import ATR, EMA, MACD, RSI, SMA, VWAP, Bollinger, IndicatorSet
+
+
+def make_indicators():
+    return [SMA(5), EMA(8), Bollinger(10, 2), VWAP(), RSI(6), MACD(4, 9, 3), ATR(5)]
+
+
+def random_bars(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    df = pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * 1.01,
+        'low': np.minimum(open_, close) * 0.99,
+        'close': close,
+        'volume': rng.random(n) * 10,
+    }, index=pd.date_range('2024-01-01', periods=n, freq='h', tz='UTC'))
+    return normalize_ohlcv(df)
+
+
+def full_recompute(df):
+    return IndicatorSet(make_indicators()).update(df)
+
+
+def assert_same(actual, expected):
+    pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9, atol=1e-9)
+
+
+def test_appending_bars_matches_full_recompute():
+    bars = random_bars()
+    indicator_set = IndicatorSet(make_indicators())
+    for end in range(50, 120):
+        result = indicator_set.update(bars.iloc[:end])
+        assert_same(result, full_recompute(bars.iloc[:end]))
+
+
+def test_in_progress_bar_is_recomputed():
+    bars = random_bars()
+    indicator_set = IndicatorSet(make_indicators())
+    indicator_set.update(bars.iloc[:100])
+    # 진행 중인 마지막 봉의 값이 바뀐 경우
+    changed = bars.iloc[:100].copy()
+    changed.iloc[-1, changed.columns.get_loc('close')] *= 1.05
+    changed.iloc[-1, changed.columns.get_loc('volume')] += 3
+    assert_same(indicator_set.update(changed), full_recompute(changed))
+
+
+@pytest.mark.parametrize('window', [60, 200])
+def test_rolling_window_matches_full_recompute_over_seen_bars(window):
+    # '현재 - N일' 조회처럼 앞쪽 봉이 빠지고 뒤에 봉이 붙는 경우,
+    # 결과는 지금까지 본 모든 봉으로 처음부터 계산한 값의 같은 구간과 같다
+    bars = random_bars()
+    indicator_set = IndicatorSet(make_indicators())
+    for end in range(window, len(bars), 7):
+        df = bars.iloc[end - window:end]
+        if end > window:
+            dropped, start = indicator_set._start(df)
+            assert (dropped, start) == (7, window - 8)  # 빠진 7개 봉만 버리고 마지막 봉부터 계산
+        result = indicator_set.update(df)
+        expected = full_recompute(bars.iloc[:end]).loc[df.index]
+        assert_same(result, expected)
+        assert result.index.equals(df.index)
+
+
+def test_recomputes_when_ranges_do_not_overlap():
+    bars = random_bars()
+    indicator_set = IndicatorSet(make_indicators())
+    indicator_set.update(bars.iloc[:100])
+    later = bars.iloc[150:250]
+    assert_same(indicator_set.update(later), full_recompute(later))
+    # 앞쪽에 더 긴 기간을 요청한 경우도 처음부터 계산
+    longer = bars.iloc[100:250]
+    assert_same(indicator_set.update(longer), full_recompute(longer))
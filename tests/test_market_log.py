@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import market_log
+from market_log import MarketDataLog, ReplayMiss
+from scheduler import RequestScheduler
+from streams import UpbitTickerStream
+
+LIMITS = {'upbit': (1000.0, 1000), 'binance': (1000.0, 1000)}
+
+
+def get_ohlcv(ticker, interval='day', count=200):
+    # 업스트림 대신 인자마다 다른 결과를 만든다 (호출 횟수도 반영)
+    get_ohlcv.calls += 1
+    index = pd.date_range('2024-01-01', periods=count, freq='D' if interval == 'day' else 'h', tz='UTC')
+    return pd.DataFrame({'close': range(count), 'call': get_ohlcv.calls}, index=index)
+
+
+def fetch_ohlcv(symbol, timeframe='1h', since=None, limit=1000):
+    return [[since + i * 60_000, 1.0, 2.0, 0.5, 1.5, float(i)] for i in range(3)] + [[timeframe]]
+
+
+def fail(ticker):
+    raise ValueError(f"알 수 없는 티커: {ticker}")
+
+
+class FakeTransport:
+    # 웹소켓 대신 정해진 메시지를 보내고 닫힐 때까지 연결을 유지하는 전송 계층
+    def __init__(self, messages, on_open, on_message):
+        self.messages = messages
+        self.on_open = on_open
+        self.on_message = on_message
+        self.closed = threading.Event()
+
+    def run(self):
+        self.on_open()
+        for message in self.messages:
+            self.on_message(message)
+        self.closed.wait()
+
+    def send(self, text):
+        pass
+
+    def close(self):
+        self.closed.set()
+
+
+def trade(price, volume, ts_ms):
+    return json.dumps({'type': 'trade', 'code': 'KRW-BTC', 'trade_price': price, 'trade_volume': volume,
+                       'trade_timestamp': ts_ms})
+
+
+MESSAGES = [trade(100.0, 1.0, 1_700_000_000_000), trade(103.0, 0.5, 1_700_000_030_000),
+            trade(99.0, 2.0, 1_700_000_070_000)]
+
+
+@pytest.fixture
+def use_log(monkeypatch):
+    # scheduler 가 사용하는 프로세스 공용 로그를 바꿔 끼운다
+    def install(log):
+        monkeypatch.setattr(market_log, '_market_log', log)
+        return log
+    return install
+
+
+def run_calls(scheduler, count_offset=0):
+    return [
+        scheduler.call('upbit', 'ohlcv', get_ohlcv, 'KRW-BTC', interval='day', count=5 + count_offset),
+        scheduler.call('upbit', 'ohlcv', get_ohlcv, 'KRW-BTC', interval='minute60', count=3 + count_offset),
+        scheduler.call('binance', 'ohlcv', fetch_ohlcv, 'BTC/USDT', timeframe='1h',
+                       since=1_700_000_000_000 + count_offset, limit=1000),
+    ]
+
+
+def stream_candles(stream):
+    stream.subscribe('KRW-BTC')
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        candles = stream.candles('KRW-BTC')
+        if candles is not None and candles['volume'].sum() == 3.5:
+            break
+        time.sleep(0.01)
+    stream.stop()
+    return candles
+
+
+def test_replay_returns_recorded_calls_and_messages(tmp_path, use_log):
+    path = str(tmp_path / 'market.log.gz')
+    get_ohlcv.calls = 0
+
+    recorder = use_log(MarketDataLog('record', path))
+    recorded = run_calls(RequestScheduler(LIMITS))
+    with pytest.raises(ValueError):
+        RequestScheduler(LIMITS).call('upbit', 'ticker', fail, 'KRW-NONE')
+    stream = UpbitTickerStream('ws://fake', recorder.transport_factory(
+        'upbit', lambda url, on_open, on_message: FakeTransport(MESSAGES, on_open, on_message)))
+    recorded_candles = stream_candles(stream)
+    recorder.close()
+    assert recorder.stats()['requests'] == 4 and recorder.stats()['messages'] == 3
+
+    calls = get_ohlcv.calls
+    player = use_log(MarketDataLog('replay', path))
+    replayed = run_calls(RequestScheduler(LIMITS))
+    assert get_ohlcv.calls == calls  # 재생할 때는 업스트림을 호출하지 않는다
+    pd.testing.assert_frame_equal(replayed[0], recorded[0])
+    pd.testing.assert_frame_equal(replayed[1], recorded[1])
+    assert replayed[2] == recorded[2]
+    with pytest.raises(ValueError, match='KRW-NONE'):
+        RequestScheduler(LIMITS).call('upbit', 'ticker', fail, 'KRW-NONE')
+
+    replayed_stream = UpbitTickerStream('ws://fake', player.transport_factory('upbit', None))
+    pd.testing.assert_frame_equal(stream_candles(replayed_stream), recorded_candles)
+    assert player.stats()['misses'] == 0
+
+
+def test_loose_key_ignores_only_time_dependent_arguments(tmp_path, use_log):
+    path = str(tmp_path / 'market.log.gz')
+    get_ohlcv.calls = 0
+    use_log(MarketDataLog('record', path))
+    recorded = run_calls(RequestScheduler(LIMITS))
+    market_log.market_log().close()
+
+    use_log(MarketDataLog('replay', path))
+    # count/since 만 다른 요청은 같은 interval/timeframe 의 기록으로 응답한다
+    replayed = run_calls(RequestScheduler(LIMITS), count_offset=7)
+    pd.testing.assert_frame_equal(replayed[0], recorded[0])
+    pd.testing.assert_frame_equal(replayed[1], recorded[1])
+    assert replayed[2] == recorded[2]
+    # interval 이 다르면 기록에 없는 요청이다
+    with pytest.raises(ReplayMiss):
+        RequestScheduler(LIMITS).call('upbit', 'ohlcv', get_ohlcv, 'KRW-BTC', interval='week', count=5)
+    with pytest.raises(ReplayMiss):
+        RequestScheduler(LIMITS).call('binance', 'ohlcv', fetch_ohlcv, 'BTC/USDT', timeframe='4h',
+                                      since=1_700_000_000_000, limit=1000)
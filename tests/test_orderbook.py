@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import db
+import orderbook
+from account import load_account
+from orderbook import Order, OrderEngine, SymbolBook
+
+KEY = ('crypto', 'KRW-BTC')
+
+
+def order(order_id, price, side='buy', type='limit'):
+    return Order(order_id, 'alice', KEY[0], KEY[1], KEY[1], side, type, float(price), 1.0, 0.0)
+
+
+@pytest.fixture
+def engine(users_db, monkeypatch):
+    # 폴러 구독 없이 주문만 받는 엔진 (매칭 스레드는 띄우지 않는다)
+    monkeypatch.setattr(orderbook, 'subscribe', lambda *args: None)
+    users_db('alice')
+    load_account('alice').deposit(1_000_000)
+    return OrderEngine()
+
+
+def test_symbol_book_matches_crossed_orders_in_price_time_order():
+    book, orders = SymbolBook(), {}
+    for o, direction in [(order(1, 100), 'below'), (order(2, 105), 'below'), (order(3, 105), 'below'),
+                         (order(4, 110, 'sell'), 'above'), (order(5, 120, 'sell'), 'above')]:
+        book.add(o, direction)
+        orders[o.order_id] = o
+
+    assert book.match(107, orders) == []
+    assert book.match(104, orders) == [2, 3]  # 같은 가격이면 먼저 들어온 주문부터
+    assert book.match(115, orders) == [4]
+    assert book.live == 2
+
+    # 취소된 항목은 건너뛰고 개수만 정리한다
+    del orders[1]
+    book.discard()
+    assert book.match(50, orders) == [] and book.stale == 0 and book.live == 1
+
+
+def test_compact_drops_cancelled_entries(monkeypatch):
+    monkeypatch.setattr(orderbook, 'COMPACT_MIN_STALE', 2)
+    book, orders = SymbolBook(), {}
+    for order_id in range(1, 7):
+        orders[order_id] = order(order_id, 100 + order_id)
+        book.add(orders[order_id], 'below')
+    for order_id in (1, 2, 3, 4):
+        del orders[order_id]
+        book.discard()
+    book.compact(orders)
+    assert sorted(entry[1] for entry in book.below) == [5, 6] and book.stale == 0
+
+
+def test_engine_fills_and_records_in_one_transaction(engine):
+    buy = engine.place('alice', *KEY, KEY[1], 'buy', 'limit', 50_000, 2)
+    stop = engine.place('alice', *KEY, KEY[1], 'sell', 'stop', 40_000, 2)
+    assert engine.match(KEY, 60_000) == []
+
+    crossed = engine.match(KEY, 49_000)
+    assert crossed == [buy]
+    engine._fill(buy, 49_000)
+    acct = load_account('alice')
+    assert acct.holdings == {KEY[1]: 2} and acct.cash == 1_000_000 - 98_000
+
+    [filled] = engine.match(KEY, 39_000)
+    assert filled == stop
+    engine._fill(stop, 39_000)
+    assert acct.holdings == {KEY[1]: 0} and acct.realized_pnl == -20_000
+    statuses = {row[0]: (row[6], row[8]) for row in engine.closed_orders('alice')}
+    assert statuses == {buy.order_id: ('filled', 49_000), stop.order_id: ('filled', 39_000)}
+    assert engine.open_orders('alice') == [] and engine.stats()['resting'] == 0
+
+
+def test_engine_rejects_unaffordable_fill_and_cancels(engine):
+    too_big = engine.place('alice', *KEY, KEY[1], 'buy', 'limit', 1_000_000, 2)
+    resting = engine.place('alice', *KEY, KEY[1], 'sell', 'take_profit', 2_000_000, 1)
+    engine._fill(engine.match(KEY, 900_000)[0], 900_000)
+    assert load_account('alice').holdings == {}
+
+    assert engine.cancel('alice', resting.order_id)
+    assert not engine.cancel('alice', resting.order_id)
+    assert engine.match(KEY, 3_000_000) == []
+    statuses = {row[0]: row[6] for row in engine.closed_orders('alice')}
+    assert statuses == {too_big.order_id: 'rejected', resting.order_id: 'cancelled'}
+
+
+def test_engine_validates_orders(engine):
+    with pytest.raises(ValueError):
+        engine.place('alice', *KEY, KEY[1], 'buy', 'take_profit', 100, 1)
+    with pytest.raises(ValueError):
+        engine.place('alice', *KEY, KEY[1], 'buy', 'limit', 0, 1)
+    with pytest.raises(ValueError):
+        engine.place('nobody', *KEY, KEY[1], 'buy', 'limit', 100, 1)
+    assert db.connection().execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 0
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+import scheduler
+from scheduler import BACKGROUND, INTERACTIVE, RequestScheduler, priority
+
+LIMITS = {'upbit': (1000.0, 1000)}
+
+
+class RateLimited(Exception):
+    # requests 의 HTTPError 처럼 response.status_code 로 429 를 알린다
+    def __init__(self):
+        super().__init__('429 Too Many Requests')
+        self.response = type('Response', (), {'status_code': 429})()
+
+
+def test_identical_requests_in_flight_are_coalesced():
+    requests = RequestScheduler(LIMITS)
+    release = threading.Event()
+    calls = []
+
+    def get_ticker(ticker):
+        calls.append(ticker)
+        release.wait(5)
+        return {'ticker': ticker}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        requests.call('upbit', 'ticker', get_ticker, 'KRW-BTC'))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while requests.stats()['upbit']['coalesced'] < 4:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['KRW-BTC'] and results == [{'ticker': 'KRW-BTC'}] * 5
+    assert requests.stats()['upbit']['requests'] == 1
+
+    # 끝난 요청은 다시 보낸다
+    assert requests.call('upbit', 'ticker', get_ticker, 'KRW-BTC') == {'ticker': 'KRW-BTC'}
+    assert len(calls) == 2
+
+
+def test_coalesced_error_reaches_every_caller():
+    requests = RequestScheduler(LIMITS)
+    release = threading.Event()
+
+    def fail(ticker):
+        release.wait(5)
+        raise ValueError(ticker)
+
+    errors = []
+
+    def call():
+        try:
+            requests.call('upbit', 'ticker', fail, 'KRW-NONE')
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while requests.stats()['upbit']['coalesced'] < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3 and requests.stats()['upbit']['errors'] == 1
+
+
+def test_rate_limited_requests_are_retried(monkeypatch):
+    monkeypatch.setattr(scheduler, 'RATE_LIMIT_BACKOFF', 0.01)
+    requests = RequestScheduler(LIMITS)
+    responses = [RateLimited(), RateLimited(), 'ok']
+
+    def get_ticker():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert requests.call('upbit', 'ticker', get_ticker) == 'ok'
+    stats = requests.stats()['upbit']
+    assert (stats['requests'], stats['rate_limited'], stats['errors']) == (3, 2, 0)
+
+
+def test_rate_limit_retries_give_up(monkeypatch):
+    monkeypatch.setattr(scheduler, 'RATE_LIMIT_BACKOFF', 0.01)
+    requests = RequestScheduler(LIMITS)
+    calls = []
+
+    def get_ticker():
+        calls.append(1)
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        requests.call('upbit', 'ticker', get_ticker)
+    assert len(calls) == scheduler.RATE_LIMIT_RETRIES + 1
+    assert requests.stats()['upbit']['errors'] == 1
+
+
+def test_interactive_requests_go_before_background():
+    # 토큰이 하나씩만 생기는 버킷에서 먼저 기다리던 백그라운드 요청보다 화면 조회가 먼저 나간다
+    requests = RequestScheduler({'upbit': (5.0, 1)})
+    order = []
+    requests.call('upbit', 'ticker', order.append, 'warmup')  # 버킷을 비운다
+
+    def call(level, name):
+        with priority(level):
+            requests.call('upbit', 'ticker', order.append, name)
+
+    background = [threading.Thread(target=call, args=(BACKGROUND, f'bg{i}')) for i in range(3)]
+    for thread in background:
+        thread.start()
+    while requests.stats()['upbit']['waiting'] < 3:
+        threading.Event().wait(0.001)
+    interactive = threading.Thread(target=call, args=(INTERACTIVE, 'ui'))
+    interactive.start()
+    for thread in background + [interactive]:
+        thread.join()
+    assert order.index('ui') <= 2
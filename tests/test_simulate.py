@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulate import simulate, simulate_reference
+
+# 빌드된 Cython 커널과 파이썬 기준 구현이 같은 결과를 내는지 확인 (커널이 없으면 건너뜀)
+kernel = pytest.importorskip('_sim_kernel').simulate_kernel
+
+OPTIONS = [
+    dict(alloc=1.0, trail_pct=0.0, tp_levels=(), tp_fractions=(), fractional=True),
+    dict(alloc=0.5, trail_pct=0.05, tp_levels=(), tp_fractions=(), fractional=True),
+    dict(alloc=1.0, trail_pct=0.0, tp_levels=(0.03, 0.08), tp_fractions=(0.5, 0.5), fractional=True),
+    dict(alloc=0.8, trail_pct=0.04, tp_levels=(0.02, 0.05, 0.1), tp_fractions=(0.3, 0.3, 0.4), fractional=False),
+]
+
+
+def random_bars(seed, n=5000):
+    rng = np.random.default_rng(seed)
+    close = 10000 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.01, n)))
+    index = pd.date_range('2020-01-01', periods=n, freq='h', tz='UTC')
+    df = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close}, index=index)
+    # 몇 봉씩 이어지는 보유 신호
+    signal = np.repeat(rng.random(n // 10 + 1) < 0.5, 10)[:n]
+    return df, signal
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('options', OPTIONS)
+def test_kernel_matches_reference(seed, options):
+    df, signal = random_bars(seed)
+    ours = simulate(df, signal, init_cash=1e7, kernel=kernel, **options)
+    reference = simulate(df, signal, init_cash=1e7, kernel=simulate_reference, **options)
+    np.testing.assert_array_equal(ours.equity.to_numpy(), reference.equity.to_numpy())
+    pd.testing.assert_frame_equal(ours.fills, reference.fills)
+    assert ours.stats == reference.stats
+    assert len(ours.fills) > 0
+
+
+def test_take_profit_levels_must_match_fractions():
+    df, signal = random_bars(0, n=10)
+    with pytest.raises(ValueError):
+        simulate(df, signal, tp_levels=(0.05,), tp_fractions=())
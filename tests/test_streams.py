@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import json
+import queue
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import streams
+from bar_store import normalize_ohlcv
+from streams import BinanceFuturesTickerStream, UpbitTickerStream, streamed_history
+
+
+class FakeTransport:
+    # 웹소켓 대신 테스트가 넣어준 메시지를 보내는 전송 계층
+    def __init__(self, url, on_open, on_message):
+        self.on_open = on_open
+        self.on_message = on_message
+        self.inbox = queue.Queue()
+        self.sent = []
+        self.opened = threading.Event()
+
+    def run(self):
+        self.on_open()
+        self.opened.set()
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                return
+            if isinstance(message, threading.Event):
+                message.set()  # 앞에 넣은 메시지를 모두 처리했다는 표시
+                continue
+            self.on_message(message)
+
+    def deliver(self, messages):
+        # 메시지를 보내고 수신 스레드가 모두 처리할 때까지 기다린다
+        handled = threading.Event()
+        for message in messages:
+            self.inbox.put(message)
+        self.inbox.put(handled)
+        assert handled.wait(5)
+
+    def send(self, text):
+        self.sent.append(json.loads(text))
+
+    def close(self):
+        self.inbox.put(None)
+
+
+@pytest.fixture
+def fake():
+    transports = []
+
+    def factory(url, on_open, on_message):
+        transports.append(FakeTransport(url, on_open, on_message))
+        return transports[-1]
+
+    yield factory, transports
+    for transport in transports:
+        transport.close()
+
+
+def start(stream, transports, symbol):
+    stream.subscribe(symbol)
+    deadline = time.time() + 5
+    while not transports and time.time() < deadline:
+        time.sleep(0.01)
+    assert transports[0].opened.wait(5)
+    return transports[0]
+
+
+def upbit_trade(code, price, volume, ts_ms):
+    return json.dumps({'type': 'trade', 'code': code, 'trade_price': price, 'trade_volume': volume,
+                       'trade_timestamp': ts_ms}).encode('utf-8')
+
+
+def test_upbit_stream_keeps_latest_price_and_minute_candles(fake):
+    factory, transports = fake
+    stream = UpbitTickerStream('ws://fake', factory)
+    transport = start(stream, transports, 'KRW-BTC')
+    assert transport.sent[0][1] == {'type': 'ticker', 'codes': ['KRW-BTC'], 'isOnlyRealtime': True}
+
+    minute = 1_700_000_040_000  # 1분 경계
+    transport.deliver([
+        upbit_trade('KRW-BTC', 100.0, 1.0, minute - 60_000),
+        upbit_trade('KRW-BTC', 105.0, 2.0, minute - 30_000),
+        upbit_trade('KRW-BTC', 98.0, 1.0, minute + 1),
+        upbit_trade('KRW-BTC', 101.0, 0.5, minute + 2),
+    ])
+    stream.stop()
+
+    assert stream.latest_quote('KRW-BTC').price == 101.0
+    candles = stream.candles('KRW-BTC')
+    assert candles[['open', 'high', 'low', 'close', 'volume']].values.tolist() == [
+        [100.0, 105.0, 100.0, 105.0, 3.0],
+        [98.0, 101.0, 98.0, 101.0, 1.5],
+    ]
+
+
+def test_binance_stream_maps_stream_names_back_to_symbols(fake):
+    factory, transports = fake
+    stream = BinanceFuturesTickerStream('ws://fake', factory)
+    transport = start(stream, transports, 'BTC/USDT')
+    assert transport.sent[0]['params'] == ['btcusdt@aggTrade', 'btcusdt@ticker']
+
+    now_ms = int(time.time() * 1000)
+    transport.deliver([
+        json.dumps({'e': 'aggTrade', 's': 'BTCUSDT', 'p': '50000.5', 'q': '0.25', 'T': now_ms}),
+        json.dumps({'e': 'aggTrade', 's': 'ETHUSDT', 'p': '3000', 'q': '1', 'T': now_ms}),
+    ])
+    stream.stop()
+
+    assert stream.latest_quote('BTC/USDT').price == 50000.5
+    assert stream.latest_quote('ETH/USDT') is None
+    assert stream.candles('BTC/USDT')['volume'].tolist() == [0.25]
+
+
+def test_streamed_history_serves_recent_bars_from_the_stream(fake, monkeypatch):
+    monkeypatch.setattr(streams, 'STREAMING_ENABLED', True)
+    factory, transports = fake
+    stream = UpbitTickerStream('ws://fake', factory)
+    transport = start(stream, transports, 'KRW-BTC')
+
+    today = pd.Timestamp.now(tz='UTC').floor('D')
+    # REST 로 받은 지난 봉 (오늘 봉은 조회 시점까지만 반영)
+    history = normalize_ohlcv(pd.DataFrame({
+        'open': [90.0, 95.0, 100.0], 'high': [96.0, 101.0, 104.0], 'low': [89.0, 94.0, 99.0],
+        'close': [95.0, 100.0, 102.0], 'volume': [10.0, 11.0, 5.0],
+    }, index=[today - pd.Timedelta(days=2), today - pd.Timedelta(days=1), today]))
+
+    hour_ms = int((today + pd.Timedelta(hours=1)).value // 1_000_000)
+    transport.deliver([upbit_trade('KRW-BTC', 110.0, 1.0, hour_ms), upbit_trade('KRW-BTC', 108.0, 1.0, hour_ms + 1000)])
+    merged = streamed_history(stream, 'KRW-BTC', history, '1d')
+    stream.stop()
+
+    # 지난 봉은 그대로, 오늘 봉은 REST 시가 + 스트림 고가/종가
+    pd.testing.assert_frame_equal(merged.iloc[:2], history.iloc[:2])
+    assert merged.index[-1] == today
+    assert merged.iloc[-1][['open', 'high', 'low', 'close', 'volume']].tolist() == [100.0, 110.0, 99.0, 108.0, 5.0]
+
+    # 스트림이 없으면 REST 봉을 그대로 사용
+    monkeypatch.setattr(streams, 'STREAMING_ENABLED', False)
+    assert streamed_history(stream, 'KRW-BTC', history, '1d') is history
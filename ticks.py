@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from poller import market_poller
+from streams import STREAMING_ENABLED, binance_futures_stream, upbit_stream
+
+# ----------------------
+# 실시간 틱 수신 큐
+# ----------------------
+# 웹소켓 스트림과 공용 폴러의 현재가 갱신을 받아서 관심 종목의 최신 틱만 남겨두는 큐.
+# 리스너는 수신 스레드에서 호출되므로 큐에 넣기만 하고, 처리는 소비자 스레드가 drain() 으로 가져간다.
+# 처리하기 전에 같은 종목의 틱이 또 오면 최신 틱으로 덮어쓴다(합침).
+
+
+class TickQueue:
+    def __init__(self, wants):
+        self.wants = wants  # wants((kind, symbol)) -> 이 종목 틱이 필요한지
+        self.coalesced = 0
+        self._pending = {}  # (kind, symbol) -> (price, received_at)
+        self._wakeup = threading.Condition()
+
+    def attach(self):
+        market_poller().add_listener(self.push)
+        upbit_stream().add_listener(lambda symbol, quote, at: self.push('crypto', symbol, quote, at))
+        binance_futures_stream().add_listener(lambda symbol, quote, at: self.push('futures', symbol, quote, at))
+
+    def push(self, kind, symbol, quote, received_at):
+        key = (kind, symbol)
+        if not self.wants(key):
+            return
+        with self._wakeup:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (quote.price, received_at)
+            self._wakeup.notify()
+
+    def drain(self, timeout):
+        # 대기 중인 틱을 모두 가져온다 (없으면 timeout 초까지 기다림)
+        with self._wakeup:
+            if not self._pending:
+                self._wakeup.wait(timeout=timeout)
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+def subscribe(session_id, kind, symbol):
+    # 폴러 구독 (10분 후 만료되므로 주기적으로 다시 호출) + 스트리밍 가능한 종목은 웹소켓 구독
+    # 틱은 리스너로 받으므로 첫 조회를 기다리지 않는다
+    market_poller().subscribe(session_id, kind, symbol, wait=0)
+    if STREAMING_ENABLED and kind == 'crypto':
+        upbit_stream().subscribe(symbol)
+    elif STREAMING_ENABLED and kind == 'futures':
+        binance_futures_stream().subscribe(symbol)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+from fetcher import fetch_all, task
+from market_data import fetch_crypto_prices, krx_registry
+
+# ----------------------
+# 포트폴리오 평가
+# ----------------------
+# 리런 한 번에 보유 종목 전체를 거래소별로 묶어 한 번씩만 조회한다.
+# 거래소별 요청은 병렬로 보내고, 늦은 거래소는 평가 금액 없이 넘어간다.
+# 결과의 prices 는 총 자산 계산과 보유 현황 표시에서 함께 사용한다.
+Valuation = namedtuple('Valuation', ['prices', 'total'])
+
+
+def is_coin(name):
+    return name.startswith('KRW-')
+
+
+def value_portfolio(cash, holdings):
+    coins = [name for name in holdings if is_coin(name)]
+    stocks = [name for name in holdings if not is_coin(name)]
+
+    tasks = {}
+    # 업비트: 다중 티커 현재가 조회 1회
+    if coins:
+        tasks['upbit'] = task('upbit', fetch_crypto_prices, coins)
+    # KRX: 전 종목 시세 스냅샷 1회
+    if stocks:
+        tasks['krx'] = task('krx', krx_registry().snapshot_prices, stocks)
+
+    # 조회 실패한 거래소의 종목은 평가 금액 없이 표시
+    prices = {}
+    for venue_prices in fetch_all(tasks).values.values():
+        prices.update(venue_prices)
+
+    return Valuation(prices, portfolio_total(cash, holdings, prices))
+
+
+def portfolio_total(cash, holdings, prices):
+    # 가격을 다시 조회하지 않고 현재 현금/수량으로 총 자산만 재계산
+    return cash + sum(prices[name] * qty for name, qty in holdings.items() if name in prices)